@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from flow import create_research_flow
+from flow_async import create_async_research_flow
+from utils.debug import debug, debug_error
+
+def read_queries(path, query_field="query", id_field="id"):
+    """
+    Read research queries from a JSONL file.
+
+    Each line is either a JSON object holding the query under query_field
+    (and optionally an identifier under id_field) or a bare JSON string.
+    Blank lines are skipped, and malformed lines are reported and skipped.
+
+    Args:
+        path: Path of the JSONL file
+        query_field: Name of the field holding the query
+        id_field: Name of the field holding the query identifier
+
+    Returns:
+        List of dictionaries with id and query
+    """
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                debug_error("Batch", f"Line {line_number} is not valid JSON ({e}), skipping")
+                continue
+            if isinstance(record, str):
+                record = {query_field: record}
+            if not isinstance(record, dict):
+                debug_error("Batch", f"Line {line_number} is neither an object nor a string, skipping")
+                continue
+            query = record.get(query_field)
+            if not query:
+                debug_error("Batch", f"Line {line_number} has no '{query_field}' field, skipping")
+                continue
+            queries.append({"id": record.get(id_field, line_number), "query": query})
+    return queries
+
+def run_query(query, max_iterations=10):
+    """
+    Run one query through its own copy of the research flow.
+
+    Args:
+        query: The research query
+        max_iterations: Maximum number of research steps before the answer is generated
+
+    Returns:
+        Dictionary with final_answer, research_summary, key_sources,
+        confidence_score, iterations and error (None on success)
+    """
+    flow = create_research_flow(interactive=False)
+    flow.set_params({"query": query, "max_iterations": max_iterations})
+    shared = {}
+    error = None
+    try:
+        flow.run(shared)
+    except Exception as e:
+        debug_error("Batch", f"Research flow failed for '{query}': {e}")
+        error = str(e)
+    return _answer(shared, error)
+
+async def run_query_async(query, max_iterations=10):
+    """
+    Run one query through its own copy of the async research flow.
+
+    Args:
+        query: The research query
+        max_iterations: Maximum number of research steps before the answer is generated
+
+    Returns:
+        The same dictionary as run_query
+    """
+    flow = create_async_research_flow(interactive=False)
+    flow.set_params({"query": query, "max_iterations": max_iterations})
+    shared = {}
+    error = None
+    try:
+        await flow.run_async(shared)
+    except Exception as e:
+        debug_error("Batch", f"Research flow failed for '{query}': {e}")
+        error = str(e)
+    return _answer(shared, error)
+
+def _answer(shared, error):
+    """Collect the answer fields written to the output file from a finished shared store."""
+    details = shared.get("final_answer_details") or {}
+    return {
+        "final_answer": shared.get("final_answer"),
+        "research_summary": details.get("research_summary"),
+        "key_sources": details.get("key_sources", []),
+        "confidence_score": shared.get("confidence_score"),
+        "iterations": shared.get("iteration_count", 0),
+        "error": error
+    }
+
+def run_batch(queries, output_path, max_workers=4, max_iterations=10):
+    """
+    Run many queries concurrently and append each answer to a JSONL file.
+
+    Every query gets its own flow and shared store. Answers are written as
+    soon as they finish, so a long run keeps its completed work if it is
+    interrupted.
+
+    Args:
+        queries: List of dictionaries with id and query (see read_queries)
+        output_path: Path of the JSONL file answers are appended to
+        max_workers: Maximum number of queries researched at once
+        max_iterations: Maximum number of research steps per query
+
+    Returns:
+        Number of queries that finished without an error
+    """
+    succeeded = 0
+
+    def research(item):
+        started = time.time()
+        result = run_query(item["query"], max_iterations=max_iterations)
+        return {"id": item["id"], "query": item["query"], **result, "elapsed": round(time.time() - started, 2)}
+
+    debug("Batch", f"Researching {len(queries)} queries with {max_workers} workers")
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="research") as executor:
+        futures = [executor.submit(research, item) for item in queries]
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            if record["error"] is None:
+                succeeded += 1
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            debug("Batch", f"[{done}/{len(queries)}] Finished query {record['id']} in {record['elapsed']}s")
+    return succeeded
+
+async def run_batch_async(queries, output_path, max_sessions=100, max_iterations=10):
+    """
+    Asynchronous version of run_batch using the async research flow.
+
+    All sessions share the running event loop, so hundreds can wait on the
+    LLM and the network at once without a thread per session.
+
+    Args:
+        queries: List of dictionaries with id and query (see read_queries)
+        output_path: Path of the JSONL file answers are appended to
+        max_sessions: Maximum number of queries researched at once
+        max_iterations: Maximum number of research steps per query
+
+    Returns:
+        Number of queries that finished without an error
+    """
+    sessions = asyncio.Semaphore(max_sessions)
+    succeeded = 0
+
+    async def research(item):
+        async with sessions:
+            started = time.time()
+            result = await run_query_async(item["query"], max_iterations=max_iterations)
+        return {"id": item["id"], "query": item["query"], **result, "elapsed": round(time.time() - started, 2)}
+
+    debug("Batch", f"Researching {len(queries)} queries in up to {max_sessions} async sessions")
+    with open(output_path, "a", encoding="utf-8") as out:
+        for done, next_record in enumerate(asyncio.as_completed([research(item) for item in queries]), 1):
+            record = await next_record
+            if record["error"] is None:
+                succeeded += 1
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            debug("Batch", f"[{done}/{len(queries)}] Finished query {record['id']} in {record['elapsed']}s")
+    return succeeded
+
+def main():
+    """Entry point for researching a file of queries without user interaction."""
+    parser = argparse.ArgumentParser(description="Run many research queries through the research flow")
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("output", help="JSONL file answers are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="Number of queries researched concurrently")
+    parser.add_argument("--async-sessions", type=int, default=0,
+                        help="Use the async flow with this many concurrent sessions on one event loop instead of --workers threads")
+    parser.add_argument("--max-iterations", type=int, default=10, help="Research steps per query before answering")
+    parser.add_argument("--query-field", default="query", help="Field of each input line holding the query")
+    parser.add_argument("--id-field", default="id", help="Field of each input line holding the query id")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("Warning: GOOGLE_API_KEY not found in environment variables")
+
+    queries = read_queries(args.input, query_field=args.query_field, id_field=args.id_field)
+    started = time.time()
+    if args.async_sessions > 0:
+        succeeded = asyncio.run(run_batch_async(queries, args.output, max_sessions=args.async_sessions,
+                                                max_iterations=args.max_iterations))
+    else:
+        succeeded = run_batch(queries, args.output, max_workers=args.workers, max_iterations=args.max_iterations)
+    print(f"Researched {succeeded}/{len(queries)} queries in {time.time() - started:.1f}s, answers in {args.output}")
+    return 0 if succeeded == len(queries) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark page extraction throughput with the process pool.
+
+Parses the saved pages in benchmarks/data/html many times over, the way
+concurrent crawls would: in the calling thread, in a thread pool (which the
+GIL serializes), and in ExtractionPool with an increasing number of worker
+processes, reporting pages per second and the speed-up over one thread.
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ["DEBUG_LEVEL"] = "0"
+
+from utils.extract_pool import ExtractionPool
+from utils.web_crawl import extract_page
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "data", "html")
+
+def load_pages(fixtures, count):
+    """Return count (url, body) pairs cycling through the fixture files."""
+    bodies = []
+    for path in sorted(glob.glob(os.path.join(fixtures, "*.html"))):
+        with open(path, "rb") as f:
+            bodies.append(f.read())
+    return [(f"https://example.com/{i}", bodies[i % len(bodies)]) for i in range(count)] if bodies else []
+
+def run_inline(pages):
+    for url, body in pages:
+        extract_page(url, 200, body, "text/html")
+
+def run_threads(pages, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda page: extract_page(page[0], 200, page[1], "text/html"), pages))
+
+def run_pool(pool, pages):
+    # Submit from several threads, as concurrent crawls do; submit blocks once the queue is full
+    with ThreadPoolExecutor(max_workers=pool.max_pending) as executor:
+        list(executor.map(lambda page: pool.run(extract_page, page[0], 200, page[1], "text/html"), pages))
+
+def timed(label, func, pages, baseline=None):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    rate = len(pages) / elapsed
+    speedup = f"{rate / baseline:8.2f}x" if baseline else f"{'1.00x':>9}"
+    print(f"{label:<24} {rate:10.1f} {speedup}")
+    return rate
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page extraction across worker processes.")
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help="Directory of .html files")
+    parser.add_argument('--pages', type=int, default=400, help="Pages parsed per configuration")
+    parser.add_argument('--workers', type=int, nargs="+",
+                        help="Worker process counts to try (default: 1, 2, 4, ... up to the CPU count)")
+    parser.add_argument('--max-tasks-per-child', type=int, default=200, help="Pages a worker parses before it is replaced")
+    args = parser.parse_args()
+
+    pages = load_pages(args.fixtures, args.pages)
+    if not pages:
+        print(f"No .html files found in {args.fixtures}")
+        return 1
+
+    cpus = os.cpu_count() or 1
+    counts = args.workers or sorted({1, cpus} | {n for n in (2, 4, 8, 16, 32) if n < cpus})
+    total_bytes = sum(len(body) for _, body in pages)
+    print(f"{len(pages)} pages, {total_bytes / 1e6:.1f} MB of HTML, {cpus} CPUs\n")
+    print(f"{'configuration':<24} {'pages/s':>10} {'speed-up':>9}")
+
+    baseline = timed("inline (1 thread)", lambda: run_inline(pages), pages)
+    timed(f"{cpus * 2} threads", lambda: run_threads(pages, cpus * 2), pages, baseline)
+    for workers in counts:
+        pool = ExtractionPool(workers=workers, max_tasks_per_child=args.max_tasks_per_child)
+        try:
+            # Start the workers before timing; spawning is a one-off cost per worker
+            for _ in range(workers * 2):
+                pool.run(os.getpid)
+            timed(f"pool, {workers} worker{'s' if workers > 1 else ''}", lambda: run_pool(pool, pages), pages, baseline)
+        finally:
+            pool.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
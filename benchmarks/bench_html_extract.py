@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark HTML-to-text extraction over a directory of saved pages.
+
+Compares the original BeautifulSoup html.parser + get_text path that
+extract_content used with every backend in utils.html_extract, with and
+without boilerplate removal, reporting throughput and the size of the
+extracted text for each page.
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.html_extract import EXTRACTORS, clean_text
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "data", "html")
+
+def legacy_extract(html, strip_boilerplate=False):
+    """The original BeautifulSoup path: drop script/style, get_text, normalize lines."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.extract()
+    text = clean_text(soup.get_text(separator='\n'))
+    title = soup.title.string if soup.title else None
+    return title, text
+
+def candidates():
+    """Return (label, function, strip_boilerplate) for every configuration to time."""
+    configs = []
+    try:
+        import bs4  # noqa: F401
+        configs.append(("bs4 html.parser", legacy_extract, False))
+    except ImportError:
+        print("beautifulsoup4 not installed, skipping the legacy baseline")
+    for name, extractor in EXTRACTORS.items():
+        configs.append((name, extractor, False))
+        configs.append((f"{name} +strip", extractor, True))
+    return configs
+
+def run(extractor, html, strip_boilerplate, repeat):
+    """Return (extracted text, seconds per page) for one page."""
+    _, text = extractor(html, strip_boilerplate)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extractor(html, strip_boilerplate)
+    return text, (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-text extraction over saved pages.")
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help="Directory of .html files")
+    parser.add_argument('--repeat', type=int, default=20, help="Extractions per page when timing")
+    parser.add_argument('--verbose', action='store_true', help="Show results for each page")
+    args = parser.parse_args()
+
+    pages = []
+    for path in sorted(glob.glob(os.path.join(args.fixtures, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append((os.path.basename(path), f.read()))
+    if not pages:
+        print(f"No .html files found in {args.fixtures}")
+        return 1
+
+    total_bytes = sum(len(html.encode("utf-8")) for _, html in pages)
+    print(f"{len(pages)} pages, {total_bytes / 1024:.0f} KiB of HTML\n")
+    print(f"{'extractor':<18} {'MB/s':>7} {'ms/page':>8} {'text KiB':>9} {'text/html':>9}")
+
+    for label, extractor, strip_boilerplate in candidates():
+        elapsed = 0.0
+        text_bytes = 0
+        for name, html in pages:
+            text, per_page = run(extractor, html, strip_boilerplate, args.repeat)
+            elapsed += per_page
+            size = len(text.encode("utf-8"))
+            text_bytes += size
+            if args.verbose:
+                print(f"  {label:<16} {name:<24} {per_page * 1e3:7.2f} ms {size / 1024:7.1f} KiB")
+        print(f"{label:<18} {total_bytes / elapsed / 1e6:7.1f} {elapsed / len(pages) * 1e3:8.2f} "
+              f"{text_bytes / 1024:9.1f} {text_bytes / total_bytes:9.1%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark JSON extraction over a corpus of recorded LLM responses.
+
+Compares the original fence-scanning chain that DecisionNode, AnalyzerNode
+and HITLOutputNode each carried with utils.json_extract.extract_json, reporting
+how many responses each one turns into a valid object and the time per
+response.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.json_extract import extract_json, JSONExtractionError
+from utils.data_structures import Decision, AnalyzerReport, HITLOutput
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "llm_responses.jsonl")
+
+# Schema settings used by the nodes for each kind of response
+SCHEMAS = {
+    "decision": (Decision, None, None),
+    "analyzer": (AnalyzerReport, ("extracted_info", "confidence_score"), {
+        "assessment": "", "suggestions_for_next_step": [], "new_potential_urls": [], "inconsistencies_found": None
+    }),
+    "hitl": (HITLOutput, ("final_answer",), {"research_summary": "", "key_sources": []}),
+}
+
+# Fields the original node code checked after json.loads
+LEGACY_REQUIRED = {
+    "decision": ("next_action", "query_or_url", "reasoning"),
+    "analyzer": ("extracted_info", "confidence_score"),
+    "hitl": ("final_answer",),
+}
+
+def legacy_extract(response, kind):
+    """The original find("```json") / find("```") / rfind("}") chain followed by json.loads."""
+    if "```json" in response:
+        json_start = response.find("```json") + 7
+        json_end = response.find("```", json_start)
+        json_str = response[json_start:json_end].strip() if json_end > json_start else response
+    elif "```" in response:
+        json_start = response.find("```") + 3
+        json_end = response.find("```", json_start)
+        json_str = response[json_start:json_end].strip() if json_end > json_start else response
+    elif "{" in response and "}" in response:
+        json_start = response.find("{")
+        json_end = response.rfind("}") + 1
+        json_str = response[json_start:json_end].strip() if json_end > json_start else response
+    else:
+        json_str = response
+    obj = json.loads(json_str)
+    if not all(field in obj for field in LEGACY_REQUIRED[kind]):
+        raise ValueError("missing required fields")
+    return obj
+
+def new_extract(response, kind):
+    schema, required, defaults = SCHEMAS[kind]
+    return extract_json(response, schema, required=required, defaults=defaults)
+
+def run(extractor, corpus, repeat):
+    """Return (number of responses parsed, seconds per response) for extractor."""
+    parsed = 0
+    for row in corpus:
+        try:
+            extractor(row["response"], row["kind"])
+            parsed += 1
+        except (ValueError, JSONExtractionError):
+            pass
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for row in corpus:
+            try:
+                extractor(row["response"], row["kind"])
+            except (ValueError, JSONExtractionError):
+                pass
+    elapsed = time.perf_counter() - start
+    return parsed, elapsed / (repeat * len(corpus))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON extraction over recorded LLM responses.")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help="JSONL file with kind/name/response records")
+    parser.add_argument('--repeat', type=int, default=2000, help="Passes over the corpus when timing")
+    parser.add_argument('--verbose', action='store_true', help="Show the outcome for each response")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    if args.verbose:
+        for row in corpus:
+            outcomes = []
+            for extractor in (legacy_extract, new_extract):
+                try:
+                    extractor(row["response"], row["kind"])
+                    outcomes.append("ok")
+                except (ValueError, JSONExtractionError):
+                    outcomes.append("FAIL")
+            print(f"{row['kind']:>9}/{row['name']:<26} legacy={outcomes[0]:<4} extract_json={outcomes[1]}")
+        print()
+
+    for label, extractor in (("legacy chain", legacy_extract), ("extract_json", new_extract)):
+        parsed, per_response = run(extractor, corpus, args.repeat)
+        print(f"{label:<13} parsed {parsed:2d}/{len(corpus)}  {per_response * 1e6:7.1f} us/response")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-call setup overhead of call_llm.
+
+The Gemini service client is stubbed so no request leaves the machine; what
+is measured is everything call_llm does around the request: configuring the
+library, building the model and service client, and wrapping the response.
+"before" reproduces the original configure-per-call path, "after" uses the
+long-lived model registry.
+"""
+
+import os
+import sys
+import time
+import argparse
+import warnings
+from unittest.mock import patch
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+warnings.filterwarnings("ignore")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-key")
+os.environ["DEBUG_LEVEL"] = "0"
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from utils.call_llm import _generate, reset_llm_clients
+
+MODEL = "gemini-2.5-flash-preview-04-17"
+
+def stub_generate_content(self, request, **kwargs):
+    """Stand-in for the network call that returns a fixed response."""
+    return glm.GenerateContentResponse(candidates=[
+        glm.Candidate(content=glm.Content(parts=[glm.Part(text="stub response")], role="model"))
+    ])
+
+def legacy_call(prompt, model=MODEL, temperature=0.6, max_tokens=4000):
+    """The original call path: read the key, configure and build a model on every call."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model)
+    response = model.generate_content(
+        prompt,
+        generation_config=genai.GenerationConfig(temperature=temperature, max_output_tokens=max_tokens)
+    )
+    return response.text
+
+def registry_call(prompt):
+    """The current call path without the response cache."""
+    return _generate(prompt, MODEL, 0.6, 4000)
+
+def measure(fn, calls):
+    """Return the mean seconds per call over calls invocations after one warm-up call."""
+    fn("warm-up")
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(f"prompt {i}")
+    return (time.perf_counter() - start) / calls
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark call_llm per-call overhead with a stubbed backend.")
+    parser.add_argument('--calls', type=int, default=200, help="Number of calls per variant")
+    args = parser.parse_args()
+
+    with patch.object(glm.GenerativeServiceClient, "generate_content", stub_generate_content), \
+         patch('builtins.print'):
+        reset_llm_clients()
+        before = measure(legacy_call, args.calls)
+        after = measure(registry_call, args.calls)
+
+    print(f"calls per variant: {args.calls}")
+    print(f"before (configure + new model per call): {before * 1e6:9.1f} us/call")
+    print(f"after  (long-lived model registry):      {after * 1e6:9.1f} us/call")
+    print(f"speedup: {before / after:.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
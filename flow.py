@@ -1,26 +1,39 @@
 from pocketflow import Flow
+from utils.checkpoint import CheckpointedFlow
 from nodes import (
     QueryInputNode,
     DecisionNode,
     DuckDuckGoSearchNode,
     GoogleSearchNode,
+    MultiSearchNode,
     WebCrawlNode,
+    BatchWebCrawlNode,
     AnalyzerNode,
     HITLOutputNode,
     HumanFeedbackNode
 )
 
-def create_research_flow():
-    """Create and return a web research flow based on the design document."""
+def create_research_flow(interactive=True, checkpoint_path=None):
+    """
+    Create and return a web research flow based on the design document.
+    
+    Args:
+        interactive: Whether to ask the user for feedback after the final answer;
+            non-interactive flows end once the answer has been generated
+        checkpoint_path: Optional file to checkpoint the shared store to after
+            every node; the returned flow can then be resumed from it
+    """
     
     # Create nodes, adding retries for LLM-based nodes
     query_node = QueryInputNode()
-    decision_node = DecisionNode(max_retries=3, wait=5)
+    decision_node = DecisionNode(max_retries=3, wait=5, stream=True, structured=True)
     duckduckgo_node = DuckDuckGoSearchNode()
     google_node = GoogleSearchNode()
+    multi_search_node = MultiSearchNode()
     crawl_node = WebCrawlNode()
-    analyzer_node = AnalyzerNode(max_retries=3, wait=5)
-    hitl_output_node = HITLOutputNode(max_retries=3, wait=5)
+    batch_crawl_node = BatchWebCrawlNode()
+    analyzer_node = AnalyzerNode(max_retries=3, wait=5, stream=True, structured=True)
+    hitl_output_node = HITLOutputNode(max_retries=3, wait=5, structured=True)
     feedback_node = HumanFeedbackNode()
     
     # Define the flow structure using action-based transitions:
@@ -31,25 +44,32 @@ def create_research_flow():
     # 2. Decision node routes to the appropriate tool or HITL based on its returned action
     decision_node - "search_duckduckgo" >> duckduckgo_node
     decision_node - "search_google" >> google_node
+    decision_node - "search_all" >> multi_search_node
     decision_node - "crawl_url" >> crawl_node
+    decision_node - "crawl_urls" >> batch_crawl_node
     decision_node - "send_to_hitl" >> hitl_output_node
 
     # 3. All tool nodes lead to the Analyzer node (using default transition)
     duckduckgo_node >> analyzer_node
     google_node >> analyzer_node
+    multi_search_node >> analyzer_node
     crawl_node >> analyzer_node
+    batch_crawl_node >> analyzer_node
 
     # 4. Analyzer node loops back to the Decision node (using default transition)
     analyzer_node >> decision_node
 
     # 5. HITL output leads to the Human Feedback node (using default transition)
-    hitl_output_node >> feedback_node
+    if interactive:
+        hitl_output_node >> feedback_node
 
-    # 6. Human Feedback node loops back to the Decision node if more research is needed
-    feedback_node - "continue_research" >> decision_node
+        # 6. Human Feedback node loops back to the Decision node if more research is needed
+        feedback_node - "continue_research" >> decision_node
     # If feedback_node returns anything else (e.g., "complete" or None/"default"), the flow ends.
     
     # Create flow starting with query node
+    if checkpoint_path:
+        return CheckpointedFlow(start=query_node, path=checkpoint_path)
     return Flow(start=query_node)
 
 # Create the research flow
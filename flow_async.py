@@ -0,0 +1,62 @@
+from pocketflow import AsyncFlow
+from nodes_async import (
+    AsyncQueryInputNode,
+    AsyncDecisionNode,
+    AsyncDuckDuckGoSearchNode,
+    AsyncGoogleSearchNode,
+    AsyncMultiSearchNode,
+    AsyncWebCrawlNode,
+    AsyncBatchWebCrawlNode,
+    AsyncAnalyzerNode,
+    AsyncHITLOutputNode,
+    AsyncHumanFeedbackNode
+)
+
+def create_async_research_flow(interactive=True):
+    """
+    Create and return the research flow built from async nodes.
+
+    The graph is the same as create_research_flow in flow.py. Run it with
+    await flow.run_async(shared); many flows can share one event loop, each
+    with its own shared store.
+
+    Args:
+        interactive: Whether to ask the user for feedback after the final answer;
+            non-interactive flows end once the answer has been generated
+    """
+
+    # Create nodes, adding retries for LLM-based nodes
+    query_node = AsyncQueryInputNode()
+    decision_node = AsyncDecisionNode(max_retries=3, wait=5, structured=True)
+    duckduckgo_node = AsyncDuckDuckGoSearchNode()
+    google_node = AsyncGoogleSearchNode()
+    multi_search_node = AsyncMultiSearchNode()
+    crawl_node = AsyncWebCrawlNode()
+    batch_crawl_node = AsyncBatchWebCrawlNode()
+    analyzer_node = AsyncAnalyzerNode(max_retries=3, wait=5, structured=True)
+    hitl_output_node = AsyncHITLOutputNode(max_retries=3, wait=5, structured=True)
+    feedback_node = AsyncHumanFeedbackNode()
+
+    # Same transitions as the synchronous flow
+    query_node >> decision_node
+
+    decision_node - "search_duckduckgo" >> duckduckgo_node
+    decision_node - "search_google" >> google_node
+    decision_node - "search_all" >> multi_search_node
+    decision_node - "crawl_url" >> crawl_node
+    decision_node - "crawl_urls" >> batch_crawl_node
+    decision_node - "send_to_hitl" >> hitl_output_node
+
+    duckduckgo_node >> analyzer_node
+    google_node >> analyzer_node
+    multi_search_node >> analyzer_node
+    crawl_node >> analyzer_node
+    batch_crawl_node >> analyzer_node
+
+    analyzer_node >> decision_node
+
+    if interactive:
+        hitl_output_node >> feedback_node
+        feedback_node - "continue_research" >> decision_node
+
+    return AsyncFlow(start=query_node)
@@ -1,10 +1,31 @@
 import os
+import argparse
 from dotenv import load_dotenv
-from flow import research_flow
+from flow import create_research_flow
+from utils.checkpoint import CHECKPOINT_PATH, DEFAULT_CHECKPOINT_PATH
+from utils.instrumentation import INSTRUMENTATION_PATH, export_jsonl, profile_report, format_profile
+from utils.prefetch import get_prefetcher
 from utils.debug import debug, debug_error
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Dynamic Web Research Agent")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last interrupted session from its checkpoint")
+    parser.add_argument("--checkpoint", nargs="?", const=DEFAULT_CHECKPOINT_PATH, default=CHECKPOINT_PATH,
+                        help=f"Checkpoint the session after every step to this file (without a path: "
+                             f"{DEFAULT_CHECKPOINT_PATH}; default: {CHECKPOINT_PATH or 'disabled'})")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print where the session spent its time (LLM, network, local work) when it ends")
+    parser.add_argument("--trace", default=INSTRUMENTATION_PATH,
+                        help="Append the session's timing spans to this JSON-lines file")
+    return parser.parse_args()
+
 def main():
     """Main entry point for the web research agent."""
+    args = parse_args()
+    if args.resume and not args.checkpoint:
+        # Resuming implies checkpointing the continued session
+        args.checkpoint = DEFAULT_CHECKPOINT_PATH
     print("="*80)
     print("Dynamic Web Research Agent")
     print("="*80)
@@ -28,11 +49,19 @@ def main():
     
     # Initialize shared memory
     shared = {}
+    research_flow = create_research_flow(checkpoint_path=args.checkpoint)
     
     try:
-        # Run the research flow
-        debug("Main", "Starting research flow", level=1)
-        research_flow.run(shared)
+        if args.resume:
+            # Continue after the last node that completed before the interruption
+            debug("Main", f"Resuming research flow from {args.checkpoint}", level=1)
+            if research_flow.resume(shared) is None:
+                print(f"No unfinished session found in {args.checkpoint}")
+                return
+        else:
+            # Run the research flow
+            debug("Main", "Starting research flow", level=1)
+            research_flow.run(shared)
         
         debug("Main", "Research flow completed successfully", level=1)
         print("\nResearch flow completed")
@@ -40,10 +69,25 @@ def main():
     except KeyboardInterrupt:
         debug_error("Main", "Research flow interrupted by user")
         print("\nResearch flow interrupted by user")
+        if args.checkpoint:
+            location = "" if args.checkpoint == DEFAULT_CHECKPOINT_PATH else f" --checkpoint {args.checkpoint}"
+            print(f"Run `python main.py --resume{location}` to continue where it stopped")
     
     except Exception as e:
         debug_error("Main", f"Unhandled error occurred: {e}")
         print(f"\nError occurred: {e}")
+    
+    finally:
+        # Report timings even for interrupted sessions
+        if args.trace:
+            export_jsonl(args.trace)
+        if args.profile:
+            print("\n" + format_profile(profile_report()))
+            prefetcher = get_prefetcher()
+            if prefetcher is not None:
+                stats = prefetcher.stats()
+                print(f"\nSpeculative prefetch: {stats['prefetched']} pages, {stats['hit_rate']:.0%} used, "
+                      f"{stats['used_bytes']} bytes used, {stats['wasted_bytes']} bytes wasted")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
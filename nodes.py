@@ -1,18 +1,156 @@
-from pocketflow import Node
 import json
 import time
 from typing import Dict, Any, Optional
-from utils.call_llm import call_llm
-from utils.web_search import search_duckduckgo, search_google
-from utils.web_crawl import crawl_url
+from utils.call_llm import call_llm, call_llm_stream
+from utils.web_search import search_duckduckgo, search_google, search_all
+from utils.web_crawl import crawl_url, crawl_urls_sync
 from utils.debug import debug, debug_error, DEBUG_LEVEL
-from utils.data_structures import Decision, ToolOutput, AnalyzerReport
+from utils.data_structures import Decision, ToolOutput, AnalyzerReport, HITLOutput
+from utils.json_extract import StreamingJSONExtractor, extract_json, validate_json, JSONExtractionError
+from utils.structured_output import parse_structured
+from utils.tool_dispatch import ToolDispatcher
+from utils.passage_rank import pack_passages, rank_passages
+from utils.knowledge_store import KnowledgeStore
+from utils.url_utils import VisitedIndex
+from utils.circuit_breaker import get_breakers
+from utils.prefetch import get_prefetcher, PREFETCH_TOP_K
+from utils.instrumentation import TracedNode
+from utils.prompt_budget import PromptBuilder, PROMPT_KNOWLEDGE_TOKENS, PROMPT_HISTORY_TOKENS, PROMPT_REPORT_TOKENS
 
-class QueryInputNode(Node):
+# Values used for optional AnalyzerReport fields that the LLM leaves out or mistypes
+ANALYZER_REPORT_DEFAULTS = {
+    "assessment": "",
+    "suggestions_for_next_step": [],
+    "new_potential_urls": [],
+    "inconsistencies_found": None
+}
+
+def llm_json_validator(schema, structured=False, required=None, defaults=None):
+    """
+    Build the validate function passed to call_llm, so a response is cached only if it parses.
+    
+    Args:
+        schema: The TypedDict the response must satisfy
+        structured: Whether the response was constrained to the schema
+        required: Field names that must be present (default: every field in schema)
+        defaults: Values used for missing or mistyped optional fields
+        
+    Returns:
+        A function raising JSONExtractionError for response texts that do not yield a valid object
+    """
+    if structured:
+        return lambda response: parse_structured(response, schema, required=required, defaults=defaults, record=False)
+    return lambda response: extract_json(response, schema, required=required, defaults=defaults)
+
+def stream_llm_json(prompt, node_name, on_field=None, response_schema=None, validate=None):
+    """
+    Stream an LLM response while parsing its JSON object incrementally.
+    
+    Args:
+        prompt: The prompt to send
+        node_name: Name of the calling node for debug output
+        on_field: Optional callback invoked as on_field(extractor, key) whenever a top-level field completes
+        response_schema: Optional TypedDict the model is constrained to follow
+        validate: Optional function deciding whether the response may be cached (see llm_json_validator)
+        
+    Returns:
+        Tuple of (full response text, parsed object or None if no complete object was found)
+    """
+    extractor = StreamingJSONExtractor()
+    chunks = []
+    for chunk in call_llm_stream(prompt, response_schema=response_schema, validate=validate):
+        chunks.append(chunk)
+        for key in extractor.feed(chunk):
+            debug(node_name, f"Streamed field ready: {key}", level=3)
+            if on_field:
+                on_field(extractor, key)
+    return "".join(chunks), extractor.result()
+
+def request_llm_json(prompt, node_name, schema, stream=False, structured=False, on_field=None,
+                     required=None, defaults=None):
+    """
+    Ask the LLM for a JSON object and validate it against a TypedDict.
+    
+    Args:
+        prompt: The prompt to send
+        node_name: Name of the calling node for debug output
+        schema: The TypedDict the response must satisfy
+        stream: Whether to stream the response (see stream_llm_json)
+        structured: Whether to constrain the model to the schema instead of extracting JSON from free text
+        on_field: Optional streaming callback (see stream_llm_json)
+        required: Field names that must be present (default: every field in schema)
+        defaults: Values used for missing or mistyped optional fields
+        
+    Returns:
+        The validated object
+        
+    Raises:
+        JSONExtractionError: If no valid object could be obtained; .response holds the raw text if any
+    """
+    response_schema = schema if structured else None
+    validate = llm_json_validator(schema, structured, required, defaults)
+    if structured and not stream:
+        result = call_llm(prompt, response_schema=schema, validate=validate)
+        if result is None:
+            raise JSONExtractionError("Structured output request failed")
+        debug(node_name, f"Structured LLM response: {json.dumps(result)[:100]}...", level=3)
+        return validate_json(result, schema, required=required, defaults=defaults)
+    
+    streamed = None
+    if stream:
+        response, streamed = stream_llm_json(prompt, node_name, on_field=on_field, response_schema=response_schema,
+                                             validate=validate)
+    else:
+        response = call_llm(prompt, validate=validate)
+    
+    # Log the raw response for debugging
+    debug(node_name, f"Raw LLM response: {response[:100]}...", level=3)
+    
+    try:
+        if structured:
+            return parse_structured(response, schema, required=required, defaults=defaults, parsed=streamed)
+        return extract_json(response, schema, required=required, defaults=defaults, parsed=streamed)
+    except JSONExtractionError as e:
+        e.response = response
+        raise
+
+def prefetch_results(shared, results):
+    """
+    Start crawling the top search result links while the analyzer and decision LLM calls run.
+    
+    Args:
+        shared: The shared store, whose visited index excludes pages already crawled
+        results: The search results, dictionaries with a link
+    """
+    prefetcher = get_prefetcher()
+    if prefetcher is None or not isinstance(results, list):
+        return
+    links = [result.get("link") for result in results if isinstance(result, dict)]
+    index = shared.setdefault("visited_index", VisitedIndex())
+    prefetcher.prefetch(index.filter_new(links)[:PREFETCH_TOP_K])
+
+def take_prefetched(url):
+    """Return the page prefetched for url from search results, or None to crawl it now."""
+    prefetcher = get_prefetcher()
+    return prefetcher.take(url) if prefetcher is not None else None
+
+def take_dispatched(shared, action, target):
+    """Claim the tool call the decision started early for target, or None to run it now."""
+    dispatcher = shared.get("tool_dispatcher")
+    return dispatcher.take(action, target) if dispatcher is not None else None
+
+class QueryInputNode(TracedNode):
     """Node for receiving the initial query from the user."""
     
-    def exec(self, _):
+    def prep(self, shared):
+        # Batch runs pass the query in as a flow parameter
+        return self.params.get("query")
+    
+    def exec(self, query):
         debug("QueryInputNode", "Starting execution")
+        if query:
+            debug("QueryInputNode", f"Using query from flow params: {query}")
+            return query
         try:
             # Get question directly from user input
             user_question = input("Enter your research query: ")
@@ -28,16 +166,26 @@ class QueryInputNode(Node):
         shared["iteration_count"] = 0
         shared["research_history"] = []
         shared["extracted_information"] = {}
+        shared["knowledge"] = KnowledgeStore()
         shared["confidence_score"] = 0.0
         shared["visited_urls"] = []
+        shared["visited_index"] = VisitedIndex()
+        shared["tool_dispatcher"] = ToolDispatcher()
         shared["final_answer"] = None
         
         # Route to the next node
         return "default"
 
-class DecisionNode(Node):
+class DecisionNode(TracedNode):
     """Central controller node that decides the next research action."""
     
+    def __init__(self, stream=False, structured=False, **kwargs):
+        super().__init__(**kwargs)
+        # When streaming, the chosen tool starts as soon as next_action and query_or_url are parsed
+        self.stream = stream
+        # When structured, the model is constrained to the Decision schema
+        self.structured = structured
+    
     def prep(self, shared):
         # Prepare input for the decision-making process
         context = {
@@ -52,30 +200,53 @@ class DecisionNode(Node):
         # Add research history
         context["research_history"] = shared["research_history"]
         
+        # Hosts and search engines that keep failing, so the LLM does not pick them
+        context["unavailable_targets"] = get_breakers().open_breakers()
+        
+        # Where tool calls started while the decision streams are kept, and pages that need no fetch
+        context["tool_dispatcher"] = shared.setdefault("tool_dispatcher", ToolDispatcher())
+        context["visited_index"] = shared.setdefault("visited_index", VisitedIndex())
+        
         return context
     
-    def exec(self, context):
-        debug("DecisionNode", f"Starting execution (iteration: {context['iteration_count']})")
-        try:
-            # Construct prompt for the LLM
-            prompt = f"""You are the central Decision Node for a web research agent. Your role is to manage the research process, select appropriate tools, formulate search queries or identify URLs, and decide when the task is complete or requires human intervention.
+    def build_prompt(self, context):
+        """Build the decision prompt from the prepared context."""
+        prompt = f"""You are the central Decision Node for a web research agent. Your role is to manage the research process, select appropriate tools, formulate search queries or identify URLs, and decide when the task is complete or requires human intervention.
 
 Input Context:
 - Initial Query: {context['initial_query']}
 - Current Iteration: {context['iteration_count']}
 """
 
-            # Add analyzer report if available
-            if "analyzer_report" in context:
-                prompt += f"- Current Analyzer Report: {json.dumps(context['analyzer_report'])}\n"
-            
-            # Add research history summary
-            if context["research_history"]:
-                history_summary = "\n".join([f"- {i+1}. {entry['action']}: {entry['query_or_url']}" 
-                                           for i, entry in enumerate(context["research_history"][-3:])])
-                prompt += f"\nRecent Research History:\n{history_summary}\n"
-            
-            prompt += """
+        # Add analyzer report if available
+        if "analyzer_report" in context:
+            prompt += f"- Current Analyzer Report: {json.dumps(context['analyzer_report'])}\n"
+        
+        # Add research history summary
+        if context["research_history"]:
+            history_summary = "\n".join([f"- {i+1}. {entry['action']}: {entry['query_or_url']}" 
+                                       for i, entry in enumerate(context["research_history"][-3:])])
+            prompt += f"\nRecent Research History:\n{history_summary}\n"
+        
+        # Offer the analyzer's candidate URLs for a batch crawl
+        candidate_urls = context.get("analyzer_report", {}).get("new_potential_urls") or []
+        if candidate_urls:
+            prompt += f"\nCandidate URLs from the Analyzer: {json.dumps(candidate_urls)}\n"
+        
+        # Warn about targets that would fail immediately
+        unavailable = self.unavailable_summary(context.get("unavailable_targets") or [])
+        if unavailable:
+            prompt += f"\nUnavailable Targets (failing repeatedly; do not choose them, they will be skipped):\n{unavailable}\n"
+        
+        prompt += """
+Available Actions:
+- "search_duckduckgo": search the web with DuckDuckGo; query_or_url is the search query
+- "search_google": search the web with Google; query_or_url is the search query
+- "search_all": search DuckDuckGo and Google at once and merge the results; query_or_url is the search query (use when one engine's results were poor)
+- "crawl_url": fetch a single page; query_or_url is the URL
+- "crawl_urls": fetch several pages in parallel and analyze them together; query_or_url is a list of URLs or a comma-separated string of URLs (or null to crawl the Analyzer's candidate URLs)
+- "send_to_hitl": present the findings to the user; query_or_url is null
+
 Task:
 Based on the Input Context, determine the single best next action. Your decision should move towards answering the Initial Query efficiently while handling uncertainty and potential blockages.
 
@@ -93,71 +264,84 @@ Example Output:
 
 Now, provide the JSON object for the current task:
 """
+        return prompt
+    
+    def unavailable_summary(self, targets):
+        """Describe the open circuit breakers for the decision prompt, one line each."""
+        lines = []
+        for target in targets:
+            name = target["target"]
+            if name.startswith("search:"):
+                engine = name[len("search:"):]
+                name = f"{engine} search (action search_{engine})"
+            else:
+                name = f"URLs on {name}"
+            lines.append(f"- {name}: {target['failures']} failures, retry in {target['retry_in']}s")
+        return "\n".join(lines)
+    
+    def iteration_limit(self, context):
+        """Return a send_to_hitl decision once the max_iterations param is reached, otherwise None."""
+        # Unattended runs cap the number of research steps before reporting
+        max_iterations = self.params.get("max_iterations")
+        if max_iterations is not None and context["iteration_count"] >= max_iterations:
+            debug("DecisionNode", f"Reached max_iterations ({max_iterations}), sending to HITL")
+            return {
+                "next_action": "send_to_hitl",
+                "query_or_url": None,
+                "reasoning": f"Reached the limit of {max_iterations} research iterations"
+            }
+        return None
+    
+    def fallback(self, context, error):
+        """Return the decision used when the LLM response cannot be parsed."""
+        debug_error("DecisionNode", f"Failed to parse JSON response: {error}")
+        # Fallback for invalid JSON - construct a reasonable default
+        debug("DecisionNode", "Using fallback decision - perform DuckDuckGo search")
+        return {
+            "next_action": "search_duckduckgo",
+            "query_or_url": context['initial_query'],
+            "reasoning": "Failed to parse decision response, falling back to direct search"
+        }
+    
+    def exec(self, context):
+        debug("DecisionNode", f"Starting execution (iteration: {context['iteration_count']})")
+        limited = self.iteration_limit(context)
+        if limited:
+            return limited
+        
+        try:
+            prompt = self.build_prompt(context)
             
             # Call LLM to get the decision
             debug("DecisionNode", f"Calling LLM for decision with query: {context['initial_query']}")
-            response = call_llm(prompt)
-            
-            # Log the raw response for debugging
-            debug("DecisionNode", f"Raw LLM response: {response[:100]}...", level=3)
-            
-            # Try to extract JSON from the response if it's not pure JSON
+            # Extract and validate the decision JSON in a single pass
             try:
-                # Check if response is wrapped in backticks or other markers
-                if "```json" in response:
-                    # Extract JSON from code block
-                    json_start = response.find("```json") + 7
-                    json_end = response.find("```", json_start)
-                    if json_end > json_start:
-                        json_str = response[json_start:json_end].strip()
-                        debug("DecisionNode", "Found JSON in code block", level=2)
-                    else:
-                        json_str = response
-                elif "```" in response:
-                    # Extract from generic code block
-                    json_start = response.find("```") + 3
-                    json_end = response.find("```", json_start)
-                    if json_end > json_start:
-                        json_str = response[json_start:json_end].strip()
-                        debug("DecisionNode", "Found JSON in code block", level=2)
-                    else:
-                        json_str = response
-                elif "{" in response and "}" in response:
-                    # Try to extract JSON object
-                    json_start = response.find("{")
-                    json_end = response.rfind("}") + 1
-                    if json_end > json_start:
-                        json_str = response[json_start:json_end].strip()
-                        debug("DecisionNode", "Extracted JSON object from text", level=2)
-                    else:
-                        json_str = response
-                else:
-                    json_str = response
-                
-                debug("DecisionNode", f"Attempting to parse: {json_str[:100]}...", level=3)
-                decision = json.loads(json_str)
-                
-                # Validate the decision
-                if "next_action" not in decision or "query_or_url" not in decision or "reasoning" not in decision:
-                    debug_error("DecisionNode", "Decision is missing required fields")
-                    raise ValueError("Decision is missing required fields")
-                
+                decision = request_llm_json(
+                    prompt,
+                    "DecisionNode",
+                    Decision,
+                    stream=self.stream,
+                    structured=self.structured,
+                    on_field=lambda extractor, key: self._dispatch_when_ready(context, extractor, key)
+                )
                 debug("DecisionNode", f"Next action: {decision['next_action']}")
                 return decision
                 
-            except json.JSONDecodeError as e:
-                debug_error("DecisionNode", f"Failed to parse JSON response: {e}")
-                # Fallback for invalid JSON - construct a reasonable default
-                debug("DecisionNode", "Using fallback decision - perform DuckDuckGo search")
-                return {
-                    "next_action": "search_duckduckgo",
-                    "query_or_url": context['initial_query'],
-                    "reasoning": "Failed to parse decision response, falling back to direct search"
-                }
+            except JSONExtractionError as e:
+                return self.fallback(context, e)
         except Exception as e:
             debug_error("DecisionNode", e)
             raise
     
+    def _dispatch_when_ready(self, context, extractor, key):
+        # Start the tool call while the reasoning field is still streaming
+        fields = extractor.fields
+        dispatcher = context.get("tool_dispatcher")
+        if dispatcher is None:
+            return
+        if key in ("next_action", "query_or_url") and "next_action" in fields and "query_or_url" in fields:
+            dispatcher.dispatch(fields["next_action"], fields["query_or_url"], visited=context.get("visited_index"))
+    
     def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Decision):
         # Increment iteration count
         shared["iteration_count"] += 1
@@ -178,6 +362,11 @@ Now, provide the JSON object for the current task:
         # Get the action to return
         action = exec_res["next_action"]
         
+        # Early tool calls for anything but the final decision (e.g. from a failed attempt) are not needed
+        dispatcher = shared.get("tool_dispatcher")
+        if dispatcher is not None:
+            dispatcher.settle(action, exec_res["query_or_url"])
+        
         # === Structured Log (if DEBUG_LEVEL=0) ===
         if DEBUG_LEVEL == 0:
             print("\n" + "="*20 + f" Iteration {shared['iteration_count']} " + "="*20)
@@ -191,16 +380,18 @@ Now, provide the JSON object for the current task:
         debug("DecisionNode", f"[OUTPUT] Storing current_decision, last_decision_reasoning. Returning action: {action}", level=2)
         return action
 
-class DuckDuckGoSearchNode(Node):
+class DuckDuckGoSearchNode(TracedNode):
     """Node for performing DuckDuckGo searches."""
     
     def prep(self, shared):
         # Get the query from the decision made in the previous step
         query = shared.get("current_decision", {}).get("query_or_url")
         debug("DuckDuckGoSearchNode", f"[INPUT] Received query: {query[:50] if query else 'None'}...", level=2)
+        self.dispatched = None
         if not query:
              debug_error("DuckDuckGoSearchNode", "Missing query/url in current_decision")
              return None 
+        self.dispatched = take_dispatched(shared, "search_duckduckgo", query)
         return query
     
     def exec(self, query):
@@ -211,8 +402,9 @@ class DuckDuckGoSearchNode(Node):
 
         debug("DuckDuckGoSearchNode", f"Searching DuckDuckGo for: {query}")
         try:
-            # Perform DuckDuckGo search
-            results = search_duckduckgo(query)
+            # Perform DuckDuckGo search, unless the decision already started it (a retry searches again)
+            future, self.dispatched = self.dispatched, None
+            results = future.result() if future else search_duckduckgo(query)
             debug("DuckDuckGoSearchNode", f"Got {len(results)} results")
             return results # Return results on success
         except Exception as e:
@@ -242,6 +434,7 @@ class DuckDuckGoSearchNode(Node):
             "error": error # Add the error field
         }
         shared["latest_tool_output"] = tool_output
+        prefetch_results(shared, results_data)
         
         if error:
             debug("DuckDuckGoSearchNode", f"[OUTPUT] Stored latest_tool_output with ERROR: {error}.", level=2)
@@ -251,15 +444,17 @@ class DuckDuckGoSearchNode(Node):
         # Always route to AnalyzerNode, even if there was an error
         return "default"
 
-class GoogleSearchNode(Node):
+class GoogleSearchNode(TracedNode):
     """Node for performing Google searches."""
     
     def prep(self, shared):
         # Get the query from the decision made in the previous step
         query = shared.get("current_decision", {}).get("query_or_url")
+        self.dispatched = None
         if not query:
             debug_error("GoogleSearchNode", "Missing query/url in current_decision")
             return None
+        self.dispatched = take_dispatched(shared, "search_google", query)
         return query
     
     def exec(self, query):
@@ -270,8 +465,9 @@ class GoogleSearchNode(Node):
         
         debug("GoogleSearchNode", f"Searching Google for: {query}")
         try:    
-            # Perform Google search
-            results = search_google(query)
+            # Perform Google search, unless the decision already started it (a retry searches again)
+            future, self.dispatched = self.dispatched, None
+            results = future.result() if future else search_google(query)
             debug("GoogleSearchNode", f"Got {len(results)} results")
             return results
         except Exception as e:
@@ -289,24 +485,82 @@ class GoogleSearchNode(Node):
             "query": prep_res,
             "results": exec_res
         }
+        prefetch_results(shared, exec_res)
+        
+        # Route to the next node (AnalyzerNode)
+        return "default"
+
+class MultiSearchNode(TracedNode):
+    """Node for searching every engine at once and merging the results."""
+    
+    def prep(self, shared):
+        # Get the query from the decision made in the previous step
+        query = shared.get("current_decision", {}).get("query_or_url")
+        self.dispatched = None
+        if not query:
+            debug_error("MultiSearchNode", "Missing query/url in current_decision")
+            return None
+        self.dispatched = take_dispatched(shared, "search_all", query)
+        return query
+    
+    def exec(self, query):
+        # Skip if prep returned None
+        if query is None:
+            debug("MultiSearchNode", "Skipping execution due to missing query in prep")
+            return None
+        
+        debug("MultiSearchNode", f"Searching all engines for: {query}")
+        try:
+            # Search all engines concurrently, unless the decision already started it (a retry searches again)
+            future, self.dispatched = self.dispatched, None
+            results = future.result() if future else search_all(query)
+            debug("MultiSearchNode", f"Got {len(results)} merged results")
+            return results
+        except Exception as e:
+            error_message = f"Error during multi-engine search: {e}"
+            debug_error("MultiSearchNode", error_message)
+            return {"error": error_message}
+    
+    def post(self, shared, prep_res, exec_res):
+        # Skip post-processing if execution was skipped
+        if exec_res is None:
+            return "default"
+        
+        error = exec_res.get("error") if isinstance(exec_res, dict) else None
+        shared["latest_tool_output"] = {
+            "tool": "multi_search",
+            "query": prep_res,
+            "results": exec_res if not error else None,
+            "url": None,
+            "content": None,
+            "error": error
+        }
+        if not error:
+            prefetch_results(shared, exec_res)
         
         # Route to the next node (AnalyzerNode)
         return "default"
 
-class WebCrawlNode(Node):
+class WebCrawlNode(TracedNode):
     """Node for crawling specific URLs."""
     
+    # Results of URLs in this step that were already crawled this session, filled in by prep
+    known_pages = {}
+    
     def prep(self, shared):
-        # Get the URL from the decision made in the previous step
+        # Get the URL (or list of URLs) from the decision made in the previous step
         url = shared.get("current_decision", {}).get("query_or_url")
         if not url:
             debug_error("WebCrawlNode", "Missing query/url in current_decision")
             return None 
         
-        # Add to visited URLs
-        if url not in shared["visited_urls"]:
-            shared["visited_urls"].append(url)
-            
+        # Pages crawled earlier in the session are answered from the visited index instead of fetched again
+        index = shared.setdefault("visited_index", VisitedIndex())
+        urls = url if isinstance(url, list) else [url]
+        self.known_pages = {u: index.result(u) for u in urls if index.result(u)}
+        self.dispatched = None
+        if not isinstance(url, list) and url not in self.known_pages:
+            self.dispatched = take_dispatched(shared, "crawl_url", url)
         return url
     
     def exec(self, url):
@@ -315,10 +569,35 @@ class WebCrawlNode(Node):
             debug("WebCrawlNode", "Skipping execution due to missing URL in prep")
             return None
         
+        # Several URLs are fetched concurrently in a single step
+        if isinstance(url, list):
+            # Pages prefetched from search results are used as they are
+            fetched = {u: take_prefetched(u) for u in url if u not in self.known_pages}
+            fetched = {u: page for u, page in fetched.items() if page}
+            missing = [u for u in url if u not in self.known_pages and u not in fetched]
+            debug("WebCrawlNode", f"Crawling {len(missing)} URLs concurrently ({len(url) - len(missing)} already crawled or prefetched)")
+            try:
+                if missing:
+                    fetched.update(zip(missing, crawl_urls_sync(missing)))
+                pages = [self.known_pages.get(u) or fetched[u] for u in url]
+                debug("WebCrawlNode", f"Fetched {sum(1 for page in pages if page.get('status'))}/{len(pages)} pages")
+                return pages
+            except Exception as e:
+                debug_error("WebCrawlNode", e)
+                raise
+        
+        if url in self.known_pages:
+            debug("WebCrawlNode", f"Already crawled {url} this session, reusing the result")
+            return self.known_pages[url]
+        
         debug("WebCrawlNode", f"Crawling URL: {url}")
         try:
-            # Crawl the URL
-            content = crawl_url(url)
+            # Crawl the URL, unless it was prefetched from search results or the decision already started it
+            content = take_prefetched(url)
+            if content is None:
+                # A retry crawls the page again
+                future, self.dispatched = self.dispatched, None
+                content = future.result() if future else crawl_url(url)
             if content:
                 content_length = len(content.get('content', ''))
                 debug("WebCrawlNode", f"Fetched content ({content_length} chars)")
@@ -334,19 +613,82 @@ class WebCrawlNode(Node):
         if exec_res is None:
             return "default" # Still return default to proceed in the flow (to Analyzer)
             
-        # Store the crawl results
-        shared["latest_tool_output"] = {
-            "tool": "web_crawl",
-            "url": prep_res,
-            "content": exec_res
-        }
+        # Mark the pages that were crawled successfully as visited, keeping their results for repeat crawls;
+        # failed ones may be tried again later
+        index = shared.setdefault("visited_index", VisitedIndex())
+        for url, page in zip(prep_res if isinstance(prep_res, list) else [prep_res],
+                             exec_res if isinstance(prep_res, list) else [exec_res]):
+            if index.record(url, page):
+                shared.setdefault("visited_urls", []).append(url)
+        
+        # Store the crawl results; a multi-URL crawl keeps one entry per page in results
+        if isinstance(prep_res, list):
+            shared["latest_tool_output"] = {
+                "tool": "web_crawl",
+                "url": None,
+                "results": exec_res,
+                "content": None
+            }
+        else:
+            shared["latest_tool_output"] = {
+                "tool": "web_crawl",
+                "url": prep_res,
+                "content": exec_res
+            }
         
         # Route to the next node (AnalyzerNode)
         return "default"
 
-class AnalyzerNode(Node):
+class BatchWebCrawlNode(WebCrawlNode):
+    """Node for crawling several URLs in parallel and analyzing them in one pass."""
+    
+    def __init__(self, max_urls=5, **kwargs):
+        super().__init__(**kwargs)
+        self.max_urls = max_urls
+    
+    def prep(self, shared):
+        # Take the URLs from the decision, falling back to the analyzer's suggestions
+        urls = shared.get("current_decision", {}).get("query_or_url")
+        if isinstance(urls, str):
+            urls = [u.strip() for u in urls.replace("\n", ",").split(",")]
+        if not urls:
+            urls = shared.get("analyzer_report", {}).get("new_potential_urls") or []
+        
+        # Skip pages crawled earlier in the session (in any spelling) and cap the fan-out
+        index = shared.setdefault("visited_index", VisitedIndex())
+        urls = index.filter_new(urls)[:self.max_urls]
+        self.known_pages = {}
+        self.dispatched = None
+        if not urls:
+            debug_error("BatchWebCrawlNode", "No new URLs to crawl")
+            return None
+        
+        debug("BatchWebCrawlNode", f"[INPUT] Crawling {len(urls)} URLs: {urls}", level=2)
+        return urls
+    
+    def post(self, shared, prep_res, exec_res):
+        # Report that nothing was crawled rather than leave the previous tool output for the Analyzer
+        if prep_res is None:
+            shared["latest_tool_output"] = {
+                "tool": "web_crawl",
+                "url": None,
+                "results": [],
+                "content": None,
+                "error": "No new pages to crawl: every candidate URL was already visited this session"
+            }
+            return "default"
+        return super().post(shared, prep_res, exec_res)
+
+class AnalyzerNode(TracedNode):
     """Node for analyzing and synthesizing information from web sources."""
     
+    def __init__(self, stream=False, structured=False, **kwargs):
+        super().__init__(**kwargs)
+        # When streaming, the report is parsed incrementally as it arrives
+        self.stream = stream
+        # When structured, the model is constrained to the AnalyzerReport schema
+        self.structured = structured
+    
     def prep(self, shared: Dict[str, Any]):
         # Get the last decision made
         last_decision: Optional[Decision] = shared.get("current_decision")
@@ -368,13 +710,16 @@ class AnalyzerNode(Node):
         tool_name = tool_output.get("tool", "Unknown Tool")
         if tool_error:
              debug("AnalyzerNode", f"[INPUT] Preparing to analyze ERROR from {tool_name}: {tool_error[:100]}...", level=2)
-        elif tool_name in ["duckduckgo_search", "google_search"]:
+        elif tool_name in ["duckduckgo_search", "google_search", "multi_search"]:
             query = tool_output.get("query", "N/A")
             num_results = len(tool_output.get("results", []))
             debug("AnalyzerNode", f"[INPUT] Preparing to analyze {tool_name} results for query: '{query[:50]}...' ({num_results} results received).", level=2)
+        elif tool_name == "web_crawl" and tool_output.get("results") is not None:
+            num_pages = len(tool_output["results"])
+            debug("AnalyzerNode", f"[INPUT] Preparing to analyze {tool_name} content from {num_pages} pages.", level=2)
         elif tool_name == "web_crawl":
             url = tool_output.get("url", "N/A")
-            content_len = len(tool_output.get("content", {}).get("content", ""))
+            content_len = len((tool_output.get("content") or {}).get("content", ""))
             debug("AnalyzerNode", f"[INPUT] Preparing to analyze {tool_name} content from URL: {url} ({content_len} chars received).", level=2)
         else:
              debug("AnalyzerNode", f"[INPUT] Preparing to analyze output from {tool_name}", level=2)
@@ -388,44 +733,63 @@ class AnalyzerNode(Node):
         }
         return context
     
-    def exec(self, context: Optional[Dict[str, Any]]):
-        # Skip if prep returned None
-        if context is None:
-            # debug("AnalyzerNode", "Skipping execution (no tool output or going to HITL)") # Already logged in prep
-            return None
-        
-        debug("AnalyzerNode", f"Analyzing data from tool: {context['latest_tool_output']['tool']}")
-        try:
-            # Construct prompt for the LLM
-            prompt = f"""You are the Analyzer Node for a web research agent. Your task is to process raw data received from web tools, extract relevant information, structure it, assess its relevance, consistency, and trustworthiness, update the shared memory, and provide a comprehensive report and suggestions to the Decision Node.
+    def fact_sources(self, tool_output):
+        """URLs (or the search query) the latest facts were extracted from."""
+        if not tool_output or tool_output.get("error"):
+            return []
+        if tool_output.get("tool") == "web_crawl":
+            if tool_output.get("results") is not None:
+                return [page.get("url") for page in tool_output["results"] if page.get("status")]
+            return [tool_output.get("url")] if tool_output.get("url") else []
+        if tool_output.get("query"):
+            return [f"{tool_output.get('tool')}: {tool_output['query']}"]
+        return []
+    
+    def relevance_query(self, context):
+        """Text crawled passages are ranked against: the research query and why the page was fetched."""
+        return f"{context['initial_query']}\n{context['last_decision_reasoning']}"
+    
+    def build_prompt(self, context):
+        """Build the analysis prompt for the latest tool output."""
+        builder = PromptBuilder("AnalyzerNode")
+        builder.add(f"""You are the Analyzer Node for a web research agent. Your task is to process raw data received from web tools, extract relevant information, structure it, assess its relevance, consistency, and trustworthiness, update the shared memory, and provide a comprehensive report and suggestions to the Decision Node.
 
 Input Context:
 - Initial Query: {context['initial_query']}
 - Reasoning for last action: {context['last_decision_reasoning']} # Added Reasoning (Improvement 5)
 - Tool Used: {context['latest_tool_output']['tool']}
-"""
+""")
 
-            # Add tool-specific context OR error message
-            tool_error = context['latest_tool_output'].get('error')
-            if tool_error:
-                 prompt += f"- Tool Execution Error: {tool_error}\n"
-            elif context['latest_tool_output']['tool'] in ['duckduckgo_search', 'google_search']:
-                prompt += f"- Search Query: {context['latest_tool_output']['query']}\n"
-                prompt += f"- Search Results: {json.dumps(context['latest_tool_output']['results'])}\n"
-            elif context['latest_tool_output']['tool'] == 'web_crawl':
-                prompt += f"- Crawled URL: {context['latest_tool_output']['url']}\n"
-                # Limit content size to avoid token limits
-                content_preview = "" # Default empty string
-                crawl_content = context['latest_tool_output'].get('content')
-                if crawl_content and isinstance(crawl_content, dict):
-                     page_content = crawl_content.get('content', '')
-                     content_preview = page_content[:5000] + "..." if len(page_content) > 5000 else page_content
-                prompt += f"- Page Content: {content_preview}\n"
-            
-            if context['extracted_information']:
-                prompt += f"\nExisting Information:\n{json.dumps(context['extracted_information'])}\n"
-            
-            prompt += """
+        # Add tool-specific context OR error message
+        tool_context = ""
+        tool_error = context['latest_tool_output'].get('error')
+        if tool_error:
+             tool_context += f"- Tool Execution Error: {tool_error}\n"
+        elif context['latest_tool_output']['tool'] in ['duckduckgo_search', 'google_search', 'multi_search']:
+            tool_context += f"- Search Query: {context['latest_tool_output']['query']}\n"
+            tool_context += f"- Search Results: {json.dumps(context['latest_tool_output']['results'])}\n"
+        elif context['latest_tool_output']['tool'] == 'web_crawl' and context['latest_tool_output'].get('results') is not None:
+            # Several pages crawled in one step share the content budget; the most relevant passages are kept
+            pages = context['latest_tool_output']['results']
+            contents = pack_passages([page.get('content', '') for page in pages], self.relevance_query(context))
+            for page, content_preview in zip(pages, contents):
+                tool_context += f"- Crawled URL: {page.get('url')} (title: {page.get('title')})\n"
+                tool_context += f"- Page Content: {content_preview}\n"
+        elif context['latest_tool_output']['tool'] == 'web_crawl':
+            tool_context += f"- Crawled URL: {context['latest_tool_output']['url']}\n"
+            # Keep the passages most relevant to the query within the token budget
+            content_preview = "" # Default empty string
+            crawl_content = context['latest_tool_output'].get('content')
+            if crawl_content and isinstance(crawl_content, dict):
+                 content_preview = rank_passages(crawl_content.get('content', ''), self.relevance_query(context))
+            tool_context += f"- Page Content: {content_preview}\n"
+        builder.add(tool_context, section="tool_output")
+        
+        # Accumulated knowledge is fitted to its budget so the prompt stops growing with the session
+        if context['extracted_information']:
+            builder.add_json("\nExisting Information:\n", context['extracted_information'], PROMPT_KNOWLEDGE_TOKENS, "knowledge")
+        
+        builder.add("""
 Task:
 1. Process the input. If a 'Tool Execution Error' is present, note the failure. Otherwise, process the raw tool output, considering the reasoning for why this tool was chosen.
 2. Extract all information potentially relevant to the Initial Query or any of its identifiable parts. If there was a tool error, this might be empty.
@@ -452,57 +816,48 @@ Example Output:
 ```
 
 Now, provide the JSON object for the current task:
-"""
-            
-            # Call LLM to analyze the data
-            response = call_llm(prompt)
-            
-            # Log the raw response for debugging
-            debug("AnalyzerNode", f"Raw LLM response: {response[:100]}...", level=3)
+""")
+        return builder.build()
+    
+    def fallback(self, context, error):
+        """Return the report used when the LLM response cannot be parsed."""
+        debug_error("AnalyzerNode", f"Failed to parse JSON response: {error}")
+        # Fallback for invalid JSON
+        return {
+            "extracted_info": {},
+            "assessment": "Failed to parse analyzer response",
+            "confidence_score": 0.0,
+            "suggestions_for_next_step": ["Retry with different approach"],
+            "new_potential_urls": [],
+            "inconsistencies_found": None
+        }
+    
+    def exec(self, context: Optional[Dict[str, Any]]):
+        # Skip if prep returned None
+        if context is None:
+            # debug("AnalyzerNode", "Skipping execution (no tool output or going to HITL)") # Already logged in prep
+            return None
+        
+        debug("AnalyzerNode", f"Analyzing data from tool: {context['latest_tool_output']['tool']}")
+        try:
+            prompt = self.build_prompt(context)
             
-            # Try to extract JSON from the response if it's not pure JSON
+            # Call LLM to analyze the data, then extract and validate the report in a single pass
             try:
-                # Check if response is wrapped in backticks or other markers
-                if "```json" in response:
-                    # Extract JSON from code block
-                    json_start = response.find("```json") + 7
-                    json_end = response.find("```", json_start)
-                    json_str = response[json_start:json_end].strip() if json_end > json_start else response
-                elif "```" in response:
-                    # Extract from generic code block
-                    json_start = response.find("```") + 3
-                    json_end = response.find("```", json_start)
-                    json_str = response[json_start:json_end].strip() if json_end > json_start else response
-                elif "{" in response and "}" in response:
-                    # Try to extract JSON object
-                    json_start = response.find("{")
-                    json_end = response.rfind("}") + 1
-                    json_str = response[json_start:json_end].strip() if json_end > json_start else response
-                else:
-                    json_str = response
-                
-                debug("AnalyzerNode", f"Attempting to parse: {json_str[:100]}...", level=3)
-                analysis = json.loads(json_str)
-                
-                # Validate the analysis
-                if "extracted_info" not in analysis or "confidence_score" not in analysis:
-                    debug_error("AnalyzerNode", "Analysis is missing required fields")
-                    raise ValueError("Analysis is missing required fields")
-                
+                analysis = request_llm_json(
+                    prompt,
+                    "AnalyzerNode",
+                    AnalyzerReport,
+                    stream=self.stream,
+                    structured=self.structured,
+                    required=("extracted_info", "confidence_score"),
+                    defaults=ANALYZER_REPORT_DEFAULTS
+                )
                 debug("AnalyzerNode", f"Analysis complete with confidence: {analysis['confidence_score']}")
                 return analysis
                 
-            except json.JSONDecodeError as e:
-                debug_error("AnalyzerNode", f"Failed to parse JSON response: {e}")
-                # Fallback for invalid JSON
-                return {
-                    "extracted_info": {},
-                    "assessment": "Failed to parse analyzer response",
-                    "confidence_score": 0.0,
-                    "suggestions_for_next_step": ["Retry with different approach"],
-                    "new_potential_urls": [],
-                    "inconsistencies_found": None
-                }
+            except JSONExtractionError as e:
+                return self.fallback(context, e)
         except Exception as e:
             debug_error("AnalyzerNode", e)
             raise
@@ -513,12 +868,22 @@ Now, provide the JSON object for the current task:
             debug("AnalyzerNode", "[OUTPUT] Skipped storing output.", level=2)
             return "default"
             
-        # Update shared memory with extracted information
+        # Merge the extracted facts into the knowledge store, dropping duplicates of what is already known
         updated_keys = []
         if isinstance(exec_res["extracted_info"], dict):
-            for key, value in exec_res["extracted_info"].items():
-                shared["extracted_information"][key] = value
-                updated_keys.append(key)
+            store = shared.get("knowledge")
+            if store is None:
+                store = shared["knowledge"] = KnowledgeStore()
+                store.merge(shared.get("extracted_information") or {})
+            counts = store.merge(exec_res["extracted_info"], sources=self.fact_sources(shared.get("latest_tool_output")))
+            shared["extracted_information"] = store.compact_view()
+            updated_keys = list(exec_res["extracted_info"])
+            debug("AnalyzerNode", f"[OUTPUT] Knowledge store: {counts['added']} added, {counts['updated']} updated, "
+                                  f"{counts['duplicate']} duplicates ({len(store)} facts)", level=2)
+        
+        # Only offer URLs that have not been crawled yet
+        exec_res["new_potential_urls"] = shared.setdefault("visited_index", VisitedIndex()).filter_new(
+            exec_res.get("new_potential_urls") or [])
         
         shared["confidence_score"] = exec_res["confidence_score"]
         shared["analyzer_report"] = exec_res
@@ -537,84 +902,89 @@ Now, provide the JSON object for the current task:
         debug("AnalyzerNode", f"[OUTPUT] Stored analyzer_report. Confidence: {shared['confidence_score']}. Updated info keys: {updated_keys}", level=2)
         return "default"
 
-class HITLOutputNode(Node):
+class HITLOutputNode(TracedNode):
     """Node for synthesizing findings and presenting them to the user."""
     
+    def __init__(self, structured=False, **kwargs):
+        super().__init__(**kwargs)
+        # When structured, the model is constrained to the HITLOutput schema
+        self.structured = structured
+    
     def prep(self, shared):
         # This node runs when DecisionNode directs to 'send_to_hitl'.
         # We prepare the context needed for the final synthesis.
         context = {
             "initial_query": shared.get("original_query", "N/A"),
             "research_history": shared.get("research_history", []),
-            "extracted_information": shared.get("extracted_information", {}),
+            "extracted_information": self.knowledge_view(shared),
             "final_analyzer_report": shared.get("analyzer_report", {})
         }
         return context
     
-    def exec(self, context):
-        # If prep returned None (although it shouldn't in this revised logic), skip.
-        if context is None:
-             debug("HITLOutputNode", "Skipping execution due to missing context in prep")
-             return None
-
-        debug("HITLOutputNode", "Synthesizing final answer")
-        try:
-            # Construct prompt for the LLM to synthesize the final answer
-            prompt = f"""You are the Report Generator for the Human-in-the-Loop interface. Your task is to synthesize research findings into a clear, concise answer, provide a brief research narrative, and list key supporting sources.
+    def knowledge_view(self, shared):
+        """Extracted facts with the sources they came from, so the answer can cite them."""
+        store = shared.get("knowledge")
+        if store is None:
+            return shared.get("extracted_information", {})
+        return store.compact_view(with_sources=True)
+    
+    def build_prompt(self, context):
+        """Build the prompt asking the LLM to synthesize the final answer."""
+        builder = PromptBuilder("HITLOutputNode")
+        builder.add(f"""You are the Report Generator for the Human-in-the-Loop interface. Your task is to synthesize research findings into a clear, concise answer, provide a brief research narrative, and list key supporting sources.
 
 Input Context:
 - Initial Query: {context['initial_query']}
-- Final Extracted Information: {json.dumps(context['extracted_information'])}
-- Final Analyzer Assessment: {json.dumps(context['final_analyzer_report'])}
-- Research Journey Summary: {json.dumps(context['research_history'])}
-
+""")
+        # Session-length context is fitted to per-section budgets
+        builder.add_json("- Final Extracted Information: ", context['extracted_information'], PROMPT_KNOWLEDGE_TOKENS, "knowledge")
+        builder.add_json("- Final Analyzer Assessment: ", context['final_analyzer_report'], PROMPT_REPORT_TOKENS, "report")
+        builder.add_history("- Research Journey Summary:", context['research_history'], PROMPT_HISTORY_TOKENS)
+        builder.add("""
 Task:
 Synthesize a clear answer to the Initial Query based *only* on the provided extracted information and assessment. Create a concise research journey summary. List key sources if available in the extracted information.
 
 Output Format:
 Respond ONLY with a JSON object containing the final answer and summary. Do not include any explanatory text before or after the JSON.
 
-{{
+{
   "final_answer": "<Synthesized answer to the query>",
   "research_summary": "<Brief summary of the research steps taken>",
   "key_sources": ["<URL/Source 1>", "<URL/Source 2>"]
-}}
-"""
-            
-            response = call_llm(prompt)
-            
-            # Log the raw response for debugging
-            debug("HITLOutputNode", f"Raw LLM response: {response[:100]}...", level=3)
+}
+""")
+        return builder.build()
+    
+    def fallback(self, context, error):
+        """Return the report used when the LLM response cannot be parsed."""
+        debug_error("HITLOutputNode", f"Failed to parse JSON response: {error}")
+        # Fallback: return the raw response as the answer
+        final_answer = error.response or "Error: No answer generated."
+        return {"final_answer": final_answer, "research_summary": "Failed to parse structured output.", "key_sources": []}
+    
+    def exec(self, context):
+        # If prep returned None (although it shouldn't in this revised logic), skip.
+        if context is None:
+             debug("HITLOutputNode", "Skipping execution due to missing context in prep")
+             return None
 
-            # Similar JSON parsing logic as in DecisionNode
+        debug("HITLOutputNode", "Synthesizing final answer")
+        try:
+            prompt = self.build_prompt(context)
+            
+            # Extract and validate the report JSON in a single pass
             try:
-                if "```json" in response:
-                    json_start = response.find("```json") + 7
-                    json_end = response.find("```", json_start)
-                    json_str = response[json_start:json_end].strip() if json_end > json_start else response
-                elif "```" in response:
-                     json_start = response.find("```") + 3
-                     json_end = response.find("```", json_start)
-                     json_str = response[json_start:json_end].strip() if json_end > json_start else response
-                elif "{" in response and "}" in response:
-                    json_start = response.find("{")
-                    json_end = response.rfind("}") + 1
-                    json_str = response[json_start:json_end].strip() if json_end > json_start else response
-                else:
-                    json_str = response
-
-                debug("HITLOutputNode", f"Attempting to parse: {json_str[:100]}...", level=3)
-                output = json.loads(json_str)
-                
-                if "final_answer" not in output:
-                    raise ValueError("HITL output missing 'final_answer' field")
-                
-                return output
+                return request_llm_json(
+                    prompt,
+                    "HITLOutputNode",
+                    HITLOutput,
+                    structured=self.structured,
+                    required=("final_answer",),
+                    defaults={"research_summary": "", "key_sources": []}
+                )
 
-            except json.JSONDecodeError as e:
-                debug_error("HITLOutputNode", f"Failed to parse JSON response: {e}")
-                # Fallback: return the raw response as the answer
-                return {"final_answer": response, "research_summary": "Failed to parse structured output.", "key_sources": []}
+            except JSONExtractionError as e:
+                return self.fallback(context, e)
                 
         except Exception as e:
             debug_error("HITLOutputNode", e)
@@ -635,7 +1005,7 @@ Respond ONLY with a JSON object containing the final answer and summary. Do not
         # Route to the feedback node
         return "default"
 
-class HumanFeedbackNode(Node):
+class HumanFeedbackNode(TracedNode):
     """Node for processing human feedback on the research results."""
     
     def prep(self, shared):
@@ -0,0 +1,219 @@
+import asyncio
+import json
+from pocketflow import AsyncNode
+from utils.call_llm import call_llm_async
+from utils.web_crawl import crawl_urls
+from utils.debug import debug, debug_error
+from utils.instrumentation import Span
+from utils.data_structures import Decision, AnalyzerReport, HITLOutput
+from utils.json_extract import extract_json, validate_json, JSONExtractionError
+from nodes import (
+    QueryInputNode,
+    DecisionNode,
+    DuckDuckGoSearchNode,
+    GoogleSearchNode,
+    MultiSearchNode,
+    WebCrawlNode,
+    BatchWebCrawlNode,
+    AnalyzerNode,
+    HITLOutputNode,
+    HumanFeedbackNode,
+    ANALYZER_REPORT_DEFAULTS,
+    llm_json_validator,
+    take_prefetched
+)
+
+async def request_llm_json_async(prompt, node_name, schema, structured=False, required=None, defaults=None):
+    """
+    Asynchronous version of request_llm_json. Responses are not streamed.
+
+    Args:
+        prompt: The prompt to send
+        node_name: Name of the calling node for debug output
+        schema: The TypedDict the response must satisfy
+        structured: Whether to constrain the model to the schema instead of extracting JSON from free text
+        required: Field names that must be present (default: every field in schema)
+        defaults: Values used for missing or mistyped optional fields
+
+    Returns:
+        The validated object
+
+    Raises:
+        JSONExtractionError: If no valid object could be obtained; .response holds the raw text if any
+    """
+    validate = llm_json_validator(schema, structured, required, defaults)
+    if structured:
+        result = await call_llm_async(prompt, response_schema=schema, validate=validate)
+        if result is None:
+            raise JSONExtractionError("Structured output request failed")
+        debug(node_name, f"Structured LLM response: {json.dumps(result)[:100]}...", level=3)
+        return validate_json(result, schema, required=required, defaults=defaults)
+
+    response = await call_llm_async(prompt, validate=validate)
+
+    # Log the raw response for debugging
+    debug(node_name, f"Raw LLM response: {response[:100]}...", level=3)
+
+    try:
+        return extract_json(response, schema, required=required, defaults=defaults)
+    except JSONExtractionError as e:
+        e.response = response
+        raise
+
+class AsyncResearchNode(AsyncNode):
+    """
+    Base for async versions of the nodes in nodes.py.
+
+    Combined with a synchronous node class, it reuses that node's prep and
+    post, which only touch the shared store. exec runs in a worker thread
+    by default; subclasses override exec_async to await their I/O directly.
+    Each phase is recorded as a span, like TracedNode does for sync nodes.
+    """
+
+    async def _run_async(self, shared):
+        name = type(self).__name__
+        with Span("node", name) as node_span:
+            with Span("prep", name):
+                prep_res = await self.prep_async(shared)
+            with Span("exec", name):
+                exec_res = await self._exec(prep_res)
+            with Span("post", name):
+                action = await self.post_async(shared, prep_res, exec_res)
+            node_span.set(action=action)
+        return action
+
+    async def prep_async(self, shared):
+        return self.prep(shared)
+
+    async def exec_async(self, prep_res):
+        return await asyncio.to_thread(self.exec, prep_res)
+
+    async def post_async(self, shared, prep_res, exec_res):
+        return self.post(shared, prep_res, exec_res)
+
+class AsyncQueryInputNode(AsyncResearchNode, QueryInputNode):
+    """Async version of QueryInputNode; interactive input is read in a worker thread."""
+
+class AsyncDecisionNode(AsyncResearchNode, DecisionNode):
+    """Async version of DecisionNode. Decisions are not streamed, so tools are not started early."""
+
+    async def exec_async(self, context):
+        debug("DecisionNode", f"Starting execution (iteration: {context['iteration_count']})")
+        limited = self.iteration_limit(context)
+        if limited:
+            return limited
+
+        try:
+            prompt = self.build_prompt(context)
+
+            # Call LLM to get the decision
+            debug("DecisionNode", f"Calling LLM for decision with query: {context['initial_query']}")
+            try:
+                decision = await request_llm_json_async(prompt, "DecisionNode", Decision, structured=self.structured)
+                debug("DecisionNode", f"Next action: {decision['next_action']}")
+                return decision
+
+            except JSONExtractionError as e:
+                return self.fallback(context, e)
+        except Exception as e:
+            debug_error("DecisionNode", e)
+            raise
+
+class AsyncDuckDuckGoSearchNode(AsyncResearchNode, DuckDuckGoSearchNode):
+    """Async version of DuckDuckGoSearchNode; the blocking search client runs in a worker thread."""
+
+class AsyncGoogleSearchNode(AsyncResearchNode, GoogleSearchNode):
+    """Async version of GoogleSearchNode; the blocking search client runs in a worker thread."""
+
+class AsyncMultiSearchNode(AsyncResearchNode, MultiSearchNode):
+    """Async version of MultiSearchNode; the engines already run concurrently on the search pool."""
+
+class AsyncWebCrawlNode(AsyncResearchNode, WebCrawlNode):
+    """Async version of WebCrawlNode; several URLs are awaited with crawl_urls on the running loop."""
+
+    async def exec_async(self, url):
+        if not isinstance(url, list):
+            return await asyncio.to_thread(self.exec, url)
+
+        # Pages prefetched from search results are used as they are; claiming one may wait for its crawl
+        candidates = [u for u in url if u not in self.known_pages]
+        prefetched = await asyncio.gather(*(asyncio.to_thread(take_prefetched, u) for u in candidates))
+        fetched = {u: page for u, page in zip(candidates, prefetched) if page}
+        missing = [u for u in candidates if u not in fetched]
+        debug("WebCrawlNode", f"Crawling {len(missing)} URLs concurrently ({len(url) - len(missing)} already crawled or prefetched)")
+        try:
+            if missing:
+                fetched.update(zip(missing, await crawl_urls(missing)))
+            pages = [self.known_pages.get(u) or fetched[u] for u in url]
+            debug("WebCrawlNode", f"Fetched {sum(1 for page in pages if page.get('status'))}/{len(pages)} pages")
+            return pages
+        except Exception as e:
+            debug_error("WebCrawlNode", e)
+            raise
+
+class AsyncBatchWebCrawlNode(AsyncWebCrawlNode, BatchWebCrawlNode):
+    """Async version of BatchWebCrawlNode."""
+
+class AsyncAnalyzerNode(AsyncResearchNode, AnalyzerNode):
+    """Async version of AnalyzerNode."""
+
+    async def exec_async(self, context):
+        # Skip if prep returned None
+        if context is None:
+            return None
+
+        debug("AnalyzerNode", f"Analyzing data from tool: {context['latest_tool_output']['tool']}")
+        try:
+            prompt = self.build_prompt(context)
+
+            # Call LLM to analyze the data, then extract and validate the report in a single pass
+            try:
+                analysis = await request_llm_json_async(
+                    prompt,
+                    "AnalyzerNode",
+                    AnalyzerReport,
+                    structured=self.structured,
+                    required=("extracted_info", "confidence_score"),
+                    defaults=ANALYZER_REPORT_DEFAULTS
+                )
+                debug("AnalyzerNode", f"Analysis complete with confidence: {analysis['confidence_score']}")
+                return analysis
+
+            except JSONExtractionError as e:
+                return self.fallback(context, e)
+        except Exception as e:
+            debug_error("AnalyzerNode", e)
+            raise
+
+class AsyncHITLOutputNode(AsyncResearchNode, HITLOutputNode):
+    """Async version of HITLOutputNode."""
+
+    async def exec_async(self, context):
+        if context is None:
+            debug("HITLOutputNode", "Skipping execution due to missing context in prep")
+            return None
+
+        debug("HITLOutputNode", "Synthesizing final answer")
+        try:
+            prompt = self.build_prompt(context)
+
+            # Extract and validate the report JSON in a single pass
+            try:
+                return await request_llm_json_async(
+                    prompt,
+                    "HITLOutputNode",
+                    HITLOutput,
+                    structured=self.structured,
+                    required=("final_answer",),
+                    defaults={"research_summary": "", "key_sources": []}
+                )
+
+            except JSONExtractionError as e:
+                return self.fallback(context, e)
+
+        except Exception as e:
+            debug_error("HITLOutputNode", e)
+            raise
+
+class AsyncHumanFeedbackNode(AsyncResearchNode, HumanFeedbackNode):
+    """Async version of HumanFeedbackNode; feedback is read in a worker thread."""
@@ -0,0 +1,121 @@
+import unittest
+import asyncio
+from unittest.mock import patch
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch import read_queries, run_batch, run_batch_async
+from utils.data_structures import Decision, AnalyzerReport
+from utils.circuit_breaker import BreakerRegistry
+
+def fake_request_llm_json(prompt, node_name, schema, **kwargs):
+    """Always search, report one finding per query and answer with the query text."""
+    query = prompt.split("Initial Query: ", 1)[1].split("\n", 1)[0]
+    if schema is Decision:
+        return {"next_action": "search_duckduckgo", "query_or_url": query, "reasoning": "search"}
+    if schema is AnalyzerReport:
+        return {"extracted_info": {query: "found"}, "assessment": "ok", "confidence_score": 0.5,
+                "suggestions_for_next_step": [], "new_potential_urls": [], "inconsistencies_found": None}
+    return {"final_answer": f"Answer to {query}", "research_summary": "summary", "key_sources": []}
+
+async def fake_request_llm_json_async(prompt, node_name, schema, **kwargs):
+    await asyncio.sleep(0.01)
+    return fake_request_llm_json(prompt, node_name, schema)
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # The fake search results must not start real crawls or touch the shared robots.txt cache
+        for target in ('nodes.get_prefetcher', 'utils.web_crawl.get_robots_policy'):
+            patcher = patch(target, return_value=None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Nor the breaker state file in the working tree
+        breakers = BreakerRegistry()
+        for target in ('nodes.get_breakers', 'utils.web_search.get_breakers', 'utils.web_crawl.get_breakers'):
+            patcher = patch(target, return_value=breakers)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _search(self, query):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return [{"title": query, "link": "https://example.com", "snippet": "s"}]
+
+    def test_read_queries(self):
+        """Test that objects, bare strings and blank lines are handled"""
+        path = os.path.join(self.tmp.name, "queries.jsonl")
+        with open(path, "w") as f:
+            f.write('{"id": "q1", "query": "first"}\n\n"second"\n{"id": "q3"}\n')
+
+        self.assertEqual(read_queries(path), [{"id": "q1", "query": "first"}, {"id": 3, "query": "second"}])
+
+    def test_read_queries_skips_malformed_lines(self):
+        """Test that a line that is not valid JSON is reported and the rest are still read"""
+        path = os.path.join(self.tmp.name, "queries.jsonl")
+        with open(path, "w") as f:
+            f.write('{"id": "q1", "query": "first"}\n{"id": "q2", "query": \n[1, 2]\n"third"\n')
+
+        with patch('batch.debug_error') as mock_error:
+            self.assertEqual(read_queries(path), [{"id": "q1", "query": "first"}, {"id": 4, "query": "third"}])
+        self.assertIn("Line 2", mock_error.call_args_list[0].args[1])
+        self.assertIn("Line 3", mock_error.call_args_list[1].args[1])
+
+    def test_queries_run_concurrently_with_separate_state(self):
+        """Test that each query gets its own answer and the worker pool bounds concurrency"""
+        queries = [{"id": i, "query": f"question {i}"} for i in range(6)]
+        output = os.path.join(self.tmp.name, "answers.jsonl")
+
+        with patch('nodes.request_llm_json', side_effect=fake_request_llm_json), \
+                patch('nodes.search_duckduckgo', side_effect=self._search), \
+                patch('nodes.take_dispatched', return_value=None):
+            succeeded = run_batch(queries, output, max_workers=3, max_iterations=2)
+
+        self.assertEqual(succeeded, 6)
+        with open(output) as f:
+            records = {record["id"]: record for record in map(json.loads, f)}
+        self.assertEqual(len(records), 6)
+        for i, record in records.items():
+            self.assertEqual(record["final_answer"], f"Answer to question {i}")
+            # max_iterations forces the answer after two searches plus the final decision
+            self.assertEqual(record["iterations"], 3)
+            self.assertIsNone(record["error"])
+        self.assertGreater(self.peak, 1)
+        self.assertLessEqual(self.peak, 3)
+
+    def test_async_sessions_share_one_event_loop(self):
+        """Test that the async flow answers every query with bounded concurrent sessions"""
+        queries = [{"id": i, "query": f"question {i}"} for i in range(8)]
+        output = os.path.join(self.tmp.name, "answers.jsonl")
+
+        with patch('nodes_async.request_llm_json_async', side_effect=fake_request_llm_json_async), \
+                patch('nodes.search_duckduckgo', side_effect=self._search), \
+                patch('nodes.take_dispatched', return_value=None):
+            succeeded = asyncio.run(run_batch_async(queries, output, max_sessions=4, max_iterations=1))
+
+        self.assertEqual(succeeded, 8)
+        with open(output) as f:
+            records = {record["id"]: record for record in map(json.loads, f)}
+        self.assertEqual({i: r["final_answer"] for i, r in records.items()},
+                         {i: f"Answer to question {i}" for i in range(8)})
+        self.assertGreater(self.peak, 1)
+        self.assertLessEqual(self.peak, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.cache import LRUCache, PersistentCache, TieredCache
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted when full"""
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    @patch('utils.cache.time.time')
+    def test_entries_expire(self, mock_time):
+        """Test that entries are dropped once their TTL has passed"""
+        mock_time.return_value = 1000.0
+        cache = LRUCache(ttl=10)
+        cache.set("key", "value")
+
+        mock_time.return_value = 1005.0
+        self.assertEqual(cache.get("key"), "value")
+        mock_time.return_value = 1011.0
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+class TestPersistentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_values_survive_reopening(self):
+        """Test that values are persisted across cache instances"""
+        cache = PersistentCache(self.path)
+        cache.set("key", {"results": [1, 2, 3]})
+        cache.close()
+
+        reopened = PersistentCache(self.path)
+        self.assertEqual(reopened.get("key"), {"results": [1, 2, 3]})
+        reopened.close()
+
+    def test_expired_values_are_ignored(self):
+        """Test that expired values are treated as misses"""
+        cache = PersistentCache(self.path)
+        cache.set("key", "value", ttl=-1)
+        self.assertIsNone(cache.get("key"))
+        cache.close()
+
+    def test_max_entries(self):
+        """Test that the store keeps at most max_entries values"""
+        cache = PersistentCache(self.path, max_entries=3)
+        for i in range(5):
+            cache.set(f"key{i}", i)
+        count = cache._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        self.assertEqual(count, 3)
+        self.assertEqual(cache.get("key4"), 4)
+        cache.close()
+
+class TestTieredCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = PersistentCache(os.path.join(self.tmpdir.name, "cache.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_disk_hits_are_promoted_to_memory(self):
+        """Test that a value found on disk is served from memory afterwards"""
+        TieredCache("Writer", store=self.store).set("key", "value")
+        cache = TieredCache("Reader", store=self.store)
+
+        self.assertEqual(cache.get("key"), "value")
+        self.assertEqual(cache.get("key"), "value")
+        self.assertIsNone(cache.get("other"))
+
+        stats = cache.stats()
+        self.assertEqual(stats["disk_hits"], 1)
+        self.assertEqual(stats["memory_hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+
+    @patch('utils.cache.time.time')
+    def test_promoted_entries_keep_their_remaining_lifetime(self, mock_time):
+        """Test that a disk hit expires from memory when it would have expired on disk"""
+        mock_time.return_value = 1000.0
+        TieredCache("Writer", ttl=10, store=self.store).set("key", "value")
+
+        mock_time.return_value = 1008.0
+        cache = TieredCache("Reader", ttl=10, store=self.store)
+        self.assertEqual(cache.get("key"), "value")
+
+        mock_time.return_value = 1011.0
+        self.assertIsNone(cache.memory.get("key"))
+        self.assertIsNone(cache.get("key"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,33 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+import asyncio
+import json
 import os
 import sys
+import threading
+import time
 
 # Add the project root to the path so imports work correctly
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from utils.call_llm import call_llm
+from utils.call_llm import call_llm, call_llm_async, call_llm_stream, reset_llm_clients, LLM_CACHE_MAX_TEMPERATURE
+from utils.cache import TieredCache
+from utils.data_structures import Decision
+from nodes import HITLOutputNode
+
+# The ceiling the module was imported with, before the cache tests raise it
+default_ceiling = LLM_CACHE_MAX_TEMPERATURE
 
 class TestCallLLM(unittest.TestCase):
 
+    def setUp(self):
+        # Keep the shared response cache out of these tests
+        patcher = patch('utils.call_llm.get_llm_cache', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reset_llm_clients()
+        self.addCleanup(reset_llm_clients)
+
     @patch('utils.call_llm.genai.GenerativeModel')
     @patch('utils.call_llm.load_dotenv') # Mock load_dotenv
     @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"}) # Keep this for the success test
@@ -66,5 +84,294 @@ class TestCallLLM(unittest.TestCase):
             # Verify result contains error message
             self.assertEqual(result, "Error: Test exception")
 
+    @patch('utils.call_llm.genai.configure')
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_model_is_reused_across_calls(self, mock_generative_model, mock_configure):
+        """Test that the client is configured once and models are reused per generation config"""
+        mock_generative_model.return_value.generate_content.return_value = MagicMock(text="ok")
+
+        call_llm("First prompt")
+        call_llm("Second prompt")
+        self.assertEqual(mock_configure.call_count, 1)
+        self.assertEqual(mock_generative_model.call_count, 1)
+        self.assertEqual(mock_generative_model.return_value.generate_content.call_count, 2)
+
+        # A different generation config gets its own registered model
+        call_llm("Third prompt", temperature=0.1)
+        self.assertEqual(mock_generative_model.call_count, 2)
+        self.assertEqual(mock_configure.call_count, 1)
+
+class TestCallLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TieredCache("LLMCache", ttl=60)
+        patcher = patch('utils.call_llm.get_llm_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Cache replies sampled at the default temperature too
+        patcher = patch('utils.call_llm.LLM_CACHE_MAX_TEMPERATURE', 1.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reset_llm_clients()
+        self.addCleanup(reset_llm_clients)
+
+    def _mock_model(self, mock_generative_model, text="Cached answer"):
+        mock_model_instance = MagicMock()
+        mock_generative_model.return_value = mock_model_instance
+        mock_model_instance.generate_content.return_value = MagicMock(text=text)
+        return mock_model_instance
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_identical_prompt_is_served_from_cache(self, mock_generative_model):
+        """Test that a repeated prompt with the same settings is not sent again"""
+        model = self._mock_model(mock_generative_model)
+
+        self.assertEqual(call_llm("Same prompt"), "Cached answer")
+        self.assertEqual(call_llm("Same prompt"), "Cached answer")
+        self.assertEqual(model.generate_content.call_count, 1)
+
+        # Different generation settings are a different cache entry
+        call_llm("Same prompt", temperature=0.0)
+        self.assertEqual(model.generate_content.call_count, 2)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_cache_opt_out(self, mock_generative_model):
+        """Test that use_cache=False and high temperatures bypass the cache"""
+        model = self._mock_model(mock_generative_model)
+
+        call_llm("Prompt", use_cache=False)
+        call_llm("Prompt", use_cache=False)
+        with patch('utils.call_llm.LLM_CACHE_MAX_TEMPERATURE', 0.5):
+            call_llm("Prompt", temperature=0.9)
+            call_llm("Prompt", temperature=0.9)
+        self.assertEqual(model.generate_content.call_count, 4)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_ceiling_of_zero_caches_only_deterministic_replies(self, mock_generative_model):
+        """Test that a ceiling of 0 caches temperature 0 replies but not sampled ones"""
+        model = self._mock_model(mock_generative_model)
+
+        with patch('utils.call_llm.LLM_CACHE_MAX_TEMPERATURE', 0.0):
+            call_llm("Prompt")
+            call_llm("Prompt")
+            call_llm("Prompt", temperature=0)
+            call_llm("Prompt", temperature=0)
+        self.assertEqual(model.generate_content.call_count, 3)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_node_rerun_is_served_from_cache_by_default(self, mock_generative_model):
+        """Test that running a node twice on the same state sends its prompt once at the default ceiling"""
+        model = self._mock_model(mock_generative_model, text=json.dumps(
+            {"final_answer": "42", "research_summary": "Searched once.", "key_sources": []}))
+        shared = {"original_query": "What is the answer?", "research_history": [], "extracted_information": {}}
+
+        with patch('utils.call_llm.LLM_CACHE_MAX_TEMPERATURE', default_ceiling):
+            HITLOutputNode().run(dict(shared))
+            second = dict(shared)
+            HITLOutputNode().run(second)
+
+        self.assertEqual(model.generate_content.call_count, 1)
+        self.assertEqual(second["final_answer"], "42")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_replies_failing_validation_are_not_cached(self, mock_generative_model):
+        """Test that a reply the caller cannot parse is requested again instead of replayed"""
+        model = self._mock_model(mock_generative_model, text="not json")
+
+        def validate(response):
+            json.loads(response)
+
+        self.assertEqual(call_llm("Prompt", validate=validate), "not json")
+        call_llm("Prompt", validate=validate)
+        self.assertEqual(model.generate_content.call_count, 2)
+        model.generate_content.return_value = iter([MagicMock(text="not "), MagicMock(text="json")])
+        self.assertEqual(list(call_llm_stream("Prompt", validate=validate)), ["not ", "json"])
+        self.assertEqual(model.generate_content.call_count, 3)
+
+        # Replies that pass are cached as before
+        model.generate_content.return_value = MagicMock(text='{"a": 1}')
+        call_llm("Prompt", validate=validate)
+        call_llm("Prompt", validate=validate)
+        self.assertEqual(model.generate_content.call_count, 4)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_errors_are_not_cached(self, mock_generative_model):
+        """Test that failed calls are retried rather than served from cache"""
+        model = self._mock_model(mock_generative_model)
+        model.generate_content.side_effect = Exception("Quota exceeded")
+
+        with patch('builtins.print'):
+            call_llm("Prompt")
+            call_llm("Prompt")
+        self.assertEqual(model.generate_content.call_count, 2)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_concurrent_identical_calls_share_one_request(self, mock_generative_model):
+        """Test that identical calls made while a request is in flight are deduplicated"""
+        model = self._mock_model(mock_generative_model)
+
+        def slow_generate(*args, **kwargs):
+            time.sleep(0.2)
+            return MagicMock(text="Shared answer")
+        model.generate_content.side_effect = slow_generate
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(call_llm("Concurrent prompt"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["Shared answer"] * 4)
+        self.assertEqual(model.generate_content.call_count, 1)
+
+class TestCallLLMStream(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TieredCache("LLMCache", ttl=60)
+        patcher = patch('utils.call_llm.get_llm_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Cache replies sampled at the default temperature too
+        patcher = patch('utils.call_llm.LLM_CACHE_MAX_TEMPERATURE', 1.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reset_llm_clients()
+        self.addCleanup(reset_llm_clients)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_stream_yields_chunks_and_fills_cache(self, mock_generative_model):
+        """Test that chunks are yielded as generated and the full text is cached"""
+        model = mock_generative_model.return_value
+        model.generate_content.return_value = iter([MagicMock(text='{"a": '), MagicMock(text='1}')])
+
+        self.assertEqual(list(call_llm_stream("Stream prompt")), ['{"a": ', '1}'])
+        self.assertTrue(model.generate_content.call_args.kwargs["stream"])
+
+        # The complete response now serves both streaming and blocking calls
+        self.assertEqual(list(call_llm_stream("Stream prompt")), ['{"a": 1}'])
+        self.assertEqual(call_llm("Stream prompt"), '{"a": 1}')
+        self.assertEqual(model.generate_content.call_count, 1)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_stream_error(self, mock_generative_model):
+        """Test that a failing stream yields an error string like call_llm"""
+        mock_generative_model.return_value.generate_content.side_effect = Exception("Stream failed")
+
+        with patch('builtins.print'):
+            self.assertEqual(list(call_llm_stream("Prompt")), ["Error: Stream failed"])
+
+class TestCallLLMStructured(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TieredCache("LLMCache", ttl=60)
+        patcher = patch('utils.call_llm.get_llm_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Cache replies sampled at the default temperature too
+        patcher = patch('utils.call_llm.LLM_CACHE_MAX_TEMPERATURE', 1.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reset_llm_clients()
+        self.addCleanup(reset_llm_clients)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_structured_call_returns_parsed_object(self, mock_generative_model):
+        """Test that response_schema requests JSON output and returns the decoded object"""
+        model = mock_generative_model.return_value
+        model.generate_content.return_value = MagicMock(
+            text='{"next_action": "crawl_url", "query_or_url": "https://example.com", "reasoning": "r"}'
+        )
+
+        result = call_llm("Decide", response_schema=Decision)
+        self.assertEqual(result["next_action"], "crawl_url")
+
+        config = model.generate_content.call_args.kwargs["generation_config"]
+        self.assertEqual(config.response_mime_type, "application/json")
+        self.assertEqual(config.response_schema["required"], ["next_action", "query_or_url", "reasoning"])
+
+        # Structured and free-text calls use separate models and cache entries
+        self.assertEqual(call_llm("Decide", response_schema=Decision), result)
+        call_llm("Decide")
+        self.assertEqual(mock_generative_model.call_count, 2)
+        self.assertEqual(model.generate_content.call_count, 2)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_structured_call_failure_returns_none(self, mock_generative_model):
+        """Test that failed calls and non-matching output return None"""
+        model = mock_generative_model.return_value
+        model.generate_content.return_value = MagicMock(text='{"next_action": "crawl_url"}')
+        self.assertIsNone(call_llm("Decide", response_schema=Decision))
+        self.assertIsNone(call_llm("Decide", response_schema=Decision))
+        self.assertEqual(model.generate_content.call_count, 2)
+
+        model.generate_content.side_effect = Exception("Quota exceeded")
+        with patch('builtins.print'):
+            self.assertIsNone(call_llm("Other prompt", response_schema=Decision))
+
+class TestCallLLMAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TieredCache("LLMCache", ttl=60)
+        patcher = patch('utils.call_llm.get_llm_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Cache replies sampled at the default temperature too
+        patcher = patch('utils.call_llm.LLM_CACHE_MAX_TEMPERATURE', 1.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reset_llm_clients()
+        self.addCleanup(reset_llm_clients)
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_concurrent_identical_calls_share_one_request(self, mock_generative_model):
+        """Test that identical async calls on one loop send one request and fill the shared cache"""
+        async def slow_generate(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return MagicMock(text="Async answer")
+        model = mock_generative_model.return_value
+        model.generate_content_async = AsyncMock(side_effect=slow_generate)
+
+        async def run():
+            return await asyncio.gather(*(call_llm_async("Same prompt") for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ["Async answer"] * 5)
+        self.assertEqual(model.generate_content_async.await_count, 1)
+
+        # The blocking client is served from the same cache
+        self.assertEqual(call_llm("Same prompt"), "Async answer")
+        model.generate_content.assert_not_called()
+
+    @patch('utils.call_llm.genai.GenerativeModel')
+    @patch.dict(os.environ, {"GOOGLE_API_KEY": "test_api_key"})
+    def test_structured_and_error(self, mock_generative_model):
+        """Test structured async calls and that errors are returned, not cached"""
+        model = mock_generative_model.return_value
+        model.generate_content_async = AsyncMock(return_value=MagicMock(
+            text='{"next_action": "send_to_hitl", "query_or_url": null, "reasoning": "done"}'
+        ))
+        result = asyncio.run(call_llm_async("Decide", response_schema=Decision))
+        self.assertEqual(result["next_action"], "send_to_hitl")
+
+        model.generate_content_async = AsyncMock(side_effect=Exception("Timeout"))
+        with patch('builtins.print'):
+            self.assertEqual(asyncio.run(call_llm_async("Fails")), "Error: Timeout")
+            self.assertEqual(asyncio.run(call_llm_async("Fails")), "Error: Timeout")
+        self.assertEqual(model.generate_content_async.await_count, 2)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import patch
+import pickle
+import tempfile
+import shutil
+import sys
+import os
+from pocketflow import Node
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.checkpoint import CheckpointedFlow, load_checkpoint, node_ids
+from utils.knowledge_store import KnowledgeStore
+
+class Interrupted(Exception):
+    pass
+
+class Count(Node):
+    """Adds one to shared["count"] and records its run; loops until the target is reached."""
+
+    fail_at = None
+
+    def post(self, shared, prep_res, exec_res):
+        shared["count"] = shared.get("count", 0) + 1
+        shared.setdefault("runs", []).append(shared["count"])
+        if shared["count"] == Count.fail_at:
+            raise Interrupted()
+        return "again" if shared["count"] < shared["target"] else "done"
+
+class Learn(Count):
+    """Count that also adds a fact to shared["knowledge"] on its second run."""
+
+    def post(self, shared, prep_res, exec_res):
+        if shared.get("count") == 1:
+            shared["knowledge"].add("answer", "42", sources=["https://example.com"])
+        return super().post(shared, prep_res, exec_res)
+
+class Finish(Node):
+    def post(self, shared, prep_res, exec_res):
+        shared["finished"] = True
+        shared.pop("scratch", None)
+
+def build_flow(path):
+    count = Count()
+    count - "again" >> count
+    count - "done" >> Finish()
+    return CheckpointedFlow(start=count, path=path)
+
+class TestCheckpoint(unittest.TestCase):
+    """Tests for checkpointing and resuming flows."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "session.ckpt")
+        Count.fail_at = None
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_node_ids_are_stable(self):
+        """Rebuilding a flow gives its nodes the same names, numbering repeated classes"""
+        first = Count()
+        first >> Count() >> Finish()
+        self.assertEqual(sorted(node_ids(first).values()), ["Count", "Count#2", "Finish"])
+        self.assertEqual(sorted(node_ids(build_flow(self.path).start_node).values()), ["Count", "Finish"])
+
+    def test_completed_run_is_checkpointed(self):
+        """Every node is recorded and the final state is rebuilt from the changes"""
+        shared = {"target": 3, "scratch": "temporary"}
+        build_flow(self.path).run(shared)
+
+        state = load_checkpoint(self.path)
+        self.assertEqual(state["step"], 4)
+        self.assertEqual((state["node"], state["next"]), ("Finish", None))
+        self.assertEqual(state["shared"], {"target": 3, "count": 3, "runs": [1, 2, 3], "finished": True})
+        self.assertIsNone(build_flow(self.path).resume())
+
+    def test_resume_after_interruption(self):
+        """A new flow continues with the node after the last one that completed"""
+        Count.fail_at = 2
+        with self.assertRaises(Interrupted):
+            build_flow(self.path).run({"target": 4, "knowledge": KnowledgeStore()})
+
+        state = load_checkpoint(self.path)
+        self.assertEqual((state["step"], state["next"]), (1, "Count"))
+
+        Count.fail_at = None
+        shared = build_flow(self.path).resume()
+        self.assertEqual(shared["runs"], [1, 2, 3, 4])
+        self.assertTrue(shared["finished"])
+        self.assertIsInstance(shared["knowledge"], KnowledgeStore)
+        self.assertEqual(load_checkpoint(self.path)["step"], 5)
+
+    def test_revisioned_stores_pickled_only_when_changed(self):
+        """The knowledge store is saved at the start and after the step that changed it, not every step"""
+        learn = Learn()
+        learn - "again" >> learn
+        learn - "done" >> Finish()
+        knowledge = KnowledgeStore()
+
+        with patch('utils.checkpoint.pickle.dumps', wraps=pickle.dumps) as dumps:
+            CheckpointedFlow(start=learn, path=self.path).run({"target": 4, "knowledge": knowledge})
+
+        self.assertEqual(sum(1 for call in dumps.call_args_list if call.args[0] is knowledge), 2)
+        self.assertEqual(load_checkpoint(self.path)["shared"]["knowledge"].compact_view(), {"answer": "42"})
+
+    def test_torn_record_is_ignored(self):
+        """A record cut short by a crash does not hide the ones before it"""
+        build_flow(self.path).run({"target": 2})
+        with open(self.path, "ab") as f:
+            f.write(b"\xff\x00\x00\x00partial")
+
+        self.assertEqual(load_checkpoint(self.path)["shared"]["count"], 2)
+
+    def test_unpicklable_values_are_skipped(self):
+        """Values that cannot be saved are left out without stopping the flow"""
+        shared = {"target": 1, "callback": lambda: None}
+        build_flow(self.path).run(shared)
+
+        self.assertNotIn("callback", load_checkpoint(self.path)["shared"])
+        self.assertTrue(shared["finished"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+import shutil
+import requests
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.cache import PersistentCache
+from utils.circuit_breaker import BreakerRegistry, CircuitBreaker, OPEN, HALF_OPEN, CLOSED
+from utils.host_scheduler import HostScheduler
+from utils.web_crawl import crawl_url
+from nodes import DecisionNode
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Tests for per-host and per-engine failure memory."""
+
+    def test_opens_after_consecutive_failures(self):
+        """Failures open the breaker only when consecutive"""
+        breaker = CircuitBreaker("a.example", failure_threshold=3, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+
+        self.assertTrue(breaker.record_failure())
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_probe(self):
+        """After the timeout one probe is let through; its failure doubles the timeout and its success closes"""
+        breaker = CircuitBreaker("a.example", failure_threshold=1, reset_timeout=10)
+        breaker.record_failure()
+        breaker.opened_at -= 11
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual((breaker.state, breaker.timeout), (OPEN, 20))
+        breaker.opened_at -= 21
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual((breaker.state, breaker.timeout), (CLOSED, 10))
+
+    def test_open_breakers_are_remembered_across_sessions(self):
+        """A new registry on the same store starts with the earlier session's open breakers"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            store = PersistentCache(os.path.join(temp_dir, "breakers.sqlite"))
+            first = BreakerRegistry(store=store, failure_threshold=1)
+            first.record_failure("dead.example")
+            first.record_failure("search:google")
+            first.record_failure("flaky.example")
+            first.record_success("flaky.example")
+
+            second = BreakerRegistry(store=store, failure_threshold=1)
+            self.assertFalse(second.allow("dead.example"))
+            self.assertTrue(second.allow("flaky.example"))
+            self.assertEqual(sorted(target["target"] for target in second.open_breakers()),
+                             ["dead.example", "search:google"])
+            store.close()
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @patch('utils.web_crawl.get_robots_policy', return_value=None)
+    @patch('utils.web_crawl.get_http_cache', return_value=None)
+    @patch('utils.web_crawl.requests.Session.get')
+    def test_crawl_fails_fast_on_dead_host(self, mock_get, _, _robots):
+        """Once a host's breaker opens, crawls of it return without a request"""
+        mock_get.side_effect = requests.exceptions.ConnectTimeout("timed out")
+        breakers = BreakerRegistry(failure_threshold=2)
+
+        with patch('utils.web_crawl.get_breakers', return_value=breakers), \
+                patch('utils.web_crawl.get_host_scheduler', return_value=HostScheduler(backoff_base=0)):
+            first = crawl_url("https://dead.example/a", max_retries=3)
+            second = crawl_url("https://dead.example/b", max_retries=3)
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertIn("temporarily unavailable", first["content"])
+        self.assertIn("temporarily unavailable", second["content"])
+        self.assertEqual(breakers.stats()["rejected"], 2)
+
+    def half_open_registry(self):
+        breakers = BreakerRegistry(failure_threshold=1, reset_timeout=10)
+        breakers.record_failure("probe.example")
+        breakers._breakers["probe.example"].opened_at -= 11
+        return breakers
+
+    def error_response(self, status):
+        response = MagicMock(status_code=status, headers={})
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=response)
+        return response
+
+    @patch('utils.web_crawl.get_robots_policy', return_value=None)
+    @patch('utils.web_crawl.get_http_cache', return_value=None)
+    @patch('utils.web_crawl.requests.Session.get')
+    def test_client_errors_are_neutral_but_429_fails(self, mock_get, _, _robots):
+        """A 404 probe neither closes nor reopens the breaker and frees its slot; a 429 probe reopens it"""
+        breakers = self.half_open_registry()
+        with patch('utils.web_crawl.get_breakers', return_value=breakers), \
+                patch('utils.web_crawl.get_host_scheduler', return_value=HostScheduler(backoff_base=0)):
+            mock_get.return_value = self.error_response(404)
+            crawl_url("https://probe.example/missing", max_retries=1)
+            self.assertEqual(breakers._breakers["probe.example"].state, HALF_OPEN)
+
+            mock_get.return_value = self.error_response(429)
+            crawl_url("https://probe.example/busy", max_retries=1)
+        self.assertEqual(breakers._breakers["probe.example"].state, OPEN)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('utils.web_crawl.get_robots_policy', return_value=None)
+    @patch('utils.web_crawl.get_http_cache', return_value=None)
+    @patch('utils.web_crawl.requests.Session.get')
+    def test_probe_released_when_crawl_raises(self, mock_get, _, _robots):
+        """An unexpected error during a half-open probe gives the probe slot back"""
+        mock_get.side_effect = ValueError("bad header")
+        breakers = self.half_open_registry()
+        with patch('utils.web_crawl.get_breakers', return_value=breakers), \
+                patch('utils.web_crawl.get_host_scheduler', return_value=HostScheduler(backoff_base=0)):
+            with self.assertRaises(ValueError):
+                crawl_url("https://probe.example/page", max_retries=1)
+
+        self.assertTrue(breakers.allow("probe.example"))
+
+    def test_decision_prompt_lists_open_breakers(self):
+        """The decision prompt warns the LLM away from failing hosts and engines"""
+        breakers = BreakerRegistry(failure_threshold=1)
+        breakers.record_failure("dead.example")
+        breakers.record_failure("search:google")
+        shared = {"original_query": "q", "iteration_count": 1, "research_history": []}
+
+        with patch('nodes.get_breakers', return_value=breakers):
+            node = DecisionNode()
+            prompt = node.build_prompt(node.prep(shared))
+
+        self.assertIn("Unavailable Targets", prompt)
+        self.assertIn("URLs on dead.example: 1 failures", prompt)
+        self.assertIn("google search (action search_google)", prompt)
+
+if __name__ == "__main__":
+    unittest.main()
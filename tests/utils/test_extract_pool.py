@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import threading
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.extract_pool import ExtractionPool
+from utils.web_crawl import crawl_url, extract_page, read_page
+from utils.circuit_breaker import BreakerRegistry
+
+PAGE = ("<html><head><meta charset='windows-1252'><title>Caf\xe9</title></head>"
+        "<body><nav>Menu</nav><p>" + "Cr\xe8me br\xfbl\xe9e recipes. " * 200 + "</p></body></html>").encode("windows-1252")
+
+class TestExtractPool(unittest.TestCase):
+    """Tests for parsing crawled pages in worker processes."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ExtractionPool(workers=1, max_pending=2, max_tasks_per_child=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def setUp(self):
+        patcher = patch('utils.web_crawl.get_breakers', return_value=BreakerRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_worker_matches_streaming_parse(self):
+        """A page parsed in a worker gives the same result as the streaming parser"""
+        response = MagicMock(headers={"Content-Type": "text/html"})
+        response.iter_content.return_value = [PAGE[:500], PAGE[500:]]
+        title, text, _, _ = read_page(response)
+
+        result = self.pool.run(extract_page, "https://example.com", 200, PAGE, "text/html")
+        self.assertEqual(result, {"url": "https://example.com", "title": title, "content": text, "status": 200})
+        self.assertEqual(result["title"], "Caf\xe9")
+
+    def test_workers_are_recycled(self):
+        """A worker is replaced after max_tasks_per_child jobs"""
+        pids = [self.pool.run(os.getpid) for _ in range(4)]
+
+        self.assertEqual(len(set(pids)), 2)
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_submit_blocks_when_queue_is_full(self):
+        """Submissions beyond max_pending wait for a running job to finish"""
+        pool = ExtractionPool(workers=1, max_pending=1)
+        pool._get_executor = MagicMock()
+        pool._get_executor.return_value.submit.side_effect = lambda fn, *args: MagicMock()
+        pool.submit(os.getpid)
+
+        waiter = threading.Thread(target=pool.submit, args=(os.getpid,))
+        waiter.start()
+        waiter.join(timeout=0.2)
+        self.assertTrue(waiter.is_alive())
+
+        pool._slots.release()
+        waiter.join(timeout=1)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(pool.stats()["blocked"], 1)
+
+    @patch('utils.web_crawl.get_robots_policy', return_value=None)
+    @patch('utils.web_crawl.get_session')
+    def test_crawl_url_offloads_parsing(self, mock_get_session, _robots):
+        """With a pool configured, crawl_url downloads the page and parses it in a worker"""
+        response = MagicMock(status_code=200, headers={"Content-Type": "text/html"})
+        response.iter_content.return_value = [PAGE]
+        mock_get_session.return_value.get.return_value = response
+        completed = self.pool.stats()["completed"]
+
+        with patch('utils.web_crawl.get_extract_pool', return_value=self.pool):
+            result = crawl_url("https://example.com", use_cache=False)
+
+        self.assertEqual(result["title"], "Caf\xe9")
+        self.assertNotIn("Menu", result["content"])
+        self.assertEqual(self.pool.stats()["completed"], completed + 1)
+
+    @patch('utils.web_crawl.get_robots_policy', return_value=None)
+    @patch('utils.web_crawl.get_session')
+    def test_crawl_url_falls_back_when_pool_fails(self, mock_get_session, _robots):
+        """A failing pool does not fail the crawl"""
+        response = MagicMock(status_code=200, headers={"Content-Type": "text/html"})
+        response.iter_content.return_value = [PAGE]
+        mock_get_session.return_value.get.return_value = response
+        broken = MagicMock()
+        broken.run.side_effect = RuntimeError("worker died")
+
+        with patch('utils.web_crawl.get_extract_pool', return_value=broken):
+            result = crawl_url("https://example.com", use_cache=False)
+
+        self.assertEqual(result["title"], "Caf\xe9")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from email.utils import formatdate
+import time
+import requests
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.host_scheduler import HostScheduler, parse_retry_after
+from utils.web_crawl import crawl_url
+from utils.circuit_breaker import BreakerRegistry
+
+def response(status, headers=None, body=b"<html><title>T</title><p>ok</p></html>"):
+    mock = MagicMock(status_code=status, headers={"Content-Type": "text/html", **(headers or {})})
+    mock.iter_content.return_value = [body]
+    if status >= 400:
+        mock.raise_for_status.side_effect = requests.exceptions.HTTPError(f"{status}", response=mock)
+    return mock
+
+class TestHostScheduler(unittest.TestCase):
+    """Tests for per-host pacing and backoff."""
+
+    def test_hosts_are_paced_independently(self):
+        """A host is limited to its burst and rate while other hosts go straight through"""
+        scheduler = HostScheduler(rate=10, burst=2)
+        self.assertEqual([scheduler.reserve("a.example") for _ in range(2)], [0, 0])
+        third = scheduler.reserve("a.example")
+        fourth = scheduler.reserve("a.example")
+
+        self.assertAlmostEqual(third, 0.1, delta=0.02)
+        self.assertAlmostEqual(fourth, 0.2, delta=0.02)
+        self.assertEqual(scheduler.reserve("b.example"), 0)
+
+    def test_retry_after_pauses_host(self):
+        """A 429 with Retry-After pauses only that host, and a long pause is given up on"""
+        scheduler = HostScheduler(rate=100, burst=10)
+        scheduler.record_response("a.example", 429, "5")
+
+        self.assertAlmostEqual(scheduler.reserve("a.example", max_wait=10), 5, delta=0.1)
+        self.assertIsNone(scheduler.reserve("a.example", max_wait=1))
+        self.assertEqual(scheduler.reserve("b.example"), 0)
+        self.assertEqual(scheduler.stats()["throttled"], 1)
+        self.assertEqual(scheduler.stats()["gave_up"], 1)
+
+    def test_backoff_grows_with_jitter(self):
+        """Consecutive failures back off exponentially within the jitter range, up to the ceiling"""
+        scheduler = HostScheduler(backoff_base=1, backoff_max=8)
+        for failures, ceiling in ((1, 1), (2, 2), (3, 4), (6, 8)):
+            delays = [scheduler.backoff(failures) for _ in range(50)]
+            self.assertTrue(all(ceiling / 2 <= delay <= ceiling for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_success_resets_failures(self):
+        """A successful response ends the backoff streak"""
+        scheduler = HostScheduler(backoff_base=1)
+        scheduler.record_failure("a.example")
+        scheduler.record_failure("a.example")
+        scheduler.record_response("a.example", 200)
+
+        self.assertEqual(scheduler._hosts["a.example"].failures, 0)
+
+    def test_min_interval(self):
+        """A minimum interval spaces every request to the host"""
+        scheduler = HostScheduler(rate=100, burst=10)
+        scheduler.set_min_interval("a.example", 2)
+        scheduler.reserve("a.example", max_wait=10)
+
+        self.assertAlmostEqual(scheduler.reserve("a.example", max_wait=10), 2, delta=0.05)
+
+    def test_parse_retry_after(self):
+        """Retry-After is read as seconds or as an HTTP date"""
+        now = time.time()
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertAlmostEqual(parse_retry_after(formatdate(now + 30, usegmt=True), now=now), 30, delta=1)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+    @patch('utils.web_crawl.get_robots_policy', return_value=None)
+    @patch('utils.web_crawl.get_http_cache', return_value=None)
+    @patch('utils.web_crawl.get_session')
+    def test_crawl_url_honors_retry_after(self, mock_get_session, _, _robots):
+        """crawl_url waits out a 429's Retry-After before retrying the host"""
+        scheduler = HostScheduler(rate=100, burst=10)
+        mock_get_session.return_value.get.side_effect = [response(429, {"Retry-After": "1"}), response(200)]
+
+        start = time.monotonic()
+        with patch('utils.web_crawl.get_host_scheduler', return_value=scheduler), \
+                patch('utils.web_crawl.get_breakers', return_value=BreakerRegistry()):
+            result = crawl_url("https://a.example/page")
+
+        self.assertEqual(result["status"], 200)
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+        self.assertEqual(scheduler.stats()["throttled"], 1)
+
+    @patch('utils.web_crawl.get_robots_policy', return_value=None)
+    @patch('utils.web_crawl.get_http_cache', return_value=None)
+    @patch('utils.web_crawl.get_session')
+    def test_crawl_url_gives_up_on_long_pause(self, mock_get_session, _, _robots):
+        """A host asking to wait longer than the crawl may is not retried"""
+        scheduler = HostScheduler()
+        mock_get_session.return_value.get.return_value = response(503, {"Retry-After": "3600"})
+
+        with patch('utils.web_crawl.get_host_scheduler', return_value=scheduler), \
+                patch('utils.web_crawl.get_breakers', return_value=BreakerRegistry()):
+            result = crawl_url("https://a.example/page")
+
+        self.assertEqual(result["status"], 0)
+        self.assertIn("rate limiting", result["content"])
+        self.assertEqual(mock_get_session.return_value.get.call_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
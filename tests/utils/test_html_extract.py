@@ -0,0 +1,134 @@
+import unittest
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.html_extract import (
+    EXTRACTORS,
+    StreamingTextExtractor,
+    extract_text,
+    get_extractor,
+    is_boilerplate
+)
+from utils.web_crawl import extract_content
+
+ARTICLE = "The study measured crawler throughput across many sites and found large differences. " * 4
+
+PAGE = f"""<!DOCTYPE html>
+<html><head><title>  Research   Page </title><style>body {{ color: red }}</style></head>
+<body>
+  <div id="cookie-banner"><p>We use cookies</p><button>Accept</button></div>
+  <nav><a href="/">Home</a> <a href="/about">About</a></nav>
+  <main>
+    <h1>Crawler <b>throughput</b></h1>
+    <p>{ARTICLE}</p>
+    <div class="ad-slot"><p>Buy now</p></div>
+    <ul><li>First point</li><li>Second point</li></ul>
+    <script>var tracking = true;</script>
+  </main>
+  <aside class="related"><p>Other stories</p></aside>
+  <footer><p>Copyright 2024</p></footer>
+</body></html>"""
+
+class TestHtmlExtract(unittest.TestCase):
+    """Tests for the pluggable HTML-to-text extractors."""
+
+    def test_backends_agree(self):
+        """Every installed backend produces the same title and text"""
+        for strip_boilerplate in (True, False):
+            results = {name: extract_text(PAGE, backend=name, strip_boilerplate=strip_boilerplate)
+                       for name in EXTRACTORS}
+            expected = results["stdlib"]
+            for name, result in results.items():
+                self.assertEqual(result, expected, f"{name} differs (strip_boilerplate={strip_boilerplate})")
+
+    def test_boilerplate_removed(self):
+        """Navigation, ads, cookie banners and footers are dropped and the main content kept"""
+        title, text = extract_text(PAGE, strip_boilerplate=True)
+
+        self.assertEqual(title, "Research Page")
+        self.assertEqual(text.splitlines()[:2], ["Crawler throughput", ARTICLE.strip()])
+        self.assertIn("First point\nSecond point", text)
+        for furniture in ("cookies", "Home", "Buy now", "Other stories", "Copyright", "tracking", "color"):
+            self.assertNotIn(furniture, text)
+
+    def test_keeps_everything_without_stripping(self):
+        """Only non-text elements are dropped when boilerplate stripping is off"""
+        _, text = extract_text(PAGE, strip_boilerplate=False)
+
+        for kept in ("We use cookies", "Home", "Buy now", "Other stories", "Copyright 2024", "Crawler throughput"):
+            self.assertIn(kept, text)
+        self.assertNotIn("tracking", text)
+
+    def test_short_main_falls_back_to_body(self):
+        """A near-empty <main> is not trusted over the rest of the page"""
+        html = f"<html><body><main><p>Menu</p></main><div><p>{ARTICLE}</p></div></body></html>"
+        for name in EXTRACTORS:
+            _, text = extract_text(html, backend=name, strip_boilerplate=True)
+            self.assertEqual(text, f"Menu\n{ARTICLE.strip()}", name)
+
+    def test_degenerate_input(self):
+        """Empty documents, plain text and unclosed tags do not raise"""
+        for name in EXTRACTORS:
+            self.assertEqual(extract_text("", backend=name), (None, ""), name)
+            self.assertEqual(extract_text("just text", backend=name), (None, "just text"), name)
+            self.assertEqual(extract_text("<p>open <b>bold", backend=name)[1], "open bold", name)
+
+    def test_streaming_feed_matches_whole_document(self):
+        """Feeding the document in small chunks gives the same result as feeding it at once"""
+        extractor = StreamingTextExtractor()
+        for i in range(0, len(PAGE), 7):
+            extractor.feed(PAGE[i:i + 7])
+        extractor.close()
+
+        self.assertEqual(extractor.result(), extract_text(PAGE, backend="stdlib"))
+        self.assertGreater(extractor.chars, len(ARTICLE.strip()))
+
+    def test_is_boilerplate(self):
+        """Roles and class/id words mark boilerplate without matching inside other words"""
+        self.assertTrue(is_boilerplate({"role": "navigation"}))
+        self.assertTrue(is_boilerplate({"class": "story ad-slot"}))
+        self.assertTrue(is_boilerplate({"id": "cookie_consent"}))
+        self.assertFalse(is_boilerplate({"class": "headline"}))
+        self.assertFalse(is_boilerplate({"class": "navigator-results"}))
+        self.assertFalse(is_boilerplate({"class": "home has-sidebar"}))
+        self.assertFalse(is_boilerplate({"class": "wrapper menu-open"}))
+        self.assertTrue(is_boilerplate({"class": "site-footer"}))
+
+    def test_page_wrappers_never_dropped(self):
+        """Body classes and wrapper classes mentioning furniture words keep the page on every backend"""
+        page = f"""<html><head><title>T</title></head><body class="home has-sidebar">
+            <div class="wrapper menu-open"><p>{ARTICLE}</p></div>
+            <div class="sidebar"><p>Links</p></div></body></html>"""
+        for name in EXTRACTORS:
+            _, text = extract_text(page, backend=name, strip_boilerplate=True)
+            self.assertEqual(text, ARTICLE.strip(), name)
+
+    def test_content_ancestors_never_dropped(self):
+        """An element that looks like furniture but holds the <main> content is kept on every backend"""
+        page = f"""<html><body><div id="popup"><p>Intro</p><main><p>{ARTICLE}</p></main></div>
+            <div class="nav"><p>Menu</p></div></body></html>"""
+        for name in EXTRACTORS:
+            _, text = extract_text(page, backend=name, strip_boilerplate=True)
+            self.assertEqual(text, ARTICLE.strip(), name)
+
+    def test_unknown_backend(self):
+        """Asking for an unknown backend raises ValueError"""
+        with self.assertRaises(ValueError):
+            get_extractor("html5lib")
+
+    def test_extract_content_uses_extractor(self):
+        """extract_content returns the extracted text and a placeholder title when none exists"""
+        result = extract_content("<html><body><p>Hello</p></body></html>", "https://example.com", 200)
+
+        self.assertEqual(result, {
+            "url": "https://example.com",
+            "title": "No title found",
+            "content": "Hello",
+            "status": 200
+        })
+
+if __name__ == "__main__":
+    unittest.main()
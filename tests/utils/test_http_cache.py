@@ -0,0 +1,167 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.http_cache import HttpCache, normalize_cache_key, conditional_headers
+from utils.web_crawl import crawl_url, read_page
+from utils.circuit_breaker import BreakerRegistry
+
+PAGE = b"<html><head><title>Cached Page</title></head><body><p>Cached body</p></body></html>"
+
+class TestHttpCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = HttpCache(os.path.join(self.tmpdir.name, "cache.sqlite"), ttl=60)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def _extracted(self, url):
+        return {"url": url, "title": "Cached Page", "content": "Cached body", "status": 200}
+
+    def test_normalize_cache_key(self):
+        """Test that equivalent URLs share a cache key"""
+        self.assertEqual(
+            normalize_cache_key("HTTPS://Example.com:443/a?b=2&a=1#section"),
+            normalize_cache_key("https://example.com/a?a=1&b=2")
+        )
+        self.assertEqual(normalize_cache_key("http://example.com"), "http://example.com/")
+
+    def test_put_and_get_roundtrip(self):
+        """Test that a stored response is returned fresh with headers and body"""
+        url = "https://example.com/page"
+        self.cache.put(url, 200, {"ETag": '"abc"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"}, PAGE, self._extracted(url))
+
+        entry = self.cache.get(url)
+        self.assertTrue(entry["fresh"])
+        self.assertEqual(entry["body"], PAGE)
+        self.assertEqual(entry["extracted"]["title"], "Cached Page")
+        self.assertEqual(conditional_headers(entry), {
+            "If-None-Match": '"abc"',
+            "If-Modified-Since": "Wed, 01 Jan 2025 00:00:00 GMT"
+        })
+
+    def test_expired_entry_is_stale(self):
+        """Test that entries older than the TTL are reported as stale"""
+        self.cache.ttl = 0
+        url = "https://example.com/old"
+        self.cache.put(url, 200, {}, PAGE, self._extracted(url))
+        self.assertFalse(self.cache.get(url)["fresh"])
+
+        self.cache.ttl = 60
+        self.cache.refresh(url)
+        self.assertTrue(self.cache.get(url)["fresh"])
+
+    def test_no_store_is_not_cached(self):
+        """Test that Cache-Control: no-store responses are skipped"""
+        url = "https://example.com/private"
+        self.cache.put(url, 200, {"Cache-Control": "private, no-store"}, PAGE, self._extracted(url))
+        self.assertIsNone(self.cache.get(url))
+
+    def test_identical_bodies_are_stored_once(self):
+        """Test that bodies are content-addressed"""
+        for i in range(3):
+            url = f"https://mirror{i}.example.com/"
+            self.cache.put(url, 200, {}, PAGE, self._extracted(url))
+        blobs = self.cache._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        self.assertEqual(blobs, 1)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entries are evicted beyond max_bytes"""
+        url_a, url_b, url_c = "https://a.example.com/", "https://b.example.com/", "https://c.example.com/"
+        self.cache.put(url_a, 200, {}, os.urandom(4000), self._extracted(url_a))
+        time.sleep(0.01)
+        self.cache.put(url_b, 200, {}, os.urandom(4000), self._extracted(url_b))
+        time.sleep(0.01)
+        self.cache.get(url_a)  # a is now more recently used than b
+        self.cache.max_bytes = 9000
+        time.sleep(0.01)
+        self.cache.put(url_c, 200, {}, os.urandom(4000), self._extracted(url_c))
+
+        self.assertIsNotNone(self.cache.get(url_a))
+        self.assertIsNone(self.cache.get(url_b))
+        self.assertIsNotNone(self.cache.get(url_c))
+
+    def test_shared_body_is_freed_with_its_last_entry(self):
+        """Test that evicting one of two entries sharing a body does not count the body as freed"""
+        shared = os.urandom(4000)
+        mirrors = [f"https://mirror{i}.example.com/" for i in range(2)]
+        for url in mirrors:
+            self.cache.put(url, 200, {}, shared, self._extracted(url))
+            time.sleep(0.01)
+        self.cache.max_bytes = 6000
+        url_c = "https://c.example.com/"
+        self.cache.put(url_c, 200, {}, os.urandom(4000), self._extracted(url_c))
+
+        self.assertIsNone(self.cache.get(mirrors[0]))
+        self.assertIsNone(self.cache.get(mirrors[1]))
+        self.assertIsNotNone(self.cache.get(url_c))
+        self.assertEqual(self.cache._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0], 1)
+        self.assertLessEqual(self.cache._total_size(), 6000)
+
+class TestCrawlUrlCaching(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = HttpCache(os.path.join(self.tmpdir.name, "cache.sqlite"), ttl=60)
+        patcher = patch('utils.web_crawl.get_http_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('utils.web_crawl.get_robots_policy', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('utils.web_crawl.get_breakers', return_value=BreakerRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def _response(self, status, body=b"", headers=None):
+        response = MagicMock()
+        response.status_code = status
+        response.content = body
+        response.iter_content.return_value = [body]
+        response.headers = headers or {}
+        return response
+
+    @patch('utils.web_crawl.read_page', wraps=read_page)
+    @patch('utils.web_crawl.requests.Session.get')
+    def test_fresh_hit_skips_network_and_parsing(self, mock_get, mock_read):
+        """Test that a fresh cache hit avoids both the request and HTML parsing"""
+        mock_get.return_value = self._response(200, PAGE, {"ETag": '"v1"'})
+
+        first = crawl_url("https://example.com/cached")
+        second = crawl_url("https://example.com/cached")
+
+        # Only the fetch that went to the network reports downloaded bytes
+        self.assertEqual(first.pop("bytes"), len(PAGE))
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_read.call_count, 1)
+
+    @patch('utils.web_crawl.requests.Session.get')
+    def test_stale_entry_revalidates_with_etag(self, mock_get):
+        """Test that a stale entry sends a conditional GET and reuses the copy on 304"""
+        mock_get.return_value = self._response(200, PAGE, {"ETag": '"v1"'})
+        crawl_url("https://example.com/revalidate")
+        self.cache.ttl = 0
+
+        mock_get.return_value = self._response(304)
+        result = crawl_url("https://example.com/revalidate")
+
+        self.assertEqual(result["title"], "Cached Page")
+        sent_headers = mock_get.call_args.kwargs["headers"]
+        self.assertEqual(sent_headers["If-None-Match"], '"v1"')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.instrumentation import (
+    Span, TracedNode, annotate, traced, get_spans, reset_instrumentation,
+    export_jsonl, load_jsonl, profile_report, format_profile
+)
+from utils.call_llm import call_llm, call_llm_stream
+from utils.web_crawl import crawl_url
+from utils.circuit_breaker import BreakerRegistry
+
+class Sleepy(TracedNode):
+    def exec(self, prep_res):
+        with Span("llm", "model"):
+            time.sleep(0.02)
+            annotate(prompt_tokens=10)
+        time.sleep(0.01)
+
+    def post(self, shared, prep_res, exec_res):
+        return "done"
+
+class TestInstrumentation(unittest.TestCase):
+    """Tests for timing spans and the session profile."""
+
+    def setUp(self):
+        reset_instrumentation()
+        patcher = patch('utils.web_crawl.get_breakers', return_value=BreakerRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_node_phases_nest_under_node_span(self):
+        """prep, exec and post are children of the node span and the LLM call is a child of exec"""
+        self.assertEqual(Sleepy().run({}), "done")
+        spans = {span["kind"]: span for span in get_spans()}
+
+        self.assertEqual(set(spans), {"node", "prep", "exec", "post", "llm"})
+        self.assertEqual(spans["node"]["action"], "done")
+        for kind in ("prep", "exec", "post"):
+            self.assertEqual(spans[kind]["parent"], spans["node"]["id"])
+        self.assertEqual(spans["llm"]["parent"], spans["exec"]["id"])
+        self.assertEqual(spans["llm"]["prompt_tokens"], 10)
+
+    def test_profile_splits_self_time(self):
+        """Time waiting on the LLM is not counted again as local work of the exec phase"""
+        Sleepy().run({})
+        report = profile_report()
+
+        self.assertGreaterEqual(report["by_kind"]["llm"]["self"], 0.02)
+        self.assertLess(report["by_kind"]["exec"]["self"], report["by_kind"]["exec"]["total"] - 0.015)
+        self.assertEqual(report["operations"]["llm:model"]["prompt_tokens"], 10)
+        self.assertIn("Waiting on LLM and network", format_profile(report))
+
+    def test_errors_are_recorded(self):
+        """A function that raises leaves a span naming the exception"""
+        @traced("search", "broken")
+        def broken():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            broken()
+        self.assertEqual(get_spans()[0]["error"], "ValueError")
+        self.assertEqual(profile_report()["operations"]["search:broken"]["errors"], 1)
+
+    def test_export_jsonl_round_trip(self):
+        """Exported spans read back unchanged"""
+        Sleepy().run({})
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "trace", "spans.jsonl")
+            self.assertEqual(export_jsonl(path), 5)
+            self.assertEqual(load_jsonl(path), get_spans())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @patch('utils.call_llm.get_model')
+    def test_llm_calls_record_sizes_and_tokens(self, mock_get_model):
+        """call_llm and call_llm_stream record prompt and response sizes and reported token counts"""
+        response = MagicMock(text="four", usage_metadata=MagicMock(prompt_token_count=7, candidates_token_count=1))
+        mock_model = MagicMock()
+        mock_model.generate_content.side_effect = [response, [MagicMock(text="st"), MagicMock(text="ream")]]
+        mock_get_model.return_value = (mock_model, {})
+
+        call_llm("2+2?", use_cache=False)
+        list(call_llm_stream("stream?", use_cache=False))
+        first, second = get_spans()
+
+        self.assertEqual((first["prompt_chars"], first["response_chars"]), (4, 4))
+        self.assertEqual((first["prompt_tokens"], first["response_tokens"]), (7, 1))
+        self.assertTrue(second["stream"])
+        self.assertEqual(second["response_chars"], 6)
+        self.assertIn("first_chunk", second)
+
+    @patch('utils.web_crawl.get_robots_policy', return_value=None)
+    @patch('utils.web_crawl.get_session')
+    def test_crawl_records_bytes_and_attempts(self, mock_get_session, _robots):
+        """crawl_url records the status, bytes read and number of attempts"""
+        html = b"<html><head><title>T</title></head><body><p>Hello</p></body></html>"
+        response = MagicMock(status_code=200, headers={"Content-Type": "text/html"})
+        response.iter_content.return_value = [html]
+        mock_get_session.return_value.get.return_value = response
+
+        crawl_url("https://example.com/page", use_cache=False)
+        span = get_spans()[0]
+
+        self.assertEqual((span["kind"], span["host"], span["status"]), ("crawl", "example.com", 200))
+        self.assertEqual((span["bytes"], span["attempts"]), (len(html), 1))
+
+if __name__ == "__main__":
+    unittest.main()
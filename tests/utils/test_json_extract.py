@@ -0,0 +1,112 @@
+import unittest
+import os
+import sys
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.json_extract import StreamingJSONExtractor, iter_json_objects, extract_json, JSONExtractionError
+from utils.data_structures import Decision, AnalyzerReport
+
+DECISION = '''```json
+{
+  "next_action": "crawl_url",
+  "query_or_url": "https://example.com/a?b={c}",
+  "reasoning": "The page has \\"quoted\\" details, {braces} and [brackets]."
+}
+```
+Trailing explanation.'''
+
+class TestStreamingJSONExtractor(unittest.TestCase):
+
+    def _feed_in_chunks(self, text, size):
+        extractor = StreamingJSONExtractor()
+        completed = []
+        for i in range(0, len(text), size):
+            completed.extend(extractor.feed(text[i:i + size]))
+        return extractor, completed
+
+    def test_parses_fenced_object_in_any_chunking(self):
+        """Test that the same object is produced however the stream is split"""
+        for size in (1, 3, 7, len(DECISION)):
+            extractor, completed = self._feed_in_chunks(DECISION, size)
+            self.assertTrue(extractor.done)
+            self.assertEqual(completed, ["next_action", "query_or_url", "reasoning"])
+            self.assertEqual(extractor.result()["query_or_url"], "https://example.com/a?b={c}")
+            self.assertIn('"quoted"', extractor.result()["reasoning"])
+
+    def test_fields_surface_before_object_closes(self):
+        """Test that early fields are available while later ones are still streaming"""
+        extractor = StreamingJSONExtractor()
+        extractor.feed('{"next_action": "search_google", "query_or_url": "pocketflow", "reasoning": "Because')
+
+        self.assertEqual(extractor.fields, {"next_action": "search_google", "query_or_url": "pocketflow"})
+        self.assertFalse(extractor.done)
+        self.assertIsNone(extractor.result())
+
+    def test_nested_and_primitive_values(self):
+        """Test that objects, arrays, numbers and null are decoded per field"""
+        extractor, completed = self._feed_in_chunks(
+            '{"extracted_info": {"a": [1, {"b": 2}]}, "confidence_score": 0.75, '
+            '"new_potential_urls": [], "inconsistencies_found": null}', 5)
+
+        self.assertEqual(extractor.fields["extracted_info"], {"a": [1, {"b": 2}]})
+        self.assertEqual(extractor.fields["confidence_score"], 0.75)
+        self.assertEqual(extractor.fields["new_potential_urls"], [])
+        self.assertIsNone(extractor.fields["inconsistencies_found"])
+        self.assertEqual(len(completed), 4)
+
+    def test_text_without_object(self):
+        """Test that plain text never produces a result"""
+        extractor = StreamingJSONExtractor()
+        self.assertEqual(extractor.feed("I cannot answer that."), [])
+        self.assertFalse(extractor.done)
+        self.assertIsNone(extractor.result())
+
+class TestExtractJSON(unittest.TestCase):
+
+    def test_fenced_object_with_trailing_text(self):
+        """Test extraction from a ```json block followed by prose"""
+        decision = extract_json(DECISION, Decision)
+        self.assertEqual(decision["next_action"], "crawl_url")
+
+    def test_skips_example_objects_that_fail_validation(self):
+        """Test that a later block is used when the first one does not match the schema"""
+        response = (
+            'Format: {"example": true}\n'
+            '```json\n{"next_action": "search_google", "query_or_url": "q", "reasoning": "r"}\n```'
+        )
+        self.assertEqual(extract_json(response, Decision)["next_action"], "search_google")
+
+    def test_truncated_response_is_repaired(self):
+        """Test that a response cut off mid-object is closed and parsed"""
+        response = '```json\n{"final_answer": "Forty-two", "key_sources": ["https://a.example'
+        objects = list(iter_json_objects(response))
+        self.assertEqual(objects, [{"final_answer": "Forty-two", "key_sources": ["https://a.example"]}])
+
+    def test_defaults_and_coercion(self):
+        """Test that optional fields are defaulted and numeric strings coerced"""
+        report = extract_json(
+            '{"extracted_info": {"a": 1}, "confidence_score": "0.7", "new_potential_urls": "none"}',
+            AnalyzerReport,
+            required=("extracted_info", "confidence_score"),
+            defaults={"new_potential_urls": [], "assessment": ""}
+        )
+        self.assertEqual(report["confidence_score"], 0.7)
+        self.assertEqual(report["new_potential_urls"], [])
+        self.assertEqual(report["assessment"], "")
+
+    def test_missing_required_field_raises(self):
+        """Test that an object missing a required field is rejected"""
+        with self.assertRaises(JSONExtractionError):
+            extract_json('{"next_action": "search_google"}', Decision)
+        with self.assertRaises(JSONExtractionError):
+            extract_json("No JSON here at all.", Decision)
+
+    def test_parsed_object_is_tried_first(self):
+        """Test that an object decoded while streaming takes precedence"""
+        parsed = {"next_action": "send_to_hitl", "query_or_url": None, "reasoning": "done"}
+        self.assertEqual(extract_json("garbled", Decision, parsed=parsed), parsed)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import pickle
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.knowledge_store import KnowledgeStore, minhash, similarity, merge_values
+from nodes import AnalyzerNode
+
+FACT = "The Eiffel Tower was completed in 1889 for the World's Fair and is 330 metres tall today."
+
+class TestKnowledgeStore(unittest.TestCase):
+    """Tests for incremental deduplication and merging of extracted facts."""
+
+    def test_minhash_estimates_similarity(self):
+        """Identical texts match fully, small edits stay close and unrelated texts are far apart"""
+        self.assertEqual(similarity(minhash(FACT), minhash(FACT)), 1.0)
+        self.assertGreater(similarity(minhash(FACT), minhash(FACT.replace("today", "now"))), 0.6)
+        self.assertLess(similarity(minhash(FACT), minhash("Paris has a population of about two million people.")), 0.2)
+
+    def test_repeated_fact_adds_source_only(self):
+        """Re-extracting the same fact keeps one copy and records both sources"""
+        store = KnowledgeStore()
+        self.assertEqual(store.add("tower_facts", FACT, ["https://a.example"]), "added")
+        self.assertEqual(store.add("Tower Facts", FACT, ["https://b.example"]), "duplicate")
+
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.compact_view(with_sources=True), {
+            "tower_facts": {"value": FACT, "sources": ["https://a.example", "https://b.example"]}
+        })
+
+    def test_near_duplicate_under_other_key(self):
+        """A reworded copy of a long fact under a new key is recognized as a duplicate"""
+        store = KnowledgeStore()
+        store.add("history", FACT)
+        self.assertEqual(store.add("eiffel_history", FACT.replace("today", ""), ["https://c.example"]), "duplicate")
+
+        self.assertEqual(list(store.compact_view()), ["history"])
+        self.assertEqual(store.facts["history"]["sources"], ["https://c.example"])
+
+    def test_short_values_not_merged_across_keys(self):
+        """Short values like "yes" only dedupe within their own key"""
+        store = KnowledgeStore()
+        store.merge({"is_open": "yes", "has_parking": "yes"})
+
+        self.assertEqual(store.compact_view(), {"is_open": "yes", "has_parking": "yes"})
+
+    def test_changed_fact_is_merged_and_versioned(self):
+        """A changed value is merged into the stored one, bumps its version and moves last"""
+        store = KnowledgeStore()
+        store.merge({"heights": {"tower": "300 m"}, "sources_seen": ["a"], "city": "Paris"})
+        counts = store.merge({"heights": {"antenna": "30 m"}, "sources_seen": ["a", "b"]})
+
+        self.assertEqual(counts, {"added": 0, "updated": 2, "duplicate": 0})
+        self.assertEqual(store.facts["heights"]["version"], 2)
+        self.assertEqual(store.compact_view(), {
+            "city": "Paris",
+            "heights": {"tower": "300 m", "antenna": "30 m"},
+            "sources_seen": ["a", "b"]
+        })
+
+    def test_merge_values(self):
+        """Lists keep distinct items in order and scalars are replaced"""
+        self.assertEqual(merge_values([1, {"a": 1}], [{"a": 1}, 2]), [1, {"a": 1}, 2])
+        self.assertEqual(merge_values("old", "new"), "new")
+
+    def test_store_pickles(self):
+        """The store survives pickling with the shared store"""
+        store = KnowledgeStore()
+        store.add("history", FACT, ["https://a.example"])
+        restored = pickle.loads(pickle.dumps(store))
+
+        self.assertEqual(restored.add("history", FACT), "duplicate")
+
+    def test_analyzer_post_compacts_shared_information(self):
+        """AnalyzerNode.post keeps one copy of repeated facts across iterations"""
+        shared = {"extracted_information": {}, "latest_tool_output": {"tool": "web_crawl", "url": "https://a.example"}}
+        report = {"extracted_info": {"history": FACT}, "confidence_score": 0.5, "assessment": ""}
+        node = AnalyzerNode()
+        node.post(shared, None, report)
+        shared["latest_tool_output"] = {"tool": "duckduckgo_search", "query": "eiffel tower", "results": []}
+        node.post(shared, None, {**report, "extracted_info": {"eiffel_tower_history": FACT}})
+
+        self.assertEqual(shared["extracted_information"], {"history": FACT})
+        self.assertEqual(shared["knowledge"].facts["history"]["sources"],
+                         ["https://a.example", "duckduckgo_search: eiffel tower"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.passage_rank import (
+    OMISSION_MARKER,
+    bm25_scores,
+    estimate_tokens,
+    pack_passages,
+    rank_passages,
+    split_passages
+)
+
+FILLER = "Subscribe to our newsletter for weekly updates on gardening, cooking and travel."
+
+def page(relevant_at, length=40):
+    """A page of filler lines with one relevant line at the given position."""
+    lines = [f"{FILLER} Item {i}." for i in range(length)]
+    lines[relevant_at] = "The Eiffel Tower is 330 metres tall after a new antenna was added in 2022."
+    return "\n".join(lines)
+
+class TestPassageRank(unittest.TestCase):
+    """Tests for passage splitting, BM25 scoring and budgeted packing."""
+
+    def test_split_passages_groups_lines(self):
+        """Lines are grouped up to the target size and long lines split at sentences"""
+        text = "\n".join(["short line"] * 10) + "\n" + "A sentence here. " * 20
+        passages = split_passages(text, target_chars=100)
+
+        self.assertTrue(all(len(p) <= 100 for p in passages))
+        self.assertEqual(passages[0], "\n".join(["short line"] * 9))
+        self.assertTrue(all(p.endswith(".") for p in passages[2:]))
+        self.assertEqual(" ".join(" ".join(passages).split()), " ".join(text.split()))
+
+    def test_bm25_prefers_matching_passage(self):
+        """Passages with rarer query terms score higher; no query gives zero scores"""
+        passages = ["the tower is tall", "a river runs through the city", "the city has a tall tower and a river"]
+        scores = bm25_scores(passages, "Eiffel tower height")
+
+        self.assertGreater(scores[0], scores[1])
+        self.assertEqual(scores[1], 0)
+        self.assertEqual(list(bm25_scores(passages, "the of")), [0, 0, 0])
+
+    def test_relevant_passage_deep_in_page_is_kept(self):
+        """Content far beyond the old 5000 character cut is selected when it matches the query"""
+        text = page(relevant_at=75, length=80)
+        self.assertGreater(text.index("Eiffel"), 5000)
+
+        packed = rank_passages(text, "How tall is the Eiffel Tower?", budget_tokens=100, target_chars=200)
+
+        self.assertIn("330 metres", packed)
+        self.assertLessEqual(estimate_tokens(packed.replace(OMISSION_MARKER, "")), 100)
+        self.assertIn(OMISSION_MARKER, packed)
+
+    def test_short_content_is_unchanged(self):
+        """Content within the budget is returned as is"""
+        self.assertEqual(rank_passages("tiny page", "query", budget_tokens=100), "tiny page")
+
+    def test_no_match_keeps_start_of_page(self):
+        """With nothing matching the query, the beginning of the page is kept as before"""
+        text = page(relevant_at=0)
+        packed = rank_passages(text, "quantum chromodynamics", budget_tokens=60, target_chars=200)
+
+        self.assertTrue(packed.startswith("The Eiffel Tower"))
+        self.assertTrue(packed.endswith(OMISSION_MARKER))
+
+    def test_pages_share_the_budget(self):
+        """Several pages are ranked together, so the relevant page gets the budget"""
+        relevant = page(relevant_at=20)
+        irrelevant = "\n".join(f"{FILLER} Other {i}." for i in range(40))
+
+        packed = pack_passages([irrelevant, relevant], "Eiffel Tower height", budget_tokens=160, target_chars=200)
+
+        self.assertEqual(len(packed), 2)
+        self.assertIn("330 metres", packed[1])
+        self.assertNotIn("Other 10.", packed[0])
+        self.assertLessEqual(sum(estimate_tokens(p.replace(OMISSION_MARKER, "")) for p in packed), 160)
+
+    def test_no_match_splits_budget_across_pages(self):
+        """With nothing matching the query, every page keeps its start and a similar share"""
+        pages = ["\n".join(f"{FILLER} Page {n} line {i}." for i in range(60)) for n in range(3)]
+
+        packed = pack_passages(pages, "quantum chromodynamics", budget_tokens=300, target_chars=200)
+
+        for n, text in enumerate(packed):
+            self.assertTrue(text.startswith(f"{FILLER} Page {n} line 0."))
+        lengths = [len(text) for text in packed]
+        self.assertLess(max(lengths) - min(lengths), 250)
+        self.assertLessEqual(sum(estimate_tokens(p.replace(OMISSION_MARKER, "")) for p in packed), 300)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+import asyncio
+import threading
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.prefetch import Prefetcher
+from utils.url_utils import VisitedIndex
+from nodes import DuckDuckGoSearchNode, WebCrawlNode
+from nodes_async import AsyncWebCrawlNode
+
+def page(url, content="page text", size=1000):
+    return {"url": url, "title": "T", "content": content, "status": 200, "bytes": size}
+
+class TestPrefetcher(unittest.TestCase):
+    """Tests for speculative crawling of search results."""
+
+    def test_take_returns_prefetched_page(self):
+        """A prefetched page is handed out once, under any spelling of its URL"""
+        crawled = []
+        prefetcher = Prefetcher(crawl=lambda url: crawled.append(url) or page(url))
+        prefetcher.prefetch(["https://example.com/a", "https://example.com/a#top"])
+
+        self.assertEqual(prefetcher.take("https://Example.com/a/")["url"], "https://example.com/a")
+        self.assertIsNone(prefetcher.take("https://example.com/a"))
+        self.assertEqual(crawled, ["https://example.com/a"])
+        stats = prefetcher.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["used_bytes"]), (1, 1, 1000))
+        self.assertEqual(stats["hit_rate"], 1.0)
+
+    def test_take_waits_for_running_crawl(self):
+        """Taking a page whose crawl is still running waits for it"""
+        release = threading.Event()
+        prefetcher = Prefetcher(crawl=lambda url: release.wait(5) and page(url))
+        prefetcher.prefetch(["https://example.com/slow"])
+        threading.Timer(0.05, release.set).start()
+
+        self.assertEqual(prefetcher.take("https://example.com/slow")["url"], "https://example.com/slow")
+        self.assertEqual(prefetcher.stats()["waited"], 1)
+
+    def test_failed_prefetch_is_a_miss(self):
+        """An error result is not handed out, so the crawl node fetches the page itself"""
+        prefetcher = Prefetcher(crawl=lambda url: {"url": url, "title": "Error", "content": "failed", "status": 0})
+        prefetcher.prefetch(["https://example.com/broken"])
+
+        self.assertIsNone(prefetcher.take("https://example.com/broken"))
+        self.assertEqual(prefetcher.stats()["failed"], 1)
+        self.assertEqual(prefetcher.stats()["hit_rate"], 0.0)
+
+    def test_evicted_pages_count_as_wasted(self):
+        """Pages pushed out of the bounded cache unused are counted as wasted, with their download size"""
+        prefetcher = Prefetcher(max_entries=2, crawl=lambda url: page(url, "x" * 10, size=100))
+        prefetcher.prefetch(["https://example.com/1", "https://example.com/2"])
+        for future, _ in list(prefetcher._entries.values()):
+            future.result()
+        prefetcher.take("https://example.com/2")
+        prefetcher.prefetch(["https://example.com/3", "https://example.com/4"])
+        prefetcher._executor.shutdown(wait=True)
+
+        prefetcher.take("https://example.com/3")
+        self.assertNotIn("https://example.com/1", prefetcher)
+        stats = prefetcher.stats()
+        # Page 1 was evicted and page 4 is still unclaimed
+        self.assertEqual((stats["prefetched"], stats["wasted"], stats["wasted_bytes"]), (4, 2, 200))
+
+        prefetcher.clear()
+        self.assertNotIn("https://example.com/4", prefetcher)
+        stats = prefetcher.stats()
+        self.assertEqual((stats["wasted"], stats["wasted_bytes"], stats["used_bytes"]), (2, 200, 200))
+
+    def test_search_results_feed_the_crawl_node(self):
+        """Search results are prefetched, skipping visited pages, and the crawl node uses them"""
+        crawled = []
+        prefetcher = Prefetcher(crawl=lambda url: crawled.append(url) or page(url))
+        index = VisitedIndex()
+        index.add("https://example.com/seen")
+        shared = {"visited_urls": [], "visited_index": index, "current_decision": {"query_or_url": "q"}}
+        results = [{"title": "T", "link": f"https://example.com/{name}", "snippet": ""}
+                   for name in ("seen", "one", "two", "three", "four")]
+
+        with patch('nodes.get_prefetcher', return_value=prefetcher), \
+                patch('nodes.search_duckduckgo', return_value=results), \
+                patch('nodes.crawl_url', side_effect=AssertionError("should use the prefetched page")):
+            DuckDuckGoSearchNode().run(shared)
+            shared["current_decision"] = {"query_or_url": "https://example.com/one"}
+            WebCrawlNode().run(shared)
+
+        prefetcher._executor.shutdown(wait=True)
+        self.assertEqual(sorted(crawled), ["https://example.com/one", "https://example.com/three", "https://example.com/two"])
+        self.assertEqual(shared["latest_tool_output"]["content"]["url"], "https://example.com/one")
+
+    def test_async_batch_crawl_uses_prefetched_pages(self):
+        """The async crawl node claims prefetched pages and only crawls the rest"""
+        prefetcher = Prefetcher(crawl=page)
+        prefetcher.prefetch(["https://example.com/one"])
+        urls = ["https://example.com/one", "https://example.com/two"]
+        crawl = AsyncMock(side_effect=lambda missing: [page(u, "crawled") for u in missing])
+
+        with patch('nodes.get_prefetcher', return_value=prefetcher), patch('nodes_async.crawl_urls', crawl):
+            node = AsyncWebCrawlNode()
+            node.known_pages = {}
+            pages = asyncio.run(node.exec_async(urls))
+
+        crawl.assert_awaited_once_with(["https://example.com/two"])
+        self.assertEqual([p["content"] for p in pages], ["page text", "crawled"])
+        self.assertEqual(prefetcher.stats()["hits"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
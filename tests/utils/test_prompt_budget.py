@@ -0,0 +1,97 @@
+import unittest
+import json
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.prompt_budget import (
+    PROMPT_HISTORY_TOKENS,
+    PROMPT_KNOWLEDGE_TOKENS,
+    PROMPT_REPORT_TOKENS,
+    PromptBuilder,
+    estimate_tokens,
+    fit_json,
+    get_prompt_stats,
+    reset_prompt_stats,
+    summarize_history
+)
+from nodes import HITLOutputNode
+
+def history(steps):
+    return [{"action": "search_duckduckgo", "query_or_url": f"query {i}", "reasoning": f"reason {i}"}
+            for i in range(steps)]
+
+class TestPromptBudget(unittest.TestCase):
+    """Tests for fitting growing prompt context into token budgets."""
+
+    def setUp(self):
+        reset_prompt_stats()
+        self.addCleanup(reset_prompt_stats)
+
+    def test_fit_json_unchanged_within_budget(self):
+        """Values that fit are serialized as is"""
+        value = {"a": "short", "b": [1, 2, 3]}
+        self.assertEqual(fit_json(value, 100), json.dumps(value))
+
+    def test_fit_json_shortens_long_values(self):
+        """Long strings and lists are shortened before any entry is dropped"""
+        value = {"summary": "x" * 5000, "points": list(range(100))}
+        text = fit_json(value, 200)
+        fitted = json.loads(text)
+
+        self.assertLessEqual(estimate_tokens(text), 200)
+        self.assertEqual(set(fitted), {"summary", "points"})
+        self.assertTrue(fitted["summary"].endswith("..."))
+        self.assertIn("more", fitted["points"][-1])
+
+    def test_fit_json_drops_oldest_entries(self):
+        """When shortening is not enough the newest keys are kept and the rest counted"""
+        value = {f"fact_{i}": f"value number {i} " * 10 for i in range(200)}
+        text = fit_json(value, 300)
+        fitted = json.loads(text)
+
+        self.assertLessEqual(estimate_tokens(text), 300)
+        self.assertIn("fact_199", fitted)
+        self.assertNotIn("fact_0", fitted)
+        omitted = int(fitted["_omitted"].split()[0])
+        self.assertEqual(omitted + len(fitted) - 1, 200)
+
+    def test_summarize_history_keeps_recent_steps(self):
+        """Recent steps keep their reasoning and older steps are dropped to fit"""
+        summary = summarize_history(history(200), 100)
+
+        self.assertLessEqual(estimate_tokens(summary), 100)
+        self.assertTrue(summary.startswith("("))
+        self.assertTrue(summary.endswith("200. search_duckduckgo: query 199 (reason 199)"))
+        self.assertNotIn("reason 190", summary)
+
+    def test_builder_records_sizes(self):
+        """Built prompts are measured per node"""
+        PromptBuilder("TestNode").add("x" * 400).add_json("Info: ", {"k": "v"}, 10, "knowledge").build()
+
+        stats = get_prompt_stats()["TestNode"]
+        self.assertEqual(stats["prompts"], 1)
+        self.assertEqual(stats["last_tokens"], estimate_tokens("x" * 400 + 'Info: {"k": "v"}\n'))
+
+    def test_hitl_prompt_has_a_ceiling(self):
+        """The HITL prompt stops growing however long the session gets"""
+        def prompt_tokens(steps):
+            context = {
+                "initial_query": "What is the tallest building?",
+                "research_history": history(steps),
+                "extracted_information": {f"fact_{i}": "detail " * 30 for i in range(steps)},
+                "final_analyzer_report": {"assessment": "a" * 100, "extracted_info": {"x": "y" * 10000}}
+            }
+            return estimate_tokens(HITLOutputNode().build_prompt(context))
+
+        fixed = prompt_tokens(0)
+        ceiling = fixed + PROMPT_KNOWLEDGE_TOKENS + PROMPT_REPORT_TOKENS + PROMPT_HISTORY_TOKENS
+
+        self.assertLess(prompt_tokens(5), prompt_tokens(200))
+        self.assertLessEqual(prompt_tokens(200), ceiling)
+        self.assertLessEqual(prompt_tokens(2000), ceiling)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+import shutil
+import requests
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.cache import PersistentCache
+from utils.robots import RobotsPolicy, RobotsRules, parse_robots
+from utils.host_scheduler import HostScheduler
+from utils.circuit_breaker import BreakerRegistry
+from utils.web_crawl import crawl_url
+
+ROBOTS_TXT = """
+# Example robots.txt
+User-agent: *
+Disallow: /private
+Allow: /private/press
+Disallow: /*.pdf$
+Crawl-delay: 1
+
+User-agent: OtherBot
+User-agent: PocketFlowResearchBot/1.0
+Disallow: /no-bots
+Crawl-delay: 5
+"""
+
+def response(status, body=b""):
+    mock = MagicMock(status_code=status, headers={"Content-Type": "text/plain"})
+    mock.iter_content.return_value = [body]
+    return mock
+
+class TestRobotsRules(unittest.TestCase):
+    """Tests for robots.txt parsing and matching."""
+
+    def test_longest_match_wins(self):
+        """The longest matching rule decides, Allow winning ties, and wildcards are honored"""
+        rules = parse_robots(ROBOTS_TXT, user_agent="SomeBot")
+
+        self.assertFalse(rules.allowed("https://a.example/private/notes"))
+        self.assertTrue(rules.allowed("https://a.example/private/press/release"))
+        self.assertTrue(rules.allowed("https://a.example/public"))
+        self.assertFalse(rules.allowed("https://a.example/files/report.pdf"))
+        self.assertTrue(rules.allowed("https://a.example/files/report.pdf?page=2"))
+        self.assertTrue(RobotsRules([(False, "/page"), (True, "/page")]).allowed("https://a.example/page"))
+        self.assertEqual(rules.crawl_delay, 1)
+
+    def test_own_group_replaces_star_group(self):
+        """A group naming the crawler is used instead of the * group, whatever its version suffix"""
+        rules = parse_robots(ROBOTS_TXT, user_agent="PocketFlowResearchBot")
+
+        self.assertFalse(rules.allowed("https://a.example/no-bots"))
+        self.assertTrue(rules.allowed("https://a.example/private/notes"))
+        self.assertEqual(rules.crawl_delay, 5)
+
+    def test_empty_or_missing_rules_allow_everything(self):
+        """An empty Disallow and an empty file allow every path"""
+        self.assertTrue(parse_robots("User-agent: *\nDisallow:\n").allowed("https://a.example/x"))
+        self.assertTrue(parse_robots("").allowed("https://a.example/x"))
+
+class TestRobotsPolicy(unittest.TestCase):
+    """Tests for fetching and caching robots.txt."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = PersistentCache(os.path.join(self.temp_dir, "robots.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_fetched_once_per_host_and_remembered(self):
+        """robots.txt is fetched once per host and reused from disk by a new policy"""
+        session = MagicMock()
+        session.get.return_value = response(200, ROBOTS_TXT.encode())
+        policy = RobotsPolicy(user_agent="SomeBot", store=self.store)
+
+        self.assertFalse(policy.allowed("https://a.example/private", session))
+        self.assertTrue(policy.allowed("https://a.example/public", session))
+        session.get.assert_called_once()
+        self.assertEqual(session.get.call_args[0][0], "https://a.example/robots.txt")
+
+        later = RobotsPolicy(user_agent="SomeBot", store=self.store)
+        self.assertFalse(later.allowed("https://a.example/private", session))
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual(later.stats()["disk_hits"], 1)
+
+    def test_missing_and_unreachable_robots(self):
+        """A 404 allows everything; a 5xx or a network error disallows the host for now"""
+        session = MagicMock()
+        session.get.side_effect = [response(404), response(503), requests.exceptions.ConnectTimeout("timed out")]
+        policy = RobotsPolicy()
+
+        self.assertTrue(policy.allowed("https://missing.example/page", session))
+        self.assertTrue(policy.rules_for("https://down.example/page", session).unreachable)
+        self.assertFalse(policy.allowed("https://slow.example/page", session))
+
+    @patch('utils.web_crawl.get_http_cache', return_value=None)
+    @patch('utils.web_crawl.get_session')
+    def test_crawl_url_rejects_before_connecting(self, mock_get_session, _):
+        """A disallowed URL is rejected without a request for it, and Crawl-delay paces the host"""
+        session = mock_get_session.return_value
+        session.get.return_value = response(200, ROBOTS_TXT.encode())
+        scheduler = HostScheduler(rate=100, burst=10)
+
+        with patch('utils.web_crawl.get_robots_policy', return_value=RobotsPolicy(user_agent="SomeBot")), \
+                patch('utils.web_crawl.get_host_scheduler', return_value=scheduler), \
+                patch('utils.web_crawl.get_breakers', return_value=BreakerRegistry()):
+            result = crawl_url("https://a.example/private/notes")
+
+        self.assertEqual(result["status"], 0)
+        self.assertIn("robots.txt", result["content"])
+        self.assertEqual([call[0][0] for call in session.get.call_args_list], ["https://a.example/robots.txt"])
+        self.assertEqual((scheduler._hosts["a.example"].rate, scheduler._hosts["a.example"].burst), (1, 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import os
+import sys
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from google.ai import generativelanguage as glm
+from google.generativeai import GenerationConfig
+from google.generativeai.types import generation_types
+from utils.data_structures import Decision, AnalyzerReport, HITLOutput
+from utils.json_extract import JSONExtractionError
+from utils.structured_output import (
+    response_schema_for, parse_structured, get_structured_output_stats, reset_structured_output_stats
+)
+
+class TestResponseSchema(unittest.TestCase):
+
+    def test_schemas_are_accepted_by_gemini(self):
+        """Test that every derived schema converts to a Gemini GenerationConfig"""
+        for schema in (Decision, AnalyzerReport, HITLOutput):
+            config = GenerationConfig(response_mime_type="application/json", response_schema=response_schema_for(schema))
+            glm.GenerationConfig(**generation_types.to_generation_config_dict(config))
+
+    def test_field_mapping(self):
+        """Test how TypedDict hints map onto schema types"""
+        properties = response_schema_for(AnalyzerReport)["properties"]
+        self.assertEqual(properties["extracted_info"]["type"], "string")
+        self.assertEqual(properties["confidence_score"], {"type": "number"})
+        self.assertEqual(properties["new_potential_urls"], {"type": "array", "items": {"type": "string"}})
+        self.assertEqual(properties["inconsistencies_found"], {"type": "string", "nullable": True})
+
+        # Gemini has no union types: Decision.query_or_url is a nullable string
+        self.assertEqual(response_schema_for(Decision)["properties"]["query_or_url"], {"type": "string", "nullable": True})
+
+class TestParseStructured(unittest.TestCase):
+
+    def setUp(self):
+        reset_structured_output_stats()
+        self.addCleanup(reset_structured_output_stats)
+
+    def test_encoded_fields_are_decoded(self):
+        """Test that free-form fields sent as JSON strings come back as dicts"""
+        text = ('{"extracted_info": "{\\"year\\": 1991}", "assessment": "ok", "confidence_score": 0.8, '
+                '"suggestions_for_next_step": [], "new_potential_urls": [], "inconsistencies_found": null}')
+        report = parse_structured(text, AnalyzerReport)
+        self.assertEqual(report["extracted_info"], {"year": 1991})
+        self.assertEqual(get_structured_output_stats(), {"requests": 1, "parse_failures_avoided": 1, "repaired": 0, "failed": 0})
+
+    def test_repaired_output_is_counted_separately(self):
+        """Test that output only the extraction fallback can decode counts as repaired, not avoided"""
+        report = parse_structured('{"final_answer": "42", "research_summary": "s", "key_sources": ["a"', HITLOutput)
+        self.assertEqual(report["key_sources"], ["a"])
+        self.assertEqual(get_structured_output_stats(), {"requests": 1, "parse_failures_avoided": 0, "repaired": 1, "failed": 0})
+
+    def test_cache_checks_are_not_counted(self):
+        """Test that record=False leaves the counters alone"""
+        parse_structured('{"final_answer": "42", "research_summary": "s", "key_sources": []}', HITLOutput, record=False)
+        self.assertEqual(get_structured_output_stats()["requests"], 0)
+
+    def test_streamed_object_is_used(self):
+        """Test that an object parsed while streaming skips decoding the text again"""
+        parsed = {"final_answer": "42", "research_summary": "s", "key_sources": []}
+        self.assertEqual(parse_structured("", HITLOutput, parsed=parsed), parsed)
+
+    def test_mismatch_is_counted(self):
+        """Test that output missing required fields raises and is counted as failed"""
+        with self.assertRaises(JSONExtractionError):
+            parse_structured('{"final_answer": "42"}', HITLOutput)
+        self.assertEqual(get_structured_output_stats()["failed"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import threading
+import pickle
+import os
+import sys
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.tool_dispatch import ToolDispatcher
+from utils.url_utils import VisitedIndex
+from nodes import DecisionNode
+
+class TestToolDispatch(unittest.TestCase):
+
+    def test_dispatched_call_is_claimed_once(self):
+        """Test that a started tool call is handed to the first matching claim only"""
+        search = MagicMock(return_value=[{"title": "Result"}])
+        dispatcher = ToolDispatcher()
+        with patch.dict('utils.tool_dispatch.TOOL_FUNCTIONS', {"search_google": search}):
+            self.assertTrue(dispatcher.dispatch("search_google", "early query"))
+            self.assertTrue(dispatcher.dispatch("search_google", "early query"))
+
+            future = dispatcher.take("search_google", "early query")
+            self.assertEqual(future.result(), [{"title": "Result"}])
+            self.assertIsNone(dispatcher.take("search_google", "early query"))
+        search.assert_called_once_with("early query")
+
+    def test_unknown_actions_are_not_dispatched(self):
+        """Test that actions without a single-target tool are ignored"""
+        dispatcher = ToolDispatcher()
+        self.assertFalse(dispatcher.dispatch("send_to_hitl", None))
+        self.assertFalse(dispatcher.dispatch("crawl_urls", ["https://example.com"]))
+        self.assertIsNone(dispatcher.take("send_to_hitl", None))
+
+    def test_sessions_do_not_share_calls(self):
+        """Test that a call started by one session cannot be claimed by another"""
+        search = MagicMock(return_value=[])
+        first, second = ToolDispatcher(), ToolDispatcher()
+        with patch.dict('utils.tool_dispatch.TOOL_FUNCTIONS', {"search_google": search}):
+            first.dispatch("search_google", "shared query")
+            self.assertIsNone(second.take("search_google", "shared query"))
+            self.assertIsNotNone(first.take("search_google", "shared query"))
+
+    @patch('utils.tool_dispatch.get_prefetcher', return_value=None)
+    def test_visited_pages_are_not_crawled(self, _):
+        """Test that a page already crawled this session is left to the crawl node's visited index"""
+        crawl = MagicMock()
+        index = VisitedIndex()
+        index.add("https://example.com/seen")
+        dispatcher = ToolDispatcher()
+        with patch.dict('utils.tool_dispatch.TOOL_FUNCTIONS', {"crawl_url": crawl}):
+            self.assertFalse(dispatcher.dispatch("crawl_url", "https://example.com/seen/", visited=index))
+        crawl.assert_not_called()
+
+    def test_settle_drops_calls_the_decision_did_not_keep(self):
+        """Test that calls started for another action or target are cancelled or dropped"""
+        release = threading.Event()
+        search = MagicMock(side_effect=lambda query: release.wait(5) and [query])
+        dispatcher = ToolDispatcher()
+        with patch.dict('utils.tool_dispatch.TOOL_FUNCTIONS', {"search_google": search, "search_all": search}):
+            dispatcher.dispatch("search_google", "first try")
+            dispatcher.dispatch("search_all", "second try")
+            self.assertEqual(dispatcher.settle("search_all", "second try"), 1)
+            release.set()
+
+            self.assertIsNone(dispatcher.take("search_google", "first try"))
+            self.assertEqual(dispatcher.take("search_all", "second try").result(), ["second try"])
+
+    def test_pending_calls_are_not_pickled(self):
+        """Test that a checkpointed dispatcher comes back empty"""
+        dispatcher = ToolDispatcher(max_pending=3)
+        with patch.dict('utils.tool_dispatch.TOOL_FUNCTIONS', {"search_google": MagicMock(return_value=[])}):
+            dispatcher.dispatch("search_google", "query")
+        restored = pickle.loads(pickle.dumps(dispatcher))
+        self.assertEqual(restored.max_pending, 3)
+        self.assertIsNone(restored.take("search_google", "query"))
+
+    def test_decision_settles_its_session_dispatcher(self):
+        """Test that the decision node drops early calls that do not match its final decision"""
+        dispatcher = ToolDispatcher()
+        shared = {"iteration_count": 0, "research_history": [], "tool_dispatcher": dispatcher}
+        with patch.dict('utils.tool_dispatch.TOOL_FUNCTIONS', {"search_google": MagicMock(return_value=[])}):
+            dispatcher.dispatch("search_google", "abandoned")
+        decision = {"next_action": "search_google", "query_or_url": "kept", "reasoning": "r"}
+
+        DecisionNode().post(shared, None, decision)
+        self.assertIsNone(dispatcher.take("search_google", "abandoned"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.url_utils import BloomFilter, VisitedIndex, canonicalize_url, url_key
+from nodes import WebCrawlNode, BatchWebCrawlNode
+
+def page(url):
+    return {"url": url, "title": "t", "content": "c", "status": 200}
+
+class TestUrlUtils(unittest.TestCase):
+    """Tests for URL canonicalization and the visited index."""
+
+    def test_canonicalize_url(self):
+        """Case, default ports, fragments, tracking parameters and trailing slashes are normalized"""
+        self.assertEqual(
+            canonicalize_url(" HTTPS://Example.COM:443/Docs/./guide/?utm_source=news&b=2&a=1&fbclid=x#intro "),
+            "https://example.com/Docs/guide?a=1&b=2"
+        )
+        self.assertEqual(canonicalize_url("example.com"), "http://example.com/")
+        self.assertEqual(canonicalize_url("http://example.com:8080/a/../b"), "http://example.com:8080/b")
+        # ref often selects content (e.g. a git branch), so it is kept
+        self.assertEqual(canonicalize_url("https://example.com/tree?ref=main"), "https://example.com/tree?ref=main")
+
+    def test_url_key_ignores_scheme_and_www(self):
+        """Every spelling of a page maps to one key"""
+        variants = [
+            "http://example.com/page",
+            "https://www.example.com/page/",
+            "https://example.com/page?utm_campaign=x#top",
+        ]
+        self.assertEqual({url_key(url) for url in variants}, {"example.com/page"})
+        self.assertNotEqual(url_key("https://example.com/page?id=1"), url_key("https://example.com/page?id=2"))
+
+    def test_bloom_filter(self):
+        """Added items are always found and false positives stay near the target rate"""
+        bloom = BloomFilter(1000, false_positive_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"item{i}")
+
+        self.assertTrue(all(f"item{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"other{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_visited_index_overflows_into_bloom_filter(self):
+        """Pages beyond the exact limit are still reported as visited"""
+        index = VisitedIndex(exact_limit=5)
+        for i in range(15):
+            self.assertTrue(index.add(f"https://example.com/{i}"))
+
+        self.assertEqual(len(index), 5)
+        self.assertTrue(all(f"http://www.example.com/{i}/" in index for i in range(15)))
+        self.assertFalse(index.add("https://example.com/7"))
+
+    def test_visited_index_keeps_recent_results(self):
+        """Successful crawl results are kept for the most recent pages only"""
+        index = VisitedIndex(max_results=2)
+        index.record("https://a.example/1", page("https://a.example/1"))
+        index.record("https://a.example/2", {"url": "https://a.example/2", "status": 0})
+        index.record("https://a.example/3", page("https://a.example/3"))
+        index.record("https://a.example/4", page("https://a.example/4"))
+
+        self.assertIsNone(index.result("https://a.example/1"))
+        self.assertIsNone(index.result("https://a.example/2"))
+        self.assertEqual(index.result("http://a.example/4/")["url"], "https://a.example/4")
+        # A failed crawl does not mark the page visited, so it can be tried again
+        self.assertNotIn("https://a.example/2", index)
+
+    def test_filter_new(self):
+        """Visited pages and repeated spellings are dropped, first spelling kept"""
+        index = VisitedIndex()
+        index.add("https://example.com/seen")
+        urls = ["http://example.com/seen/", "https://example.com/new?utm_source=x", "https://www.example.com/new", None]
+
+        self.assertEqual(index.filter_new(urls), ["https://example.com/new?utm_source=x"])
+
+    def test_repeat_crawl_is_answered_from_index(self):
+        """Crawling a page again in the same session reuses the earlier result"""
+        shared = {"visited_urls": [], "current_decision": {"query_or_url": "https://example.com/a"}}
+        with patch('nodes.crawl_url', side_effect=page) as mock_crawl:
+            WebCrawlNode().run(shared)
+            shared["current_decision"] = {"query_or_url": "http://www.example.com/a/#section"}
+            WebCrawlNode().run(shared)
+
+        self.assertEqual(mock_crawl.call_count, 1)
+        self.assertEqual(shared["latest_tool_output"]["content"]["url"], "https://example.com/a")
+        self.assertEqual(shared["visited_urls"], ["https://example.com/a"])
+
+    def test_failed_crawl_is_not_visited(self):
+        """A page whose crawl failed is not marked visited and is fetched again when chosen"""
+        shared = {"visited_urls": [], "current_decision": {"query_or_url": "https://example.com/flaky"}}
+        failed = {"url": "https://example.com/flaky", "title": "Error", "content": "timed out", "status": 0}
+        with patch('nodes.crawl_url', side_effect=[failed, page("https://example.com/flaky")]) as mock_crawl:
+            WebCrawlNode().run(shared)
+            self.assertNotIn("https://example.com/flaky", shared["visited_index"])
+            self.assertEqual(shared["visited_urls"], [])
+            WebCrawlNode().run(shared)
+
+        self.assertEqual(mock_crawl.call_count, 2)
+        self.assertIn("https://example.com/flaky", shared["visited_index"])
+        self.assertEqual(shared["visited_urls"], ["https://example.com/flaky"])
+
+    def test_batch_crawl_skips_visited_spellings(self):
+        """The batch crawl does not refetch a page visited under another spelling"""
+        shared = {"visited_urls": [], "visited_index": VisitedIndex(),
+                  "current_decision": {"query_or_url": "https://example.com/a, https://example.com/b"}}
+        shared["visited_index"].add("http://www.example.com/a")
+        with patch('nodes.crawl_urls_sync', side_effect=lambda urls: [page(u) for u in urls]) as mock_crawl:
+            BatchWebCrawlNode().run(shared)
+
+        mock_crawl.assert_called_once_with(["https://example.com/b"])
+
+class TestBatchWebCrawlNode(unittest.TestCase):
+    """Tests for choosing the pages of a multi-URL crawl."""
+
+    def setUp(self):
+        patcher = patch('nodes.get_prefetcher', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_batch(self, shared, node=None):
+        with patch('nodes.crawl_urls_sync', side_effect=lambda urls: [page(u) for u in urls]) as mock_crawl:
+            (node or BatchWebCrawlNode()).run(shared)
+        return mock_crawl
+
+    def test_comma_separated_urls(self):
+        """A comma or newline separated string is split into URLs, ignoring blanks"""
+        shared = {"visited_urls": [],
+                  "current_decision": {"query_or_url": "https://a.example/1, https://a.example/2,\nhttps://a.example/3,"}}
+        mock_crawl = self.run_batch(shared)
+
+        mock_crawl.assert_called_once_with(["https://a.example/1", "https://a.example/2", "https://a.example/3"])
+        self.assertEqual([p["url"] for p in shared["latest_tool_output"]["results"]],
+                         ["https://a.example/1", "https://a.example/2", "https://a.example/3"])
+
+    def test_falls_back_to_analyzer_urls(self):
+        """Without URLs in the decision, the analyzer's new_potential_urls are crawled"""
+        shared = {"visited_urls": [], "current_decision": {"query_or_url": None},
+                  "analyzer_report": {"new_potential_urls": ["https://b.example/x", "https://b.example/y"]}}
+        mock_crawl = self.run_batch(shared)
+
+        mock_crawl.assert_called_once_with(["https://b.example/x", "https://b.example/y"])
+
+    def test_max_urls_caps_the_fan_out(self):
+        """Only the first max_urls new pages are crawled"""
+        urls = [f"https://c.example/{i}" for i in range(8)]
+        shared = {"visited_urls": [], "current_decision": {"query_or_url": urls}}
+        mock_crawl = self.run_batch(shared, BatchWebCrawlNode(max_urls=3))
+
+        mock_crawl.assert_called_once_with(urls[:3])
+        self.assertEqual(shared["visited_urls"], urls[:3])
+
+    def test_all_visited_replaces_stale_output(self):
+        """When every URL was visited, the Analyzer sees a no-new-pages error, not the previous output"""
+        shared = {"visited_urls": [], "visited_index": VisitedIndex(),
+                  "current_decision": {"query_or_url": ["https://d.example/a"]},
+                  "latest_tool_output": {"tool": "duckduckgo_search", "query": "old", "results": []}}
+        shared["visited_index"].add("https://d.example/a")
+        mock_crawl = self.run_batch(shared)
+
+        mock_crawl.assert_not_called()
+        self.assertEqual(shared["latest_tool_output"]["tool"], "web_crawl")
+        self.assertEqual(shared["latest_tool_output"]["results"], [])
+        self.assertIn("No new pages", shared["latest_tool_output"]["error"])
+
+if __name__ == "__main__":
+    unittest.main()
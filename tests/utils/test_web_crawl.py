@@ -1,23 +1,48 @@
 import unittest
 from unittest.mock import patch, MagicMock
+import asyncio
 import requests
 import sys
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Add the project root to the path so imports work correctly
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from utils.web_crawl import crawl_url
+from utils.web_crawl import crawl_url, crawl_urls_sync, read_page, download_page
+from utils.host_scheduler import HostScheduler
+from utils.circuit_breaker import BreakerRegistry
+from utils.html_extract import EXTRACTORS
 
 class TestWebCrawl(unittest.TestCase):
 
-    @patch('utils.web_crawl.requests.get')
+    def setUp(self):
+        # Keep the shared on-disk HTTP cache out of these tests
+        patcher = patch('utils.web_crawl.get_http_cache', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('utils.web_crawl.get_robots_policy', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Give every test its own host state and circuit breakers, without backoff between retries
+        self.scheduler = HostScheduler(backoff_base=0)
+        patcher = patch('utils.web_crawl.get_host_scheduler', return_value=self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('utils.web_crawl.get_breakers', return_value=BreakerRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('utils.web_crawl.requests.Session.get')
     def test_crawl_url_success(self, mock_get):
         """Test successful URL crawling"""
         # Setup mock response
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.text = """
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
+        html = """
         <html>
             <head>
                 <title>Test Page</title>
@@ -30,6 +55,7 @@ class TestWebCrawl(unittest.TestCase):
             </body>
         </html>
         """
+        mock_response.iter_content.return_value = [html.encode()]
         mock_get.return_value = mock_response
         
         # Call the function
@@ -46,7 +72,7 @@ class TestWebCrawl(unittest.TestCase):
         self.assertNotIn("alert", result["content"])
         self.assertNotIn("color: red", result["content"])
     
-    @patch('utils.web_crawl.requests.get')
+    @patch('utils.web_crawl.requests.Session.get')
     def test_crawl_url_http_error(self, mock_get):
         """Test handling of HTTP errors"""
         # Setup mock to raise HTTP error
@@ -61,7 +87,26 @@ class TestWebCrawl(unittest.TestCase):
         self.assertEqual(result["status"], 0)
         self.assertIn("Failed to crawl the URL", result["content"])
     
-    @patch('utils.web_crawl.requests.get')
+    @patch('utils.web_crawl.requests.Session.get')
+    def test_client_errors_are_not_retried(self, mock_get):
+        """Test that a 404 fails at once while a 429 is retried"""
+        def error(status):
+            response = MagicMock(status_code=status, headers={})
+            response.raise_for_status.side_effect = requests.exceptions.HTTPError(f"{status}", response=response)
+            return response
+
+        mock_get.return_value = error(404)
+        result = crawl_url("https://example.com/missing", max_retries=3)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertIn("HTTP 404", result["content"])
+
+        mock_get.reset_mock()
+        mock_get.return_value = error(429)
+        with patch.object(self.scheduler, 'record_response'):
+            crawl_url("https://example.com/busy", max_retries=3)
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch('utils.web_crawl.requests.Session.get')
     def test_crawl_url_connection_error(self, mock_get):
         """Test handling of connection errors"""
         # Setup mock to raise connection error
@@ -76,5 +121,218 @@ class TestWebCrawl(unittest.TestCase):
         self.assertEqual(result["status"], 0)
         self.assertIn("Failed to crawl the URL", result["content"])
 
+    @patch('utils.web_crawl.requests.Session.get')
+    def test_crawl_url_skips_non_html(self, mock_get):
+        """Test that non-HTML responses are skipped without reading the body"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {"Content-Type": "application/pdf"}
+        mock_get.return_value = mock_response
+
+        result = crawl_url("https://example.com/report.pdf")
+
+        self.assertEqual(result["status"], 0)
+        self.assertIn("application/pdf", result["content"])
+        mock_response.iter_content.assert_not_called()
+        mock_response.close.assert_called_once()
+        self.assertEqual(mock_get.call_count, 1)
+
+class TestReadPage(unittest.TestCase):
+
+    def _response(self, body, content_type="text/html", chunk_size=100):
+        response = MagicMock()
+        response.headers = {"Content-Type": content_type}
+        response.iter_content.return_value = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+        return response
+
+    def test_read_page_stops_at_byte_limit(self):
+        """Test that no more than max_bytes of the body are read"""
+        body = b"<html><body>" + b"<p>paragraph</p>" * 1000 + b"</body></html>"
+        title, text, read, truncated = read_page(self._response(body), max_bytes=1000, max_text_chars=10 ** 6)
+
+        self.assertEqual(len(read), 1000)
+        self.assertTrue(truncated)
+        self.assertTrue(text.startswith("paragraph\nparagraph"))
+
+    def test_body_of_exactly_max_bytes_is_not_truncated(self):
+        """Test that only bodies longer than max_bytes are reported as cut short"""
+        body = b"<html><body>" + b"<p>paragraph</p>" * 61 + b"</body></html>"
+        self.assertEqual(len(body), 1002)
+
+        _, _, read, truncated = read_page(self._response(body), max_bytes=1002, max_text_chars=10 ** 6)
+        self.assertEqual((read, truncated), (body, False))
+        self.assertEqual(download_page(self._response(body), max_bytes=1002), (body, False))
+
+        _, _, read, truncated = read_page(self._response(body), max_bytes=1001, max_text_chars=10 ** 6)
+        self.assertEqual((len(read), truncated), (1001, True))
+        self.assertEqual(download_page(self._response(body), max_bytes=1001), (body[:1001], True))
+
+    def test_read_page_stops_once_enough_text(self):
+        """Test that reading stops once enough text has been extracted"""
+        body = b"<html><body>" + b"<p>paragraph</p>" * 1000 + b"</body></html>"
+        response = self._response(body)
+        _, text, read, truncated = read_page(response, max_bytes=10 ** 6, max_text_chars=2000)
+
+        self.assertTrue(truncated)
+        self.assertLess(len(read), 4000)
+        self.assertGreaterEqual(len(text), 1500)
+
+    def test_read_page_decodes_meta_charset(self):
+        """Test that the <meta> charset is used when the header has none, across chunk boundaries"""
+        body = '<html><head><meta charset="windows-1252"><title>Caf\u00e9</title></head><body><p>na\u00efve \u20ac</p></body></html>'
+        title, text, _, truncated = read_page(self._response(body.encode("windows-1252"), chunk_size=7))
+
+        self.assertEqual(title, "Caf\u00e9")
+        self.assertEqual(text, "na\u00efve \u20ac")
+        self.assertFalse(truncated)
+
+    def test_read_page_splits_multibyte_characters(self):
+        """Test that UTF-8 characters split between chunks decode correctly"""
+        body = "<p>\u65e5\u672c\u8a9e\u306e\u30da\u30fc\u30b8</p>".encode("utf-8")
+        _, text, _, _ = read_page(self._response(body, "text/html; charset=utf-8", chunk_size=5))
+
+        self.assertEqual(text, "\u65e5\u672c\u8a9e\u306e\u30da\u30fc\u30b8")
+
+    def test_read_page_uses_configured_backend(self):
+        """Crawled pages go through the HTML_EXTRACTOR backend and honor HTML_STRIP_BOILERPLATE"""
+        body = b"<html><body><nav>Menu</nav><p>" + b"Story text. " * 50 + b"</p></body></html>"
+        backend = MagicMock(return_value=("Title", "From the backend"))
+        with patch('utils.web_crawl.get_extractor', return_value=backend):
+            title, text, _, _ = read_page(self._response(body))
+        self.assertEqual((title, text), ("Title", "From the backend"))
+        self.assertTrue(all(call[0][1] for call in backend.call_args_list))
+
+        for name in EXTRACTORS:
+            with patch('utils.html_extract.HTML_EXTRACTOR', name):
+                _, stripped, _, _ = read_page(self._response(body))
+                with patch('utils.web_crawl.HTML_STRIP_BOILERPLATE', False):
+                    _, kept, _, _ = read_page(self._response(body))
+            self.assertNotIn("Menu", stripped, name)
+            self.assertIn("Menu", kept, name)
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Local HTTP stand-in that serves a small page per path and tracks concurrency"""
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    delay = 0.0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            time.sleep(cls.delay)
+            if self.path == "/missing":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = f"<html><head><title>Page {self.path}</title></head><body><p>Body of {self.path}</p></body></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+class TestCrawlUrls(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        patcher = patch('utils.web_crawl.get_http_cache', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('utils.web_crawl.get_robots_policy', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # These tests are about concurrency limits, so the stand-in host is not rate limited
+        patcher = patch('utils.web_crawl.get_host_scheduler', return_value=HostScheduler(rate=1000, burst=100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('utils.web_crawl.get_breakers', return_value=BreakerRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        _StandInHandler.active = 0
+        _StandInHandler.peak = 0
+        _StandInHandler.delay = 0.0
+
+    def test_crawl_urls_preserves_order(self):
+        """Test that batch crawling returns one result per URL in input order"""
+        urls = [f"{self.base_url}/page{i}" for i in range(5)]
+        results = crawl_urls_sync(urls)
+
+        self.assertEqual([r["url"] for r in results], urls)
+        for i, result in enumerate(results):
+            self.assertEqual(result["status"], 200)
+            self.assertEqual(result["title"], f"Page /page{i}")
+            self.assertIn(f"Body of /page{i}", result["content"])
+
+    def test_crawl_urls_respects_per_host_limit(self):
+        """Test that requests to one host never exceed the per-host limit"""
+        _StandInHandler.delay = 0.05
+        urls = [f"{self.base_url}/slow{i}" for i in range(6)]
+        results = crawl_urls_sync(urls, max_concurrency=6, per_host_limit=2)
+
+        self.assertTrue(all(r["status"] == 200 for r in results))
+        self.assertLessEqual(_StandInHandler.peak, 2)
+
+    def test_crawl_urls_runs_concurrently(self):
+        """Test that a batch finishes faster than fetching the URLs one by one"""
+        _StandInHandler.delay = 0.2
+        urls = [f"{self.base_url}/c{i}" for i in range(4)]
+        start = time.monotonic()
+        crawl_urls_sync(urls, max_concurrency=4, per_host_limit=4)
+        elapsed = time.monotonic() - start
+
+        self.assertGreater(_StandInHandler.peak, 1)
+        self.assertLess(elapsed, 0.2 * len(urls))
+
+    def test_crawl_urls_reports_failures_per_url(self):
+        """Test that a failing URL yields an error result without affecting the others"""
+        urls = [f"{self.base_url}/ok", f"{self.base_url}/missing"]
+        results = crawl_urls_sync(urls, max_retries=1)
+
+        self.assertEqual(results[0]["status"], 200)
+        self.assertEqual(results[1]["status"], 0)
+        self.assertEqual(results[1]["title"], "Error")
+
+    def test_crawl_urls_sync_inside_running_loop(self):
+        """Test that the synchronous wrapper also works when called from a running event loop"""
+        urls = [f"{self.base_url}/loop{i}" for i in range(2)]
+
+        async def call_from_loop():
+            return crawl_urls_sync(urls)
+
+        results = asyncio.run(call_from_loop())
+        self.assertEqual([r["status"] for r in results], [200, 200])
+
+    def test_crawl_urls_deduplicates_requests(self):
+        """Test that a URL listed twice is fetched once but reported twice"""
+        url = f"{self.base_url}/dup"
+        with patch('utils.web_crawl.crawl_url', wraps=crawl_url) as mock_crawl:
+            results = crawl_urls_sync([url, url])
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(mock_crawl.call_count, 1)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -2,16 +2,31 @@ import unittest
 from unittest.mock import patch, MagicMock
 import os
 import sys
+import time
 
 # Add the project root to the path so imports work correctly
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 # Mock load_dotenv before importing the module that uses it
 with patch('utils.web_search.load_dotenv') as mock_load_dotenv:
-    from utils.web_search import search_duckduckgo, search_google
+    from utils.web_search import search_duckduckgo, search_google, normalize_query, fuse_results, search_all
+
+from utils.cache import TieredCache
+from utils.circuit_breaker import BreakerRegistry
+from nodes import MultiSearchNode
 
 class TestWebSearch(unittest.TestCase):
 
+    def setUp(self):
+        # Keep the shared search cache out of these tests
+        patcher = patch('utils.web_search.get_search_cache', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Failures in one test must not open an engine's circuit breaker for the next
+        patcher = patch('utils.web_search.get_breakers', return_value=BreakerRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch('utils.web_search.DDGS')
     def test_search_duckduckgo_success(self, mock_ddgs):
         """Test successful DuckDuckGo search"""
@@ -114,8 +129,9 @@ class TestWebSearch(unittest.TestCase):
     @patch('utils.web_search.os.getenv', side_effect=lambda key: None)
     def test_search_google_missing_credentials(self, mock_os_getenv):
         """Test Google search handling of missing API credentials"""
+        breakers = MagicMock()
         # Call the function
-        with patch('builtins.print') as mock_print:
+        with patch('builtins.print') as mock_print, patch('utils.web_search.get_breakers', return_value=breakers):
             results = search_google("test query")
 
         # Assert the function returns the expected error structure
@@ -130,5 +146,134 @@ class TestWebSearch(unittest.TestCase):
         # Verify the error was printed via debug_error and print
         mock_print.assert_called_with("Error in Google search: Missing Google API credentials. Set GOOGLE_API_KEY and GOOGLE_CSE_ID environment variables.")
 
+        # Missing configuration is not an engine failure
+        breakers.record_failure.assert_not_called()
+        breakers.allow.assert_not_called()
+
+class TestSearchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TieredCache("SearchCache", ttl=60)
+        patcher = patch('utils.web_search.get_search_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('utils.web_search.get_breakers', return_value=BreakerRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_normalize_query(self):
+        """Test that near-identical queries normalize to the same string"""
+        self.assertEqual(normalize_query("  What is PocketFlow? "), normalize_query("what is   pocketflow"))
+        self.assertEqual(normalize_query('"exact phrase" site:example.com'), '"exact phrase" site:example.com')
+
+    @patch('utils.web_search.DDGS')
+    def test_repeated_query_is_served_from_cache(self, mock_ddgs):
+        """Test that a repeated DuckDuckGo query does not hit the search engine again"""
+        mock_ddgs.return_value.text.return_value = [
+            {"title": "Cached", "href": "https://example.com", "body": "Snippet"}
+        ]
+
+        first = search_duckduckgo("What is PocketFlow?", max_results=3)
+        second = search_duckduckgo("what is pocketflow", max_results=3)
+
+        self.assertEqual(first, second)
+        mock_ddgs.return_value.text.assert_called_once()
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    @patch('utils.web_search.DDGS')
+    def test_cache_key_includes_engine_and_max_results(self, mock_ddgs):
+        """Test that different result counts are cached separately"""
+        mock_ddgs.return_value.text.return_value = []
+
+        search_duckduckgo("query", max_results=3)
+        search_duckduckgo("query", max_results=5)
+
+        self.assertEqual(mock_ddgs.return_value.text.call_count, 2)
+
+    @patch('utils.web_search.DDGS')
+    def test_errors_are_not_cached(self, mock_ddgs):
+        """Test that failed searches are retried instead of served from cache"""
+        mock_ddgs.return_value.text.side_effect = Exception("Rate limited")
+
+        with patch('builtins.print'):
+            search_duckduckgo("flaky query")
+            search_duckduckgo("flaky query")
+
+        self.assertEqual(mock_ddgs.return_value.text.call_count, 2)
+
+class TestMultiSearch(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('utils.web_search.get_breakers', return_value=BreakerRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fuse_results_ranks_and_deduplicates(self):
+        """Test reciprocal rank fusion with URL normalization and error placeholders"""
+        merged = fuse_results({
+            "duckduckgo": [
+                {"title": "A", "link": "https://example.com/a", "snippet": "short"},
+                {"title": "B", "link": "https://example.com/b", "snippet": "b"},
+                {"title": "Error performing search", "link": "", "snippet": "error"},
+            ],
+            "google": [
+                {"title": "B", "link": "https://EXAMPLE.com/b/", "snippet": "b"},
+                {"title": "A", "link": "https://example.com/a#intro", "snippet": "a longer snippet"},
+                {"title": "C", "link": "https://example.com/c", "snippet": "c"},
+            ],
+        })
+
+        self.assertEqual([r["title"] for r in merged], ["A", "B", "C"])
+        self.assertEqual(merged[0]["engines"], ["duckduckgo", "google"])
+        self.assertEqual(merged[0]["snippet"], "a longer snippet")
+        self.assertEqual(merged[2]["engines"], ["google"])
+        self.assertGreater(merged[1]["score"], merged[2]["score"])
+
+    def test_engines_run_concurrently_and_slow_engines_are_dropped(self):
+        """Test that search_all waits for the slowest engine only up to the timeout"""
+        def fast(query, max_results):
+            time.sleep(0.1)
+            return [{"title": "Fast", "link": "https://fast.example", "snippet": ""}]
+        def slow(query, max_results):
+            time.sleep(1.0)
+            return [{"title": "Slow", "link": "https://slow.example", "snippet": ""}]
+
+        with patch.dict('utils.web_search.SEARCH_ENGINES', {"duckduckgo": fast, "google": fast}):
+            started = time.time()
+            merged = search_all("query")
+            self.assertLess(time.time() - started, 0.18)
+        self.assertEqual(len(merged), 1)
+
+        with patch.dict('utils.web_search.SEARCH_ENGINES', {"duckduckgo": fast, "google": slow}):
+            merged = search_all("query", timeout=0.3)
+        self.assertEqual([r["title"] for r in merged], ["Fast"])
+
+    def test_every_engine_failing_is_an_error(self):
+        """Test that search_all raises instead of returning no results when no engine answered"""
+        def failed(query, max_results):
+            return [{"title": "Error performing search", "link": "", "snippet": "An error occurred: quota"}]
+        def broken(query, max_results):
+            raise ConnectionError("offline")
+        def empty(query, max_results):
+            return []
+
+        with patch.dict('utils.web_search.SEARCH_ENGINES', {"duckduckgo": broken, "google": failed}):
+            with self.assertRaises(RuntimeError) as raised:
+                search_all("query")
+        self.assertIn("offline", str(raised.exception))
+        self.assertIn("quota", str(raised.exception))
+
+        # An engine that answered with no results is not a failure
+        with patch.dict('utils.web_search.SEARCH_ENGINES', {"duckduckgo": broken, "google": empty}):
+            self.assertEqual(search_all("query"), [])
+
+        # The multi-search node reports the failure to the analyzer
+        shared = {"current_decision": {"next_action": "search_all", "query_or_url": "query"}}
+        with patch.dict('utils.web_search.SEARCH_ENGINES', {"duckduckgo": broken, "google": failed}):
+            MultiSearchNode().run(shared)
+        self.assertIsNone(shared["latest_tool_output"]["results"])
+        self.assertIn("Every search engine failed", shared["latest_tool_output"]["error"])
+
 if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+    unittest.main() 
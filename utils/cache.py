@@ -0,0 +1,223 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from utils.debug import debug
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with optional per-entry expiry.
+
+    None is used to signal a miss, so None values cannot be cached.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        """
+        Args:
+            max_entries: Maximum number of entries kept before evicting the least recently used
+            ttl: Default lifetime of an entry in seconds (None = no expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value for key, or None if it is missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entry if full."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """Remove key and return its value, or None if it was not cached."""
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[0] if item else None
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+class PersistentCache:
+    """
+    Key-value cache stored in SQLite, shared across processes and sessions.
+
+    Values must be JSON-serializable. Expired entries are ignored on read and
+    the least recently used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=100000):
+        """
+        Args:
+            path: Path of the SQLite database file
+            ttl: Default lifetime of an entry in seconds (None = no expiry)
+            max_entries: Maximum number of entries kept on disk
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the value for key, or None if it is missing or expired."""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key):
+        """Return (value, expires_at) for key, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value), expires_at
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entries if full."""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def items(self, prefix=""):
+        """Return (key, value) pairs of the unexpired entries whose key starts with prefix."""
+        now = time.time()
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM cache WHERE key LIKE ? ESCAPE '\\' AND (expires_at IS NULL OR expires_at > ?)",
+                (pattern, now)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def delete(self, key):
+        """Remove key from the cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+class TieredCache:
+    """
+    In-memory LRU cache in front of an optional persistent store.
+
+    Reads check memory first and promote disk hits into memory for the rest
+    of their lifetime on disk; writes go to both tiers. Hit and miss counters are kept for each tier.
+    """
+
+    def __init__(self, name, ttl=None, max_memory_entries=1024, store=None):
+        """
+        Args:
+            name: Name used in debug output
+            ttl: Lifetime of an entry in seconds (None = no expiry)
+            max_memory_entries: Size of the in-memory LRU tier
+            store: Optional PersistentCache used as the second tier
+        """
+        self.name = name
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_memory_entries, ttl=ttl)
+        self.store = store
+        self._stats_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            debug(self.name, f"Memory hit: {key}", level=3)
+            return value
+        if self.store is not None:
+            entry = self.store.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                self._count("disk_hits")
+                debug(self.name, f"Disk hit: {key}", level=3)
+                # Expire from memory when the disk copy does, not a full TTL from now
+                self.memory.set(key, value, ttl=None if expires_at is None else expires_at - time.time())
+                return value
+        self._count("misses")
+        debug(self.name, f"Miss: {key}", level=3)
+        return None
+
+    def set(self, key, value):
+        """Store value under key in every tier."""
+        self.memory.set(key, value)
+        if self.store is not None:
+            self.store.set(key, value, ttl=self.ttl)
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            Dictionary with memory_hits, disk_hits, misses, hits and hit_rate
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def _count(self, counter):
+        with self._stats_lock:
+            self._stats[counter] += 1
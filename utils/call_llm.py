@@ -1,26 +1,270 @@
 import os
+import json
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
 import google.generativeai as genai
 from dotenv import load_dotenv
 from utils.debug import debug, debug_error
+from utils.instrumentation import Span, annotate
+from utils.cache import TieredCache, PersistentCache
+from utils.json_extract import JSONExtractionError
+from utils.structured_output import response_schema_for, parse_structured
 
 # Load environment variables
 load_dotenv()
 
+# Response cache settings (empty LLM_CACHE_PATH keeps the cache in memory only)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "604800"))
+# Responses sampled at a higher temperature than this are never cached; the default covers the nodes' 0.6
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.6"))
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+# Long-lived models keyed by (model, temperature, max_tokens, response schema)
+_models = {}
+_client_configured = False
+_registry_lock = threading.Lock()
+
+# Requests currently being sent, keyed by cache key, so identical concurrent calls share one
+_inflight = {}
+_inflight_lock = threading.Lock()
+# The same for call_llm_async, holding the asyncio task sending each request
+_inflight_async = {}
+
+class _InflightCall:
+    """A request in progress that identical concurrent calls can wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = "Error: identical in-flight request failed"
+
+def get_llm_cache():
+    """
+    Return the process-wide LLM response cache, creating it on first use.
+    
+    Returns:
+        The shared TieredCache, or None if LLM_CACHE_ENABLED is "0"
+    """
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            store = None
+            if LLM_CACHE_PATH:
+                try:
+                    store = PersistentCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL)
+                except sqlite3.Error as e:
+                    debug_error("LLM", f"Could not open LLM cache at {LLM_CACHE_PATH}: {e}")
+            _llm_cache = TieredCache("LLMCache", ttl=LLM_CACHE_TTL, store=store)
+        return _llm_cache
+
+def llm_cache_key(prompt, model, temperature, max_tokens, response_schema=None):
+    """Hash a prompt and its generation settings into a cache key."""
+    settings = [model, temperature, max_tokens, prompt]
+    if response_schema is not None:
+        settings.append(response_schema_for(response_schema))
+    payload = json.dumps(settings)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 # Learn more about calling the LLM: https://the-pocket.github.io/PocketFlow/utility_function/llm.html
-def call_llm(prompt, model="gemini-2.5-flash-preview-04-17", temperature=0.6, max_tokens=4000):
+def call_llm(prompt, model="gemini-2.5-flash-preview-04-17", temperature=0.6, max_tokens=4000, use_cache=True,
+             response_schema=None, validate=None):
     """
     Call Google Gemini to process a prompt and return a response.
     
+    Responses are cached by a hash of the prompt, model, temperature and
+    max_tokens, and identical calls made while a request is in flight wait
+    for that request instead of sending their own. Only responses that
+    validate accepts are cached, so a malformed reply is not replayed.
+    
+    With response_schema, the model is constrained to emit JSON matching the
+    TypedDict and the decoded object is returned instead of text.
+    
     Args:
         prompt: The input prompt to send to the LLM
         model: The model to use (default: gemini-2.5-flash-preview-04-17)
         temperature: Controls randomness (lower = more deterministic)
         max_tokens: Maximum token limit for the response
+        use_cache: Whether to use the response cache and in-flight deduplication
+        response_schema: Optional TypedDict from utils/data_structures.py for structured output
+        validate: Optional function given the response text that raises if it must not be cached
         
     Returns:
-        The LLM's response as a string
+        The LLM's response as a string, or with response_schema the parsed
+        object (None if the call failed or the output did not match)
     """
-    debug("LLM", f"Calling model {model} with temperature {temperature}", level=2)
+    with Span("llm", model, prompt_chars=len(prompt)) as span:
+        response = _call_text(prompt, model, temperature, max_tokens, use_cache, response_schema, validate)
+        _record_response(span, response)
+        return _structured_result(response, response_schema)
+
+def _record_response(span, response):
+    """Add the response size, or the error a failed call returned, to an LLM span."""
+    span.set(response_chars=len(response))
+    if response.startswith("Error: "):
+        span.set(error=response[len("Error: "):][:200])
+
+def _usage(response):
+    """Token counts Gemini reports for a response, if any."""
+    metadata = getattr(response, "usage_metadata", None)
+    usage = {}
+    for field, name in (("prompt_token_count", "prompt_tokens"), ("candidates_token_count", "response_tokens")):
+        value = getattr(metadata, field, None)
+        if isinstance(value, int):
+            usage[name] = value
+    return usage
+
+def _cacheable(response, validate, response_schema=None):
+    """
+    Whether a response may be cached: the call did not fail and validate accepts it.
+    
+    Without validate, a structured response must at least parse as response_schema.
+    """
+    # Failed calls are reported as "Error: ..." strings
+    if response.startswith("Error: "):
+        return False
+    if validate is None and response_schema is not None:
+        validate = lambda text: parse_structured(text, response_schema, record=False)
+    if validate is None:
+        return True
+    try:
+        validate(response)
+        return True
+    except Exception as e:
+        debug("LLM", f"Not caching response that failed validation: {e}", level=2)
+        return False
+
+def _structured_result(response, response_schema):
+    """Decode a structured response for call_llm, or pass free text through."""
+    if response_schema is None:
+        return response
+    if response.startswith("Error: "):
+        return None
+    try:
+        return parse_structured(response, response_schema)
+    except JSONExtractionError as e:
+        debug_error("LLM", f"Structured response did not match {response_schema.__name__}: {e}")
+        return None
+
+def _call_text(prompt, model, temperature, max_tokens, use_cache, response_schema, validate=None):
+    """Return the response text for call_llm, going through the cache and in-flight deduplication."""
+    if not use_cache:
+        return _generate(prompt, model, temperature, max_tokens, response_schema)
+    
+    key = llm_cache_key(prompt, model, temperature, max_tokens, response_schema)
+    cache = get_llm_cache() if temperature <= LLM_CACHE_MAX_TEMPERATURE else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            debug("LLM", f"Returning cached response for model {model}", level=2)
+            annotate(cached=True)
+            return cached
+    
+    with _inflight_lock:
+        call = _inflight.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _inflight[key] = _InflightCall()
+    
+    if not is_leader:
+        debug("LLM", "Waiting for identical in-flight request", level=2)
+        annotate(deduplicated=True)
+        call.done.wait()
+        return call.result
+    
+    try:
+        call.result = _generate(prompt, model, temperature, max_tokens, response_schema)
+        if cache and _cacheable(call.result, validate, response_schema):
+            cache.set(key, call.result)
+        return call.result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+async def call_llm_async(prompt, model="gemini-2.5-flash-preview-04-17", temperature=0.6, max_tokens=4000,
+                         use_cache=True, response_schema=None, validate=None):
+    """
+    Asynchronous version of call_llm for use on an event loop.
+    
+    The request is sent with generate_content_async, so many calls can wait
+    on Gemini concurrently without a thread each. Responses share the cache
+    with call_llm, and identical calls in flight on the same event loop
+    share one request.
+    
+    Args:
+        prompt: The input prompt to send to the LLM
+        model: The model to use (default: gemini-2.5-flash-preview-04-17)
+        temperature: Controls randomness (lower = more deterministic)
+        max_tokens: Maximum token limit for the response
+        use_cache: Whether to use the response cache and in-flight deduplication
+        response_schema: Optional TypedDict from utils/data_structures.py for structured output
+        validate: Optional function given the response text that raises if it must not be cached
+        
+    Returns:
+        The same as call_llm
+    """
+    with Span("llm", model, prompt_chars=len(prompt)) as span:
+        response = await _call_text_async(prompt, model, temperature, max_tokens, use_cache, response_schema,
+                                          validate)
+        _record_response(span, response)
+        return _structured_result(response, response_schema)
+
+async def _call_text_async(prompt, model, temperature, max_tokens, use_cache, response_schema, validate=None):
+    """Return the response text for call_llm_async, going through the cache and in-flight deduplication."""
+    if not use_cache:
+        return await _generate_async(prompt, model, temperature, max_tokens, response_schema)
+    
+    key = llm_cache_key(prompt, model, temperature, max_tokens, response_schema)
+    cache = get_llm_cache() if temperature <= LLM_CACHE_MAX_TEMPERATURE else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            debug("LLM", f"Returning cached response for model {model}", level=2)
+            annotate(cached=True)
+            return cached
+    
+    task = _inflight_async.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(
+            _generate_and_cache_async(key, cache, prompt, model, temperature, max_tokens, response_schema, validate)
+        )
+        _inflight_async[key] = task
+    else:
+        debug("LLM", "Waiting for identical in-flight request", level=2)
+        annotate(deduplicated=True)
+    
+    # Shielded so a cancelled caller does not cancel the request other callers wait on
+    return await asyncio.shield(task)
+
+async def _generate_and_cache_async(key, cache, prompt, model, temperature, max_tokens, response_schema,
+                                    validate=None):
+    """Send a request for call_llm_async and cache the response unless it failed or did not validate."""
+    try:
+        response = await _generate_async(prompt, model, temperature, max_tokens, response_schema)
+        if cache and _cacheable(response, validate, response_schema):
+            cache.set(key, response)
+        return response
+    finally:
+        if _inflight_async.get(key) is asyncio.current_task():
+            del _inflight_async[key]
+
+def _configure_client():
+    """
+    Configure the Gemini client once per process. Caller holds _registry_lock.
+    
+    genai.configure() discards the underlying service clients, so calling it
+    per request would open a new connection every time.
+    """
+    global _client_configured
+    if _client_configured:
+        return
     
     # Get API key from environment variables
     api_key = os.getenv("GOOGLE_API_KEY")
@@ -32,23 +276,85 @@ def call_llm(prompt, model="gemini-2.5-flash-preview-04-17", temperature=0.6, ma
     
     # Configure the Google Generative AI client
     genai.configure(api_key=api_key)
+    _client_configured = True
+
+def get_model(model, temperature, max_tokens, response_schema=None):
+    """
+    Return the long-lived model and generation config for the given settings.
+    
+    Each model keeps its own service client once it has sent a request, so
+    reusing it avoids per-call setup and connection churn.
+    
+    Args:
+        model: The model name
+        temperature: Sampling temperature
+        max_tokens: Maximum token limit for the response
+        response_schema: Optional TypedDict the response must follow as JSON
+        
+    Returns:
+        Tuple of (GenerativeModel, GenerationConfig)
+    """
+    key = (model, temperature, max_tokens, response_schema)
+    with _registry_lock:
+        entry = _models.get(key)
+        if entry is None:
+            _configure_client()
+            debug("LLM", f"Creating client for model {model} (temperature={temperature}, max_tokens={max_tokens})", level=2)
+            structured = {}
+            if response_schema is not None:
+                structured = {
+                    "response_mime_type": "application/json",
+                    "response_schema": response_schema_for(response_schema)
+                }
+            entry = (
+                genai.GenerativeModel(model),
+                genai.GenerationConfig(
+                    temperature=temperature,
+                    max_output_tokens=max_tokens,
+                    **structured
+                )
+            )
+            _models[key] = entry
+        return entry
+
+def reset_llm_clients():
+    """Drop all registered models so the next call re-reads the API key and reconfigures the client."""
+    global _client_configured
+    with _registry_lock:
+        _models.clear()
+        _client_configured = False
+
+def _generate(prompt, model, temperature, max_tokens, response_schema=None):
+    """Send a prompt to Gemini without caching and return the response text."""
+    debug("LLM", f"Calling model {model} with temperature {temperature}", level=2)
     
     try:
-        # Create a generative model
-        model = genai.GenerativeModel(model)
+        # Reuse the registered model for these settings
+        model, generation_config = get_model(model, temperature, max_tokens, response_schema)
         
         # Generate response
         debug("LLM", "Sending request to model", level=2)
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
-            )
-        )
+        response = model.generate_content(prompt, generation_config=generation_config)
         
         # Extract and return the response text
         debug("LLM", "Received response from model", level=2)
+        annotate(**_usage(response))
+        return response.text
+        
+    except Exception as e:
+        debug_error("LLM", f"Error calling Google Gemini: {e}")
+        print(f"Error calling Google Gemini: {e}")
+        return f"Error: {str(e)}"
+    
+async def _generate_async(prompt, model, temperature, max_tokens, response_schema=None):
+    """Send a prompt to Gemini asynchronously without caching and return the response text."""
+    debug("LLM", f"Calling model {model} asynchronously with temperature {temperature}", level=2)
+    
+    try:
+        gen_model, generation_config = get_model(model, temperature, max_tokens, response_schema)
+        response = await gen_model.generate_content_async(prompt, generation_config=generation_config)
+        debug("LLM", "Received response from model", level=2)
+        annotate(**_usage(response))
         return response.text
         
     except Exception as e:
@@ -56,6 +362,73 @@ def call_llm(prompt, model="gemini-2.5-flash-preview-04-17", temperature=0.6, ma
         print(f"Error calling Google Gemini: {e}")
         return f"Error: {str(e)}"
     
+def call_llm_stream(prompt, model="gemini-2.5-flash-preview-04-17", temperature=0.6, max_tokens=4000, use_cache=True,
+                    response_schema=None, validate=None):
+    """
+    Call Google Gemini and yield the response text as it is generated.
+    
+    A cached response is yielded as a single chunk. A completed stream that
+    validate accepts is stored in the same cache as call_llm. Streams are
+    not deduplicated against in-flight calls.
+    
+    Args:
+        prompt: The input prompt to send to the LLM
+        model: The model to use (default: gemini-2.5-flash-preview-04-17)
+        temperature: Controls randomness (lower = more deterministic)
+        max_tokens: Maximum token limit for the response
+        use_cache: Whether to use the response cache
+        response_schema: Optional TypedDict the response must follow as JSON (decode it with parse_structured)
+        validate: Optional function given the full response text that raises if it must not be cached
+        
+    Yields:
+        Chunks of the LLM's response text
+    """
+    # The span is never made current: the generator is suspended between chunks
+    span = Span("llm", model, prompt_chars=len(prompt), stream=True).start()
+    chunks = []
+    try:
+        key = llm_cache_key(prompt, model, temperature, max_tokens, response_schema)
+        cache = get_llm_cache() if use_cache and temperature <= LLM_CACHE_MAX_TEMPERATURE else None
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                debug("LLM", f"Returning cached response for model {model}", level=2)
+                span.set(cached=True)
+                chunks.append(cached)
+                yield cached
+                return
+        
+        debug("LLM", f"Streaming from model {model} with temperature {temperature}", level=2)
+        try:
+            gen_model, generation_config = get_model(model, temperature, max_tokens, response_schema)
+            response = gen_model.generate_content(prompt, generation_config=generation_config, stream=True)
+            for chunk in response:
+                span.set(**_usage(chunk))
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks carrying only metadata (e.g. the finish reason) have no text
+                    continue
+                if text:
+                    if not chunks:
+                        span.set(first_chunk=round(time.perf_counter() - span.clock, 6))
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            debug_error("LLM", f"Error streaming from Google Gemini: {e}")
+            print(f"Error calling Google Gemini: {e}")
+            span.set(error=str(e)[:200])
+            if not chunks:
+                yield f"Error: {str(e)}"
+            return
+        
+        debug("LLM", f"Stream complete ({len(chunks)} chunks)", level=2)
+        if cache and chunks and _cacheable("".join(chunks), validate, response_schema):
+            cache.set(key, "".join(chunks))
+    finally:
+        span.set(response_chars=sum(len(chunk) for chunk in chunks))
+        span.finish()
+
 if __name__ == "__main__":
     # Test the function
     test_prompt = "What is the meaning of life? Answer in one sentence."
@@ -0,0 +1,251 @@
+import os
+import copy
+import pickle
+import struct
+import hashlib
+from pocketflow import Flow
+from utils.debug import debug, debug_error
+
+# Where interactive sessions are checkpointed; off unless set here or with main.py --checkpoint,
+# which without a path uses DEFAULT_CHECKPOINT_PATH in the user's home directory
+CHECKPOINT_PATH = os.path.expanduser(os.getenv("CHECKPOINT_PATH", ""))
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pocketflow-research", "session.ckpt")
+
+# Each record is a little-endian length followed by that many bytes of pickle
+_LENGTH = struct.Struct("<I")
+
+def reachable_nodes(start):
+    """Nodes reachable from start over successors, in breadth-first order."""
+    nodes = []
+    seen = set()
+    queue = [start]
+    while queue:
+        node = queue.pop(0)
+        if node is None or id(node) in seen:
+            continue
+        seen.add(id(node))
+        nodes.append(node)
+        queue.extend(node.successors.values())
+    return nodes
+
+def node_ids(start):
+    """
+    Give every node reachable from start a stable name.
+
+    Nodes are named after their class, numbered when a class appears more
+    than once, in breadth-first order over successors. Building the same
+    flow again yields the same names, so a checkpoint written by one process
+    can be resumed by another.
+
+    Args:
+        start: The flow's start node
+
+    Returns:
+        Dictionary mapping id(node) to its name
+    """
+    names = {}
+    counts = {}
+    for node in reachable_nodes(start):
+        name = type(node).__name__
+        counts[name] = counts.get(name, 0) + 1
+        names[id(node)] = name if counts[name] == 1 else f"{name}#{counts[name]}"
+    return names
+
+class CheckpointWriter:
+    """
+    Append-only checkpoint file for a shared store.
+
+    Every record holds only the top-level keys of the shared store that
+    changed since the previous record. Values with a revision counter
+    (VisitedIndex, KnowledgeStore) are only pickled when it moved; other
+    values are pickled and compared by digest, which is cheap for the small
+    dictionaries and lists the nodes keep.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: The checkpoint file; it is replaced by a new session
+        """
+        self.path = path
+        self._seen = {}  # key -> digest of its pickle, or (value, revision) for revisioned stores
+        self._step = 0
+
+    def start(self, shared, params):
+        """Begin a new checkpoint file holding the initial state and the flow's params."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "wb"):
+            pass
+        self._seen = {}
+        self._step = 0
+        self._append({"params": params, **self._diff(shared)})
+
+    def continue_from(self, shared, step):
+        """Keep appending to an existing file after resuming from it."""
+        self._seen = {}
+        self._diff(shared)
+        self._step = step
+
+    def write(self, shared, node, action, next_node):
+        """
+        Record the state after a node finished.
+
+        Args:
+            shared: The shared store
+            node: Name of the node that just completed
+            action: The action it returned
+            next_node: Name of the node the flow continues with, or None when it ends
+        """
+        self._step += 1
+        self._append({"step": self._step, "node": node, "action": action, "next": next_node, **self._diff(shared)})
+
+    def _diff(self, shared):
+        changed = {}
+        for key, value in shared.items():
+            revision = getattr(value, "revision", None)
+            if revision is not None:
+                seen = self._seen.get(key)
+                if isinstance(seen, tuple) and seen[0] is value and seen[1] == revision:
+                    continue
+            try:
+                data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                debug_error("Checkpoint", f"Cannot checkpoint shared['{key}']: {e}")
+                continue
+            if revision is not None:
+                self._seen[key] = (value, revision)
+                changed[key] = data
+                continue
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            if self._seen.get(key) != digest:
+                self._seen[key] = digest
+                changed[key] = data
+        removed = [key for key in self._seen if key not in shared]
+        for key in removed:
+            del self._seen[key]
+        return {"changed": changed, "removed": removed}
+
+    def _append(self, record):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.path, "ab") as f:
+            f.write(_LENGTH.pack(len(payload)) + payload)
+            f.flush()
+        debug("Checkpoint", f"Wrote step {self._step} ({len(record['changed'])} changed keys, {len(payload)} bytes)", level=3)
+
+def load_checkpoint(path):
+    """
+    Rebuild the latest state from a checkpoint file.
+
+    A record cut short by a crash while it was written is ignored.
+
+    Args:
+        path: The checkpoint file
+
+    Returns:
+        Dictionary with shared, params, step, node (last completed node),
+        action and next (node to continue with, None if the flow ended),
+        or None if there is no usable checkpoint
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+
+    state = None
+    offset = 0
+    while offset + _LENGTH.size <= len(data):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        payload = data[offset + _LENGTH.size:offset + _LENGTH.size + length]
+        if len(payload) < length:
+            debug_error("Checkpoint", f"Ignoring incomplete record at byte {offset} of {path}")
+            break
+        try:
+            record = pickle.loads(payload)
+            changed = {key: pickle.loads(value) for key, value in record["changed"].items()}
+        except Exception as e:
+            debug_error("Checkpoint", f"Ignoring unreadable record at byte {offset} of {path}: {e}")
+            break
+        offset += _LENGTH.size + length
+
+        if state is None:
+            state = {"shared": {}, "params": record.get("params", {}), "step": 0,
+                     "node": None, "action": None, "next": None}
+        state["shared"].update(changed)
+        for key in record["removed"]:
+            state["shared"].pop(key, None)
+        if "step" in record:
+            state.update(step=record["step"], node=record["node"], action=record["action"], next=record["next"])
+    return state
+
+class CheckpointedFlow(Flow):
+    """
+    Flow that checkpoints the shared store after every node and can resume.
+
+    run() starts a new checkpoint file; resume() rebuilds the shared store
+    from the file and continues with the node that was about to run when the
+    previous process stopped.
+    """
+
+    def __init__(self, start=None, path=None):
+        """
+        Args:
+            start: The start node
+            path: The checkpoint file (default: CHECKPOINT_PATH, or DEFAULT_CHECKPOINT_PATH if that is unset)
+        """
+        super().__init__(start=start)
+        self.path = path or CHECKPOINT_PATH or DEFAULT_CHECKPOINT_PATH
+        self._writer = CheckpointWriter(self.path)
+        self._resume_from = None
+
+    def _orch(self, shared, params=None):
+        names = node_ids(self.start_node)
+        nodes = {names[id(node)]: node for node in reachable_nodes(self.start_node)}
+
+        p = params or {**self.params}
+        if self._resume_from is None:
+            self._writer.start(shared, p)
+            original = self.start_node
+        else:
+            original = nodes[self._resume_from]
+            self._resume_from = None
+
+        # Walk the original nodes (not the copies that run) so each step can be named
+        last_action = None
+        while original:
+            curr = copy.copy(original)
+            curr.set_params(p)
+            last_action = curr._run(shared)
+            following = self.get_next_node(curr, last_action)
+            self._writer.write(shared, names[id(original)], last_action,
+                               names.get(id(following)) if following else None)
+            original = following
+        return last_action
+
+    def resume(self, shared=None):
+        """
+        Continue the session saved in the checkpoint file.
+
+        Args:
+            shared: Dictionary to restore the shared store into (default: a new one)
+
+        Returns:
+            The restored and updated shared store, or None if there is nothing to resume
+        """
+        state = load_checkpoint(self.path)
+        if state is None or state["next"] is None:
+            debug("Checkpoint", f"No unfinished session in {self.path}")
+            return None
+        if state["next"] not in node_ids(self.start_node).values():
+            debug_error("Checkpoint", f"Checkpoint continues with unknown node {state['next']}")
+            return None
+
+        shared = {} if shared is None else shared
+        shared.update(state["shared"])
+        debug("Checkpoint", f"Resuming after step {state['step']} ({state['node']} -> {state['next']})")
+        self._writer.continue_from(shared, state["step"])
+        self._resume_from = state["next"]
+        self.set_params({**state["params"], **self.params})
+        self._run(shared)
+        return shared
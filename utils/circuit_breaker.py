@@ -0,0 +1,232 @@
+import os
+import time
+import sqlite3
+import threading
+from utils.debug import debug, debug_error
+from utils.cache import PersistentCache
+
+# Consecutive failures that open a breaker, seconds it stays open before a probe is let through
+# (doubling after each failed probe, up to the maximum), and probes allowed at once while half-open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "60"))
+BREAKER_MAX_RESET_TIMEOUT = float(os.getenv("BREAKER_MAX_RESET_TIMEOUT", "1800"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+
+# Where open breakers are remembered between sessions (empty for this process only), and for how long
+BREAKER_STATE_PATH = os.getenv("BREAKER_STATE_PATH", ".cache/breakers.sqlite")
+BREAKER_MEMORY_TTL = int(os.getenv("BREAKER_MEMORY_TTL", "86400"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Failure memory for one host or search engine.
+
+    Closed, it lets every request through and counts consecutive failures.
+    After failure_threshold of them it opens and rejects requests until
+    reset_timeout has passed; then it is half-open and lets a limited number
+    of probe requests through. A successful probe closes it, a failed one
+    opens it again for twice as long.
+    """
+
+    def __init__(self, key, failure_threshold=None, reset_timeout=None, half_open_probes=None):
+        """
+        Args:
+            key: The host or "search:<engine>" the breaker guards
+            failure_threshold: Consecutive failures that open the breaker (default: BREAKER_FAILURE_THRESHOLD)
+            reset_timeout: Seconds open before probing (default: BREAKER_RESET_TIMEOUT)
+            half_open_probes: Probes allowed at once while half-open (default: BREAKER_HALF_OPEN_PROBES)
+        """
+        self.key = key
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.base_timeout = reset_timeout or BREAKER_RESET_TIMEOUT
+        self.half_open_probes = half_open_probes or BREAKER_HALF_OPEN_PROBES
+        self.state = CLOSED
+        self.failures = 0
+        self.timeout = self.base_timeout
+        self.opened_at = 0.0
+        self._probes = 0
+
+    def retry_in(self, now=None):
+        """Seconds until an open breaker lets a probe through (0 unless open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.timeout - (time.time() if now is None else now))
+
+    def allow(self):
+        """Return whether a request may be sent now, admitting it as a probe when half-open."""
+        if self.state == OPEN:
+            if self.retry_in() > 0:
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+            debug("CircuitBreaker", f"{self.key} is half-open, probing")
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                return False
+            self._probes += 1
+        return True
+
+    def release(self):
+        """Give back a probe that ended without a success or failure to record (e.g. a 404)."""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_success(self):
+        """Close the breaker. Returns True if it was not closed before."""
+        changed = self.state != CLOSED
+        self.state = CLOSED
+        self.failures = 0
+        self.timeout = self.base_timeout
+        return changed
+
+    def record_failure(self):
+        """Count a failure, opening the breaker if needed. Returns True if it opened."""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # The probe failed: stay away twice as long
+            self.timeout = min(BREAKER_MAX_RESET_TIMEOUT, self.timeout * 2)
+        elif self.state == OPEN or self.failures < self.failure_threshold:
+            return False
+        self.state = OPEN
+        self.opened_at = time.time()
+        return True
+
+    def to_dict(self):
+        return {"failures": self.failures, "timeout": self.timeout, "opened_at": self.opened_at}
+
+class BreakerRegistry:
+    """
+    Circuit breakers keyed by host and by search engine, shared by all sessions of a process.
+
+    Open breakers are also written to an optional PersistentCache, so a
+    new session starts out avoiding hosts the previous one found dead and
+    only probes them once their timeout has passed.
+    """
+
+    def __init__(self, store=None, **breaker_settings):
+        """
+        Args:
+            store: Optional PersistentCache remembering open breakers across sessions
+            **breaker_settings: failure_threshold, reset_timeout and half_open_probes for new breakers
+        """
+        self.store = store
+        self.breaker_settings = breaker_settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._stats = {"rejected": 0, "opened": 0, "closed": 0}
+        if store is not None:
+            self._load()
+
+    def _get(self, key):
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(key, **self.breaker_settings)
+        return breaker
+
+    def _load(self):
+        """Restore the breakers an earlier session left open."""
+        try:
+            saved = self.store.items("breaker|")
+        except sqlite3.Error as e:
+            debug_error("CircuitBreaker", f"Could not load breaker state: {e}")
+            return
+        for name, state in saved:
+            breaker = self._get(name[len("breaker|"):])
+            breaker.state = OPEN
+            breaker.failures = state["failures"]
+            breaker.timeout = state["timeout"]
+            breaker.opened_at = state["opened_at"]
+        if saved:
+            debug("CircuitBreaker", f"Remembered {len(saved)} failing targets from earlier sessions", level=2)
+
+    def _save(self, breaker):
+        if self.store is None:
+            return
+        try:
+            if breaker.state == CLOSED:
+                self.store.delete(f"breaker|{breaker.key}")
+            else:
+                self.store.set(f"breaker|{breaker.key}", breaker.to_dict(), ttl=BREAKER_MEMORY_TTL)
+        except sqlite3.Error as e:
+            debug_error("CircuitBreaker", f"Could not save breaker state for {breaker.key}: {e}")
+
+    def allow(self, key):
+        """
+        Return whether a request to key may be sent now.
+
+        Args:
+            key: A host or "search:<engine>"
+        """
+        with self._lock:
+            allowed = self._get(key).allow()
+            if not allowed:
+                self._stats["rejected"] += 1
+        if not allowed:
+            debug("CircuitBreaker", f"Skipping {key}: circuit open", level=2)
+        return allowed
+
+    def release(self, key):
+        """Record that a request allowed to key ended with neither a success nor a failure."""
+        with self._lock:
+            self._get(key).release()
+
+    def record_success(self, key):
+        """Record a successful request to key."""
+        with self._lock:
+            breaker = self._get(key)
+            closed = breaker.record_success()
+            if closed:
+                self._stats["closed"] += 1
+                self._save(breaker)
+        if closed:
+            debug("CircuitBreaker", f"{key} recovered, circuit closed")
+
+    def record_failure(self, key):
+        """Record a failed request to key (a timeout, connection error, server error or 429)."""
+        with self._lock:
+            breaker = self._get(key)
+            opened = breaker.record_failure()
+            if opened:
+                self._stats["opened"] += 1
+                self._save(breaker)
+        if opened:
+            debug_error("CircuitBreaker", f"{key} failed {breaker.failures} times, circuit open for {breaker.timeout:.0f}s")
+
+    def open_breakers(self):
+        """
+        Return the targets currently being avoided.
+
+        Returns:
+            List of dictionaries with target, failures and retry_in (seconds), soonest retry first
+        """
+        with self._lock:
+            now = time.time()
+            targets = [{"target": key, "failures": breaker.failures, "retry_in": round(breaker.retry_in(now))}
+                       for key, breaker in self._breakers.items()
+                       if breaker.state == OPEN and breaker.retry_in(now) > 0]
+        return sorted(targets, key=lambda target: target["retry_in"])
+
+    def stats(self):
+        """Return the rejected, opened and closed counters."""
+        with self._lock:
+            return dict(self._stats)
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_breakers():
+    """Return the process-wide BreakerRegistry, creating it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            store = None
+            if BREAKER_STATE_PATH:
+                try:
+                    store = PersistentCache(BREAKER_STATE_PATH, ttl=BREAKER_MEMORY_TTL)
+                except sqlite3.Error as e:
+                    debug_error("CircuitBreaker", f"Could not open breaker state at {BREAKER_STATE_PATH}: {e}")
+            _registry = BreakerRegistry(store=store)
+        return _registry
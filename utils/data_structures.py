@@ -1,15 +1,15 @@
-from typing import TypedDict, List, Dict, Any, Optional
+from typing import TypedDict, List, Dict, Any, Optional, Union
 
 class Decision(TypedDict):
-    next_action: str # e.g., "search_duckduckgo", "crawl_url", "send_to_hitl"
-    query_or_url: Optional[str]
+    next_action: str # e.g., "search_duckduckgo", "search_all", "crawl_url", "crawl_urls", "send_to_hitl"
+    query_or_url: Optional[Union[str, List[str]]] # List of URLs for "crawl_urls"
     reasoning: str
 
 class ToolOutput(TypedDict):
-    tool: str # e.g., "duckduckgo_search", "google_search", "web_crawl"
+    tool: str # e.g., "duckduckgo_search", "google_search", "multi_search", "web_crawl"
     query: Optional[str] # Query used for search tools
     url: Optional[str] # URL used for crawl tool
-    results: Optional[List[Dict[str, Any]]] # Results from search tools
+    results: Optional[List[Dict[str, Any]]] # Results from search tools, or one page per URL for multi-URL crawls
     content: Optional[Dict[str, Any]] # Results from crawl tool
 
 class AnalyzerReport(TypedDict):
@@ -18,4 +18,10 @@ class AnalyzerReport(TypedDict):
     confidence_score: float
     suggestions_for_next_step: List[str]
     new_potential_urls: List[str]
-    inconsistencies_found: Optional[str] 
\ No newline at end of file
+    inconsistencies_found: Optional[str] 
+
+
+class HITLOutput(TypedDict):
+    final_answer: str
+    research_summary: str
+    key_sources: List[str]
@@ -0,0 +1,141 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.debug import debug, debug_error
+
+# Worker processes that parse crawled pages (0 parses in the crawling thread),
+# jobs that may wait for a worker before callers block, and pages a worker
+# parses before it is replaced to return the memory the parsers held
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0"))
+EXTRACT_MAX_PENDING = int(os.getenv("EXTRACT_MAX_PENDING", "0"))
+EXTRACT_MAX_TASKS_PER_CHILD = int(os.getenv("EXTRACT_MAX_TASKS_PER_CHILD", "200"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+class ExtractionPool:
+    """
+    Process pool for CPU-bound page parsing.
+
+    Parsing in worker processes lets crawls running in many threads use
+    every core instead of taking turns on the GIL. At most max_pending jobs
+    are queued or running at once; further submissions block until one
+    finishes, so a burst of downloads cannot pile up unparsed pages in
+    memory. Workers are replaced after max_tasks_per_child jobs.
+    """
+
+    def __init__(self, workers=None, max_pending=None, max_tasks_per_child=None):
+        """
+        Args:
+            workers: Number of worker processes (default: EXTRACT_WORKERS, or the CPU count if that is 0)
+            max_pending: Jobs queued or running before submit blocks (default: EXTRACT_MAX_PENDING, or 4 per worker)
+            max_tasks_per_child: Jobs per worker before it is replaced (default: EXTRACT_MAX_TASKS_PER_CHILD)
+        """
+        self.workers = workers or EXTRACT_WORKERS or os.cpu_count() or 1
+        self.max_pending = max_pending or EXTRACT_MAX_PENDING or self.workers * 4
+        self.max_tasks_per_child = max_tasks_per_child or EXTRACT_MAX_TASKS_PER_CHILD
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "blocked": 0, "restarts": 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                debug("ExtractPool", f"Starting {self.workers} extraction workers "
+                                     f"(max {self.max_pending} pending, {self.max_tasks_per_child} pages per worker)", level=2)
+                # Workers must be spawned: replacing them after max_tasks_per_child is not supported with fork
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"),
+                                                     max_tasks_per_child=self.max_tasks_per_child)
+            return self._executor
+
+    def _restart(self, executor):
+        """Drop an executor whose worker died so the next job starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._stats["restarts"] += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args):
+        """
+        Queue fn(*args) in a worker process, blocking while max_pending jobs are outstanding.
+
+        Args:
+            fn: A module-level (picklable) function
+            *args: Picklable arguments
+
+        Returns:
+            A concurrent.futures.Future for the result
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["blocked"] += 1
+            self._slots.acquire()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["submitted"] += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        self._slots.release()
+        with self._lock:
+            self._stats["failed" if future.cancelled() or future.exception() else "completed"] += 1
+
+    def run(self, fn, *args, timeout=None):
+        """
+        Run fn(*args) in a worker process and return its result.
+
+        Raises:
+            Whatever fn raised, TimeoutError, or BrokenProcessPool if the
+            worker died (the pool is restarted for the next job)
+        """
+        executor = self._get_executor()
+        try:
+            return self.submit(fn, *args).result(timeout=timeout)
+        except BrokenProcessPool:
+            debug_error("ExtractPool", "An extraction worker died, restarting the pool")
+            self._restart(executor)
+            raise
+
+    def stats(self):
+        """Return a copy of the job counters."""
+        with self._lock:
+            return dict(self._stats)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+def get_extract_pool():
+    """
+    Return the process-wide extraction pool, creating it on first use.
+
+    Returns:
+        The shared ExtractionPool, or None if EXTRACT_WORKERS is 0
+    """
+    global _pool
+    if EXTRACT_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool()
+        return _pool
+
+def shutdown_extract_pool():
+    """Stop the process-wide extraction pool's workers."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,206 @@
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from utils.debug import debug
+
+# Requests per second and burst size allowed per host
+CRAWL_HOST_RATE = float(os.getenv("CRAWL_HOST_RATE", "2.0"))
+CRAWL_HOST_BURST = int(os.getenv("CRAWL_HOST_BURST", "4"))
+
+# Exponential backoff after failures and throttling responses: first delay and ceiling in seconds
+CRAWL_BACKOFF_BASE = float(os.getenv("CRAWL_BACKOFF_BASE", "1.0"))
+CRAWL_BACKOFF_MAX = float(os.getenv("CRAWL_BACKOFF_MAX", "60.0"))
+
+# Longest a request waits for its host; a host that asks for more is given up on
+CRAWL_MAX_WAIT = float(os.getenv("CRAWL_MAX_WAIT", "30.0"))
+
+# Responses meaning the host wants fewer requests; both may carry Retry-After
+THROTTLE_STATUSES = frozenset({429, 503})
+
+def parse_retry_after(value, now=None):
+    """
+    Parse a Retry-After header.
+
+    Args:
+        value: The header value, either seconds or an HTTP date
+        now: Current Unix time (default: time.time())
+
+    Returns:
+        Seconds to wait (at least 0), or None if the value is missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+class _HostState:
+    """Token bucket and backoff state of one host."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()  # Time self.tokens refers to; later than now while tokens are reserved
+        self.blocked_until = 0.0
+        self.failures = 0
+
+class HostScheduler:
+    """
+    Per-host rate limiter for crawling.
+
+    Each host has its own token bucket, so requests to different hosts never
+    wait on each other and a fast host is only limited by its rate. After a
+    failure, a 5xx or a 429/503 response the host is paused: for as long as
+    Retry-After asks, or for an exponentially growing, jittered backoff.
+    Waiting happens outside the lock, in the calling thread.
+    """
+
+    def __init__(self, rate=None, burst=None, backoff_base=None, backoff_max=None):
+        """
+        Args:
+            rate: Requests per second per host (default: CRAWL_HOST_RATE)
+            burst: Requests a host can receive at once after being idle (default: CRAWL_HOST_BURST)
+            backoff_base: First backoff delay in seconds (default: CRAWL_BACKOFF_BASE)
+            backoff_max: Longest backoff delay in seconds (default: CRAWL_BACKOFF_MAX)
+        """
+        self.rate = rate or CRAWL_HOST_RATE
+        self.burst = burst or CRAWL_HOST_BURST
+        self.backoff_base = CRAWL_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = CRAWL_BACKOFF_MAX if backoff_max is None else backoff_max
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "delayed": 0, "waited": 0.0, "throttled": 0, "backoffs": 0, "gave_up": 0}
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.rate, self.burst)
+        return state
+
+    def set_min_interval(self, host, seconds):
+        """
+        Space requests to a host at least this many seconds apart (e.g. a robots.txt Crawl-delay).
+
+        Args:
+            host: The host
+            seconds: Minimum interval; 0 restores the default rate
+        """
+        with self._lock:
+            state = self._host(host)
+            if seconds and seconds > 0:
+                state.rate = min(self.rate, 1.0 / seconds)
+                state.burst = 1
+            else:
+                state.rate, state.burst = self.rate, self.burst
+            state.tokens = min(state.tokens, state.burst)
+
+    def backoff(self, failures):
+        """Delay after the given number of consecutive failures: exponential, capped, with equal jitter."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(0, failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reserve(self, host, max_wait=None):
+        """
+        Reserve the next request slot for a host without waiting.
+
+        Args:
+            host: The host to send a request to
+            max_wait: Longest acceptable wait in seconds (default: CRAWL_MAX_WAIT)
+
+        Returns:
+            Seconds until the request may be sent, or None if that is longer
+            than max_wait (nothing is reserved then)
+        """
+        max_wait = CRAWL_MAX_WAIT if max_wait is None else max_wait
+        with self._lock:
+            state = self._host(host)
+            now = time.monotonic()
+            start = max(now, state.blocked_until, state.updated)
+            tokens = min(state.burst, state.tokens + (start - state.updated) * state.rate)
+            ready = start if tokens >= 1 else start + (1 - tokens) / state.rate
+            delay = ready - now
+            if delay > max_wait:
+                self._stats["gave_up"] += 1
+                return None
+            state.tokens = min(state.burst, tokens + (ready - start) * state.rate) - 1
+            state.updated = ready
+            self._stats["requests"] += 1
+            if delay > 0:
+                self._stats["delayed"] += 1
+                self._stats["waited"] += delay
+            return delay
+
+    def acquire(self, host, max_wait=None):
+        """
+        Wait until a request may be sent to a host.
+
+        Args:
+            host: The host to send a request to
+            max_wait: Longest acceptable wait in seconds (default: CRAWL_MAX_WAIT)
+
+        Returns:
+            Seconds waited, or None without waiting if the host is paused for longer than max_wait
+        """
+        delay = self.reserve(host, max_wait)
+        if delay:
+            debug("HostScheduler", f"Waiting {delay:.2f}s before requesting {host}", level=2)
+            time.sleep(delay)
+        return delay
+
+    def record_response(self, host, status, retry_after=None):
+        """
+        Update a host's state from a response.
+
+        Args:
+            host: The host that answered
+            status: The HTTP status code
+            retry_after: The Retry-After header, if any
+        """
+        with self._lock:
+            state = self._host(host)
+            if status in THROTTLE_STATUSES or status >= 500:
+                state.failures += 1
+                wait = parse_retry_after(retry_after) if status in THROTTLE_STATUSES else None
+                if wait is None:
+                    wait = self.backoff(state.failures)
+                    self._stats["backoffs"] += 1
+                if status in THROTTLE_STATUSES:
+                    self._stats["throttled"] += 1
+                state.blocked_until = max(state.blocked_until, time.monotonic() + wait)
+                debug("HostScheduler", f"{host} answered {status}, pausing it for {wait:.1f}s", level=2)
+            else:
+                state.failures = 0
+
+    def record_failure(self, host):
+        """Pause a host after a connection error or timeout, backing off further with each consecutive one."""
+        with self._lock:
+            state = self._host(host)
+            state.failures += 1
+            wait = self.backoff(state.failures)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + wait)
+            self._stats["backoffs"] += 1
+        debug("HostScheduler", f"Request to {host} failed, pausing it for {wait:.1f}s", level=2)
+
+    def stats(self):
+        """Return a copy of the scheduler counters (waited is in seconds)."""
+        with self._lock:
+            return dict(self._stats)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_host_scheduler():
+    """Return the process-wide HostScheduler, creating it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = HostScheduler()
+        return _scheduler
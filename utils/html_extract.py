@@ -0,0 +1,330 @@
+import os
+import re
+from html.parser import HTMLParser
+from utils.debug import debug
+
+# Optional fast parsers, used when installed
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+except ImportError:
+    lxml = None
+
+# Backend used by extract_text ("auto" picks the fastest one installed) and whether to drop boilerplate
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "auto")
+HTML_STRIP_BOILERPLATE = os.getenv("HTML_STRIP_BOILERPLATE", "1") != "0"
+
+# Elements whose content is never text
+NON_TEXT_TAGS = frozenset({"script", "style", "noscript", "template", "svg", "iframe", "object", "canvas"})
+# Page furniture dropped when stripping boilerplate
+BOILERPLATE_TAGS = NON_TEXT_TAGS | {"nav", "footer", "aside", "form", "button", "select"}
+BOILERPLATE_ROLES = frozenset({"navigation", "banner", "contentinfo", "complementary", "search", "dialog"})
+# Whole class/id tokens marking navigation, ads, cookie banners, share widgets and the like: a
+# furniture word, optionally after a site-wide prefix and before another such word or a widget suffix,
+# so "nav", "site-footer", "ad-slot" and "cookie_consent" match but "has-sidebar" and "menu-open" do not
+_BOILERPLATE_WORDS = (r"(?:nav|navbar|navigation|menu|footer|sidebar|breadcrumbs?|cookies?|consent|banner|ads?|"
+                      r"advert\w*|sponsored|promo|newsletter|subscribe|social|share|sharing|related|comments?|"
+                      r"popup|modal|masthead)")
+BOILERPLATE_TOKEN = re.compile(
+    rf"(?:(?:site|main|top|global|primary|page)[-_])?{_BOILERPLATE_WORDS}"
+    rf"(?:[-_](?:{_BOILERPLATE_WORDS}|bar|slot|container|wrapper|links|buttons|list|area|widget|box|block|posts))?",
+    re.IGNORECASE
+)
+# Elements that hold the page content and are never dropped as boilerplate, whatever their attributes;
+# neither is any element containing a <main> or <article>
+CONTENT_TAGS = frozenset({"html", "body", "main", "article"})
+
+# Elements that start a new line of text
+BLOCK_TAGS = frozenset({
+    "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "figure", "h1", "h2",
+    "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "ol", "p", "pre", "section", "table", "td", "th",
+    "tr", "ul"
+})
+# Inline elements unwrapped before selectolax extracts text, so they stay on their line
+INLINE_TAGS = ["a", "abbr", "b", "cite", "code", "em", "font", "i", "kbd", "mark", "q", "s", "small", "span",
+               "strong", "sub", "sup", "time", "u"]
+VOID_TAGS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source",
+                       "track", "wbr"})
+
+# A <main> or <article> with less text than this is not trusted as the main content
+MIN_MAIN_CONTENT_CHARS = 200
+
+def clean_text(text):
+    """
+    Normalize extracted text the way the crawler always has.
+
+    Args:
+        text: Raw text with block boundaries as newlines
+
+    Returns:
+        Non-empty stripped lines (runs of two spaces also split lines), joined by newlines
+    """
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return "\n".join(chunk for chunk in chunks if chunk)
+
+def is_boilerplate(attrs):
+    """
+    Check whether an element's attributes mark it as page furniture.
+
+    Args:
+        attrs: Mapping of attribute names to values
+
+    Returns:
+        True for navigation/banner roles and for class or id tokens like "nav", "ad-slot" or
+        "cookie-banner"; tokens merely containing such a word ("has-sidebar") do not count
+    """
+    if (attrs.get("role") or "").lower() in BOILERPLATE_ROLES:
+        return True
+    for name in ("class", "id"):
+        value = attrs.get(name)
+        if value and any(BOILERPLATE_TOKEN.fullmatch(token) for token in value.split()):
+            return True
+    return False
+
+def _clean_title(title):
+    """Collapse whitespace in a page title; an empty title becomes None."""
+    return " ".join(title.split()) or None
+
+def _pick_content(body, main, articles):
+    """Prefer the cleaned <main> text, then the longest <article>, then the whole body."""
+    if main and len(main) >= MIN_MAIN_CONTENT_CHARS:
+        return main
+    longest = max(articles, key=len, default="")
+    if len(longest) >= MIN_MAIN_CONTENT_CHARS:
+        return longest
+    return body
+
+class StreamingTextExtractor(HTMLParser):
+    """
+    Extract the title and readable text from HTML fed in chunks.
+
+    Built on the standard library parser, so it works without optional
+    dependencies and can process a download as it arrives. Skipped elements
+    are never buffered.
+    """
+
+    def __init__(self, strip_boilerplate=True):
+        """
+        Args:
+            strip_boilerplate: Whether to drop navigation, footers, ads and similar elements
+        """
+        super().__init__(convert_charrefs=True)
+        self.strip_boilerplate = strip_boilerplate
+        self.chars = 0  # Characters of text kept so far
+        self._skip_tags = BOILERPLATE_TAGS if strip_boilerplate else NON_TEXT_TAGS
+        self._stack = []
+        self._skip_at = None  # Stack depth of the element being skipped
+        self._skip_by_attrs = False  # Whether it is skipped for its class/id/role rather than its tag
+        self._in_title = False
+        self._title = []
+        self._body = []
+        self._main = None
+        self._main_at = None
+        self._articles = []
+        self._article_at = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag in BLOCK_TAGS:
+                self._emit("\n")
+            return
+        self._stack.append(tag)
+        depth = len(self._stack)
+        if self._skip_at is None and tag in self._skip_tags:
+            self._skip_at = depth
+            self._skip_by_attrs = False
+        elif self._skip_at is None and (self.strip_boilerplate and attrs and tag not in CONTENT_TAGS
+                                        and is_boilerplate(dict(attrs))):
+            self._skip_at = depth
+            self._skip_by_attrs = True
+        elif tag in ("main", "article") and self._skip_at is not None and self._skip_by_attrs:
+            # A wrapper whose class looked like furniture holds the content after all
+            self._skip_at = None
+        if tag == "title":
+            self._in_title = True
+        elif tag == "main" and self._main is None:
+            self._main = []
+            self._main_at = depth
+        elif tag == "article" and self._article_at is None:
+            self._articles.append([])
+            self._article_at = depth
+        if tag in BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_endtag(self, tag):
+        if tag not in self._stack:
+            return
+        # Close the element and anything left open inside it
+        while self._stack:
+            depth = len(self._stack)
+            open_tag = self._stack.pop()
+            if open_tag in BLOCK_TAGS:
+                self._emit("\n")
+            if depth == self._skip_at:
+                self._skip_at = None
+            if depth == self._main_at:
+                self._main_at = None
+            if depth == self._article_at:
+                self._article_at = None
+            if open_tag == "title":
+                self._in_title = False
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title.append(data)
+        else:
+            self._emit(data)
+
+    def _emit(self, text):
+        if self._skip_at is not None:
+            return
+        self._body.append(text)
+        self.chars += len(text)
+        if self._main_at is not None:
+            self._main.append(text)
+        if self._article_at is not None:
+            self._articles[-1].append(text)
+
+    def result(self):
+        """
+        Return what has been extracted so far.
+
+        Returns:
+            Tuple of (title or None, cleaned text)
+        """
+        title = _clean_title("".join(self._title))
+        body = clean_text("".join(self._body))
+        if not self.strip_boilerplate:
+            return title, body
+        main = clean_text("".join(self._main)) if self._main else ""
+        articles = [clean_text("".join(parts)) for parts in self._articles]
+        return title, _pick_content(body, main, articles)
+
+def _extract_stdlib(html, strip_boilerplate):
+    extractor = StreamingTextExtractor(strip_boilerplate=strip_boilerplate)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.result()
+
+def _extract_lxml(html, strip_boilerplate):
+    try:
+        parser = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True, remove_pis=True)
+        root = lxml.html.document_fromstring(html.encode("utf-8", "replace"), parser=parser)
+    except ParserError:
+        # Empty or whitespace-only document
+        return None, ""
+
+    title_element = root.find(".//title")
+    title = _clean_title(title_element.text_content()) if title_element is not None else None
+
+    for element in list(root.iter(*(BOILERPLATE_TAGS if strip_boilerplate else NON_TEXT_TAGS))):
+        element.drop_tree()
+    if strip_boilerplate:
+        for element in root.xpath("//*[@class or @id or @role]"):
+            if (element.tag not in CONTENT_TAGS and is_boilerplate(element.attrib)
+                    and element.find(".//main") is None and element.find(".//article") is None):
+                element.drop_tree()
+
+    # Block elements start and end on their own line
+    for element in root.iter(*BLOCK_TAGS):
+        element.text = "\n" + (element.text or "")
+        element.tail = "\n" + (element.tail or "")
+
+    body = root.find("body")
+    body = root if body is None else body
+    text = clean_text("".join(body.itertext()))
+    if not strip_boilerplate:
+        return title, text
+    main = body.find(".//main")
+    main_text = clean_text("".join(main.itertext())) if main is not None else ""
+    articles = [clean_text("".join(article.itertext())) for article in body.iter("article")]
+    return title, _pick_content(text, main_text, articles)
+
+def _extract_selectolax(html, strip_boilerplate):
+    tree = LexborHTMLParser(html)
+    title_node = tree.css_first("title")
+    title = _clean_title(title_node.text()) if title_node is not None else None
+
+    tree.strip_tags(list(BOILERPLATE_TAGS if strip_boilerplate else NON_TEXT_TAGS))
+    if strip_boilerplate:
+        def droppable(node):
+            return (node.tag not in CONTENT_TAGS and is_boilerplate(node.attributes)
+                    and node.css_first("main, article") is None)
+
+        for node in tree.css("[class], [id], [role]"):
+            if not droppable(node):
+                continue
+            # Only remove the outermost match; nested matches go with it
+            parent = node.parent
+            while parent is not None and not (parent.tag and droppable(parent)):
+                parent = parent.parent
+            if parent is None:
+                node.decompose()
+
+    # Keep inline markup on its line, then put every remaining text node on its own line
+    tree.unwrap_tags(INLINE_TAGS)
+    tree.merge_text_nodes()
+    body = tree.body or tree.root
+    if body is None:
+        return title, ""
+    text = clean_text(body.text(separator="\n"))
+    if not strip_boilerplate:
+        return title, text
+    main = body.css_first("main")
+    main_text = clean_text(main.text(separator="\n")) if main is not None else ""
+    articles = [clean_text(article.text(separator="\n")) for article in body.css("article")]
+    return title, _pick_content(text, main_text, articles)
+
+# Available backends, fastest first
+EXTRACTORS = {}
+if LexborHTMLParser is not None:
+    EXTRACTORS["selectolax"] = _extract_selectolax
+if lxml is not None:
+    EXTRACTORS["lxml"] = _extract_lxml
+EXTRACTORS["stdlib"] = _extract_stdlib
+
+def get_extractor(name=None):
+    """
+    Return an extraction backend.
+
+    Args:
+        name: "selectolax", "lxml", "stdlib" or "auto" (default: HTML_EXTRACTOR)
+
+    Returns:
+        A function taking (html, strip_boilerplate) and returning (title or None, text)
+
+    Raises:
+        ValueError: If the named backend is unknown or not installed
+    """
+    name = name or HTML_EXTRACTOR
+    if name == "auto":
+        return next(iter(EXTRACTORS.values()))
+    if name not in EXTRACTORS:
+        raise ValueError(f"HTML extractor '{name}' is not available (installed: {', '.join(EXTRACTORS)})")
+    return EXTRACTORS[name]
+
+def extract_text(html, backend=None, strip_boilerplate=None):
+    """
+    Extract the title and readable text from an HTML document.
+
+    Args:
+        html: The HTML document as a string
+        backend: Backend name (default: HTML_EXTRACTOR)
+        strip_boilerplate: Whether to drop navigation, footers, ads and similar
+            elements and prefer the <main>/<article> content (default: HTML_STRIP_BOILERPLATE)
+
+    Returns:
+        Tuple of (title or None, text)
+    """
+    strip_boilerplate = HTML_STRIP_BOILERPLATE if strip_boilerplate is None else strip_boilerplate
+    extractor = get_extractor(backend)
+    debug("HtmlExtract", f"Extracting {len(html)} chars with {extractor.__name__}", level=3)
+    return extractor(html, strip_boilerplate)
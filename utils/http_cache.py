@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from utils.debug import debug, debug_error
+
+# Cache location and limits, overridable from the environment (empty path disables the cache)
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", ".cache/http_cache.sqlite")
+HTTP_CACHE_TTL = int(os.getenv("HTTP_CACHE_TTL", "86400"))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    body_hash TEXT NOT NULL,
+    extracted TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+"""
+
+def normalize_cache_key(url):
+    """
+    Normalize a URL into the key used for cache lookups.
+
+    Args:
+        url: The URL to normalize
+
+    Returns:
+        The URL with a lowercase scheme and host, no default port, no fragment
+        and sorted query parameters
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+class HttpCache:
+    """
+    Persistent HTTP response cache stored in SQLite.
+
+    Entries are keyed by normalized URL and keep the response headers, the
+    compressed raw body (stored once per distinct body hash) and the extracted
+    page dictionary, so a fresh hit skips both the network and HTML parsing.
+    Stale entries can be revalidated with a conditional GET.
+    """
+
+    def __init__(self, path, ttl=HTTP_CACHE_TTL, max_bytes=HTTP_CACHE_MAX_BYTES):
+        """
+        Args:
+            path: Path of the SQLite database file
+            ttl: Seconds an entry is served without revalidation
+            max_bytes: Approximate size limit; least recently used entries are evicted beyond it
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, url):
+        """
+        Look up a cached response.
+
+        Args:
+            url: The URL to look up
+
+        Returns:
+            Dictionary with url, status, headers, body, extracted, etag,
+            last_modified and fresh, or None if the URL is not cached
+        """
+        key = normalize_cache_key(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT e.url, e.status, e.headers, e.etag, e.last_modified, e.extracted, e.fetched_at, b.data "
+                "FROM entries e JOIN blobs b ON b.hash = e.body_hash WHERE e.key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                debug("HttpCache", f"Miss: {url}", level=3)
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+
+        cached_url, status, headers, etag, last_modified, extracted, fetched_at, body = row
+        fresh = now - fetched_at < self.ttl
+        debug("HttpCache", f"{'Hit' if fresh else 'Stale hit'}: {url}", level=3)
+        return {
+            "url": cached_url,
+            "status": status,
+            "headers": json.loads(headers),
+            "body": zlib.decompress(body),
+            "extracted": json.loads(extracted),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": fresh
+        }
+
+    def put(self, url, status, headers, body, extracted):
+        """
+        Store a response, replacing any previous entry for the URL.
+
+        Args:
+            url: The URL that was fetched
+            status: The HTTP status code
+            headers: Mapping of response headers
+            body: The raw response body as bytes
+            extracted: The extracted page dictionary returned by crawl_url
+        """
+        headers = dict(headers)
+        if "no-store" in headers.get("Cache-Control", "").lower():
+            debug("HttpCache", f"Not storing {url} (Cache-Control: no-store)", level=3)
+            return
+
+        key = normalize_cache_key(url)
+        body_hash = hashlib.sha256(body).hexdigest()
+        compressed = zlib.compress(body)
+        extracted_json = json.dumps(extracted)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO blobs (hash, data, size) VALUES (?, ?, ?)",
+                (body_hash, compressed, len(compressed))
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, url, status, headers, etag, last_modified, body_hash, extracted, size, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(headers), headers.get("ETag"), headers.get("Last-Modified"),
+                 body_hash, extracted_json, len(extracted_json), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def refresh(self, url, headers=None):
+        """
+        Mark a cached entry as fresh again after a 304 Not Modified response.
+
+        Args:
+            url: The URL that was revalidated
+            headers: Optional headers from the 304 response carrying a new ETag/Last-Modified
+        """
+        headers = dict(headers or {})
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET fetched_at = ?, last_access = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (now, now, headers.get("ETag"), headers.get("Last-Modified"), normalize_cache_key(url))
+            )
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries and orphaned bodies until under max_bytes. Caller holds the lock."""
+        total = self._total_size()
+        if total <= self.max_bytes:
+            return
+        # Bodies are shared between entries, so a body's size is freed with the last entry using it
+        references = dict(self._conn.execute("SELECT body_hash, COUNT(*) FROM entries GROUP BY body_hash"))
+        rows = self._conn.execute(
+            "SELECT e.key, e.size, e.body_hash, b.size FROM entries e JOIN blobs b ON b.hash = e.body_hash "
+            "ORDER BY e.last_access ASC"
+        ).fetchall()
+        evicted = []
+        for key, size, body_hash, body_size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+            references[body_hash] -= 1
+            if not references[body_hash]:
+                total -= body_size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT body_hash FROM entries)")
+        debug("HttpCache", f"Evicted {len(evicted)} entries (size now {total} bytes)", level=2)
+
+    def _total_size(self):
+        blobs = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        entries = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        return blobs + entries
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+def conditional_headers(entry):
+    """
+    Build the request headers for revalidating a cached entry.
+
+    Args:
+        entry: A cache entry returned by HttpCache.get
+
+    Returns:
+        Dictionary with If-None-Match and/or If-Modified-Since
+    """
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+def get_http_cache():
+    """
+    Return the process-wide HTTP cache, creating it on first use.
+
+    Returns:
+        The shared HttpCache, or None if HTTP_CACHE_PATH is empty or the
+        database cannot be opened
+    """
+    global _http_cache
+    if not HTTP_CACHE_PATH:
+        return None
+    with _http_cache_lock:
+        if _http_cache is None:
+            try:
+                _http_cache = HttpCache(HTTP_CACHE_PATH)
+                debug("HttpCache", f"Opened HTTP cache at {HTTP_CACHE_PATH}", level=2)
+            except sqlite3.Error as e:
+                debug_error("HttpCache", f"Could not open HTTP cache at {HTTP_CACHE_PATH}: {e}")
+                return None
+        return _http_cache
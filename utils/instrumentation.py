@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import inspect
+import itertools
+import threading
+import functools
+import contextvars
+from collections import deque
+from pocketflow import Node
+from utils.debug import debug, debug_error
+
+# Span recording settings: whether to record at all, how many finished spans to keep in memory,
+# and the JSON-lines file main.py exports them to at the end of a session (empty to disable)
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "1") != "0"
+INSTRUMENTATION_MAX_SPANS = int(os.getenv("INSTRUMENTATION_MAX_SPANS", "100000"))
+INSTRUMENTATION_PATH = os.getenv("INSTRUMENTATION_PATH", "")
+
+# Span kinds that measure waiting on an external service rather than local work
+EXTERNAL_KINDS = ("llm", "crawl", "search")
+
+# Numeric span fields that are not summed in the profile report
+UNSUMMED_FIELDS = frozenset({"id", "parent", "start", "duration", "status"})
+# Summed fields shown next to each operation in the formatted profile
+REPORTED_FIELDS = ("prompt_tokens", "response_tokens", "prompt_chars", "response_chars", "bytes", "results")
+
+_spans = deque(maxlen=INSTRUMENTATION_MAX_SPANS)
+_spans_lock = threading.Lock()
+_span_ids = itertools.count(1)
+
+# The span open in the current thread or task, so nested spans know their parent
+_current = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """
+    One timed operation, recorded when it finishes.
+
+    Used as a context manager, the span becomes the parent of spans opened
+    inside it and the target of annotate(). Spans started in worker threads
+    that do not inherit the caller's context are recorded without a parent.
+    A span can also be driven with start() and finish(), for example around
+    a generator, in which case it never becomes the current span.
+    """
+
+    def __init__(self, kind, name, **attrs):
+        """
+        Args:
+            kind: Category of the operation ("node", "prep", "exec", "post", "llm", "crawl", "search")
+            name: What ran, e.g. the node class or the model
+            **attrs: Initial attributes, extended with set() or annotate()
+        """
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.id = None
+        self.parent = None
+        self._token = None
+
+    def set(self, **attrs):
+        """Add attributes to the span."""
+        self.attrs.update(attrs)
+        return self
+
+    def start(self):
+        parent = _current.get()
+        self.id = next(_span_ids)
+        self.parent = parent.id if parent else None
+        self._started = time.time()
+        self.clock = time.perf_counter()
+        return self
+
+    def finish(self, error=None):
+        if self.id is None:
+            return
+        duration = time.perf_counter() - self.clock
+        if error is not None:
+            self.attrs.setdefault("error", error)
+        if INSTRUMENTATION_ENABLED:
+            record = {"id": self.id, "parent": self.parent, "kind": self.kind, "name": self.name,
+                      "start": round(self._started, 6), "duration": round(duration, 6),
+                      "thread": threading.current_thread().name, **self.attrs}
+            with _spans_lock:
+                _spans.append(record)
+        self.id = None
+
+    def __enter__(self):
+        self.start()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.finish(exc_type.__name__ if exc_type else None)
+        return False
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if any."""
+    span = _current.get()
+    if span is not None:
+        span.set(**attrs)
+
+def traced(kind, name):
+    """
+    Decorator recording every call of a function or coroutine function as a span.
+
+    Args:
+        kind: Span kind
+        name: Span name
+    """
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with Span(kind, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(kind, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class TracedNode(Node):
+    """Node whose prep, exec and post are each recorded as a span inside one span for the node."""
+
+    def _run(self, shared):
+        name = type(self).__name__
+        with Span("node", name) as node_span:
+            with Span("prep", name):
+                prep_res = self.prep(shared)
+            with Span("exec", name):
+                exec_res = self._exec(prep_res)
+            with Span("post", name):
+                action = self.post(shared, prep_res, exec_res)
+            node_span.set(action=action)
+        return action
+
+def get_spans():
+    """Return a copy of the finished spans, oldest first."""
+    with _spans_lock:
+        return list(_spans)
+
+def reset_instrumentation():
+    """Forget every recorded span, e.g. at the start of a session."""
+    with _spans_lock:
+        _spans.clear()
+
+def export_jsonl(path, spans=None):
+    """
+    Write spans to a file as JSON lines.
+
+    Args:
+        path: The file to append to
+        spans: Spans to write (default: every recorded span)
+
+    Returns:
+        Number of spans written
+    """
+    spans = get_spans() if spans is None else spans
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span, default=str) + "\n")
+    except OSError as e:
+        debug_error("Instrumentation", f"Could not export spans to {path}: {e}")
+        return 0
+    debug("Instrumentation", f"Exported {len(spans)} spans to {path}", level=2)
+    return len(spans)
+
+def load_jsonl(path):
+    """Read spans exported with export_jsonl."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def profile_report(spans=None):
+    """
+    Aggregate spans into a per-session profile.
+
+    Self time is a span's duration minus that of its direct children, so the
+    time of an exec span that waited on an LLM call is split between "llm"
+    and local work (prompt building, JSON parsing, HTML extraction).
+
+    Args:
+        spans: Spans to aggregate (default: every recorded span)
+
+    Returns:
+        Dictionary with the span count, wall time, totals per kind and per
+        kind and name (count, total, self, mean, p95 and max seconds, plus
+        sums of numeric attributes such as tokens and bytes)
+    """
+    spans = get_spans() if spans is None else spans
+    child_time = {}
+    for span in spans:
+        if span.get("parent") is not None:
+            child_time[span["parent"]] = child_time.get(span["parent"], 0.0) + span["duration"]
+
+    by_kind = {}
+    operations = {}
+    for span in spans:
+        self_time = max(0.0, span["duration"] - child_time.get(span["id"], 0.0))
+        kind = by_kind.setdefault(span["kind"], {"count": 0, "total": 0.0, "self": 0.0})
+        kind["count"] += 1
+        kind["total"] += span["duration"]
+        kind["self"] += self_time
+
+        entry = operations.setdefault(f"{span['kind']}:{span['name']}",
+                                      {"count": 0, "errors": 0, "total": 0.0, "self": 0.0, "durations": []})
+        entry["count"] += 1
+        entry["errors"] += "error" in span
+        entry["total"] += span["duration"]
+        entry["self"] += self_time
+        entry["durations"].append(span["duration"])
+        for key, value in span.items():
+            if key not in UNSUMMED_FIELDS and isinstance(value, (int, float)) and not isinstance(value, bool):
+                entry[key] = entry.get(key, 0) + value
+
+    for entry in operations.values():
+        durations = entry.pop("durations")
+        entry.update(mean=entry["total"] / entry["count"], p95=_percentile(durations, 0.95), max=max(durations))
+
+    wall = 0.0
+    if spans:
+        wall = max(span["start"] + span["duration"] for span in spans) - min(span["start"] for span in spans)
+    return {"spans": len(spans), "wall_time": wall, "by_kind": by_kind,
+            "operations": dict(sorted(operations.items(), key=lambda item: item[1]["total"], reverse=True))}
+
+def format_profile(report):
+    """
+    Render a profile_report as a text table.
+
+    Args:
+        report: The dictionary returned by profile_report
+
+    Returns:
+        Multi-line string with the time per kind and the slowest operations
+    """
+    wall = report["wall_time"] or 1.0
+    lines = [f"Session profile: {report['spans']} spans over {report['wall_time']:.2f}s", "",
+             f"{'kind':<8} {'count':>6} {'self s':>9} {'share':>6}"]
+    for kind, entry in sorted(report["by_kind"].items(), key=lambda item: item[1]["self"], reverse=True):
+        lines.append(f"{kind:<8} {entry['count']:>6} {entry['self']:>9.3f} {entry['self'] / wall:>6.1%}")
+    external = sum(entry["self"] for kind, entry in report["by_kind"].items() if kind in EXTERNAL_KINDS)
+    lines.append(f"Waiting on LLM and network: {external:.2f}s ({external / wall:.1%} of wall time)")
+
+    lines += ["", f"{'operation':<40} {'count':>6} {'total s':>9} {'mean s':>8} {'p95 s':>8} {'errors':>6}  totals"]
+    for name, entry in report["operations"].items():
+        totals = " ".join(f"{field}={entry[field]}" for field in REPORTED_FIELDS if field in entry)
+        lines.append(f"{name[:40]:<40} {entry['count']:>6} {entry['total']:>9.3f} {entry['mean']:>8.3f} "
+                     f"{entry['p95']:>8.3f} {entry['errors']:>6}  {totals}")
+    return "\n".join(lines)
@@ -0,0 +1,314 @@
+import re
+import copy
+import json
+from functools import lru_cache
+from typing import Any, Union, get_args, get_origin, get_type_hints
+
+class JSONExtractionError(ValueError):
+    """Raised when no valid JSON object can be extracted from an LLM response."""
+    # The raw response text, when the caller has it
+    response = None
+
+class StreamingJSONExtractor:
+    """
+    Incrementally parse the first top-level JSON object in streamed LLM output.
+
+    Text before the opening brace (prose, a ```json fence) is skipped. Each
+    top-level field is decoded as soon as its value is complete, so callers can
+    act on early fields such as next_action while later ones are still
+    streaming. Every character is scanned once across all feed() calls.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_role = None  # "key" or "value" for strings directly inside the object
+        self._expect = None  # "key", "colon", "value", "in_value" or "comma"
+        self._key = None
+        self._token_start = None
+        self._obj_start = None
+        self._obj_end = None
+
+    @property
+    def done(self):
+        """True once the top-level object has been closed."""
+        return self._obj_end is not None
+
+    def feed(self, chunk):
+        """
+        Add a chunk of streamed text.
+
+        Args:
+            chunk: The next piece of the response
+
+        Returns:
+            List of top-level keys whose values were completed by this chunk
+        """
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer) and self._obj_end is None:
+            c = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_role == "key":
+                        self._key = self._decode(buffer[self._token_start:i + 1])
+                        self._expect = "colon"
+                    elif self._string_role == "value":
+                        self._complete(buffer[self._token_start:i + 1], completed)
+                        self._expect = "comma"
+                    self._string_role = None
+            elif self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+                    self._obj_start = i
+                    self._expect = "key"
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect == "key":
+                    self._string_role = "key"
+                    self._token_start = i
+                elif self._depth == 1 and self._expect == "value":
+                    self._string_role = "value"
+                    self._token_start = i
+                    self._expect = "in_value"
+            elif c in "{[":
+                if self._depth == 1 and self._expect == "value":
+                    self._token_start = i
+                    self._expect = "in_value"
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._expect == "in_value":
+                    # A nested object or array value just closed
+                    self._complete(buffer[self._token_start:i + 1], completed)
+                    self._expect = "comma"
+                elif self._depth == 0:
+                    if self._expect == "in_value":
+                        self._complete(buffer[self._token_start:i], completed)
+                    self._obj_end = i + 1
+            elif self._depth == 1:
+                if c == ":" and self._expect == "colon":
+                    self._expect = "value"
+                elif c == ",":
+                    if self._expect == "in_value":
+                        self._complete(buffer[self._token_start:i], completed)
+                    self._expect = "key"
+                elif not c.isspace() and self._expect == "value":
+                    # Start of a number, true, false or null
+                    self._token_start = i
+                    self._expect = "in_value"
+            i += 1
+        self._pos = i
+        return completed
+
+    def result(self):
+        """
+        Return the parsed top-level object.
+
+        Returns:
+            The decoded object, or None if it has not been closed yet or is not valid JSON
+        """
+        if self._obj_end is None:
+            return None
+        return self._decode(self.buffer[self._obj_start:self._obj_end])
+
+    def _complete(self, text, completed):
+        if self._key is None:
+            return
+        try:
+            self.fields[self._key] = json.loads(text)
+            completed.append(self._key)
+        except json.JSONDecodeError:
+            pass
+        self._key = None
+
+    @staticmethod
+    def _decode(text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+# Structural tokens inside an object: a whole string literal (group 1 is empty if it is unterminated) or a bracket
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*("?)|[{}\[\]]')
+_decoder = json.JSONDecoder()
+
+def iter_json_objects(text):
+    """
+    Yield every top-level JSON object found in text, in order.
+
+    Each candidate object is decoded in place with raw_decode, which stops at
+    the end of the object, so surrounding fences and trailing prose cost
+    nothing extra. Only when a candidate is not valid JSON is its span walked
+    with a bracket/string tokenizer to find where it ends, so braces inside
+    strings, several code blocks and trailing text are handled in one linear
+    pass. If the text ends inside an object (a truncated response), the open
+    strings and brackets are closed and the repaired object is tried last.
+
+    Args:
+        text: The raw LLM response
+
+    Yields:
+        Each decoded top-level object
+    """
+    pos = 0
+    while True:
+        start = text.find("{", pos)
+        if start == -1:
+            return
+        try:
+            obj, pos = _decoder.raw_decode(text, start)
+            yield obj
+            continue
+        except json.JSONDecodeError:
+            pass
+
+        # Not valid JSON: skip past the balanced span, or repair it if the text ends first
+        closers = ["}"]
+        in_string = False
+        end = None
+        for match in _TOKEN.finditer(text, start + 1):
+            token = match.group()
+            if token[0] == '"':
+                if not match.group(1):
+                    in_string = True
+                    break
+            elif token in "{[":
+                closers.append("}" if token == "{" else "]")
+            else:
+                closers.pop()
+                if not closers:
+                    end = match.end()
+                    break
+
+        if end is None:
+            repaired = text[start:] + ('"' if in_string else "") + "".join(reversed(closers))
+            try:
+                yield json.loads(repaired)
+            except json.JSONDecodeError:
+                pass
+            return
+        pos = end
+
+def _checker(hint):
+    """Compile a typing hint from a TypedDict into a predicate on decoded JSON values."""
+    if hint is Any:
+        return lambda value: True
+    if hint is type(None):
+        return lambda value: value is None
+    origin = get_origin(hint)
+    if origin is Union:
+        options = [_checker(arg) for arg in get_args(hint)]
+        return lambda value: any(check(value) for check in options)
+    if origin is list or hint is list:
+        args = get_args(hint)
+        item_check = _checker(args[0]) if args else None
+        return lambda value: isinstance(value, list) and (item_check is None or all(item_check(item) for item in value))
+    if origin is dict or hint is dict:
+        return lambda value: isinstance(value, dict)
+    if hint is float:
+        return lambda value: isinstance(value, (int, float)) and not isinstance(value, bool)
+    if hint is int:
+        return lambda value: isinstance(value, int) and not isinstance(value, bool)
+    return lambda value: isinstance(value, hint)
+
+@lru_cache(maxsize=None)
+def _schema_fields(schema):
+    """Return (field, hint, predicate) for every field of a TypedDict, computed once per schema."""
+    return tuple((field, hint, _checker(hint)) for field, hint in get_type_hints(schema).items())
+
+def validate_json(obj, schema, required=None, defaults=None):
+    """
+    Validate a decoded object against a TypedDict schema.
+
+    Required fields must be present with the declared type (numeric strings are
+    accepted for float fields). Optional fields with the wrong type are
+    replaced by their default, and missing ones are filled from defaults.
+
+    Args:
+        obj: The decoded object
+        schema: A TypedDict class from utils/data_structures.py
+        required: Field names that must be present (default: every field in schema)
+        defaults: Values used for missing or mistyped optional fields
+
+    Returns:
+        The validated object (a new dict)
+
+    Raises:
+        JSONExtractionError: If obj is not a dict or a required field is missing or mistyped
+    """
+    if not isinstance(obj, dict):
+        raise JSONExtractionError(f"Expected a JSON object, got {type(obj).__name__}")
+    fields = _schema_fields(schema)
+    required = [field for field, _, _ in fields] if required is None else required
+    defaults = defaults or {}
+    result = dict(obj)
+
+    for field, hint, check in fields:
+        if field not in result:
+            if field in required:
+                raise JSONExtractionError(f"Missing required field '{field}'")
+            if field in defaults:
+                result[field] = copy.deepcopy(defaults[field])
+            continue
+        value = result[field]
+        if hint is float and isinstance(value, str):
+            try:
+                result[field] = value = float(value)
+            except ValueError:
+                pass
+        if not check(value):
+            if field in required:
+                raise JSONExtractionError(f"Field '{field}' has unexpected type {type(value).__name__}")
+            if field in defaults:
+                result[field] = copy.deepcopy(defaults[field])
+    return result
+
+def extract_json(text, schema=None, required=None, defaults=None, parsed=None):
+    """
+    Extract the first valid JSON object from an LLM response.
+
+    Args:
+        text: The raw LLM response
+        schema: Optional TypedDict the object must satisfy (see validate_json)
+        required: Field names that must be present (default: every field in schema)
+        defaults: Values used for missing or mistyped optional fields
+        parsed: An object already decoded from text (e.g. while streaming), tried first
+
+    Returns:
+        The first object that decodes and validates
+
+    Raises:
+        JSONExtractionError: If no candidate object is valid
+    """
+    problems = []
+    candidates = iter_json_objects(text)
+    if parsed is not None:
+        candidates = _prepend(parsed, candidates)
+    for candidate in candidates:
+        if not isinstance(candidate, dict):
+            continue
+        if schema is None:
+            return candidate
+        try:
+            return validate_json(candidate, schema, required=required, defaults=defaults)
+        except JSONExtractionError as e:
+            problems.append(str(e))
+    if problems:
+        raise JSONExtractionError(f"No JSON object matched the schema: {'; '.join(problems)}")
+    raise JSONExtractionError("No JSON object found in response")
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
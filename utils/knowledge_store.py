@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import zlib
+import numpy as np
+from utils.debug import debug
+
+# Estimated Jaccard similarity above which two facts are treated as the same
+KNOWLEDGE_DUPLICATE_THRESHOLD = float(os.getenv("KNOWLEDGE_DUPLICATE_THRESHOLD", "0.8"))
+
+# Facts shorter than this many words are only compared with the fact stored under the same key,
+# so unrelated short values like "yes" or "2023" are never merged across keys
+MIN_CROSS_KEY_WORDS = 8
+
+# MinHash parameters: number of hash functions, shingle size in words, and the Mersenne prime modulus
+MINHASH_PERMUTATIONS = 64
+SHINGLE_WORDS = 3
+MINHASH_PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(20240501)
+_HASH_A = _rng.integers(1, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_HASH_B = _rng.integers(0, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def normalize_key(key):
+    """Lower-case a fact key and join its words with underscores, so "Main Topic" and "main_topic" match."""
+    return "_".join(WORD_PATTERN.findall(str(key).lower())) or str(key)
+
+def fact_text(value):
+    """Text of a fact value used for similarity: strings as is, anything else as JSON."""
+    return value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+
+def shingles(text):
+    """Overlapping SHINGLE_WORDS-word sequences of a text (the words themselves for shorter texts)."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def minhash(text):
+    """
+    Compute the MinHash signature of a text.
+
+    Args:
+        text: The text to sign
+
+    Returns:
+        List of MINHASH_PERMUTATIONS integers; the share of equal positions
+        between two signatures estimates the Jaccard similarity of their shingles
+    """
+    items = shingles(text)
+    if not items:
+        return [MINHASH_PRIME] * MINHASH_PERMUTATIONS
+    hashes = np.array([zlib.crc32(item.encode("utf-8")) % MINHASH_PRIME for item in items], dtype=np.uint64)
+    permuted = (hashes[:, None] * _HASH_A + _HASH_B) % MINHASH_PRIME
+    return permuted.min(axis=0).tolist()
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.mean(np.asarray(signature) == np.asarray(other)))
+
+def merge_values(old, new):
+    """
+    Combine a stored fact value with an updated one.
+
+    Dicts are merged key by key, lists keep every distinct item in order,
+    and anything else is replaced by the new value.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        merged = dict(old)
+        for key, value in new.items():
+            merged[key] = merge_values(old[key], value) if key in old else value
+        return merged
+    if isinstance(old, list) and isinstance(new, list):
+        merged = list(old)
+        seen = {fact_text(item) for item in old}
+        for item in new:
+            text = fact_text(item)
+            if text not in seen:
+                seen.add(text)
+                merged.append(item)
+        return merged
+    return new
+
+class KnowledgeStore:
+    """
+    Facts extracted during a research session, deduplicated as they arrive.
+
+    Each fact is stored under a normalized key with its value, the sources it
+    was seen in, a version number that increases whenever the value changes,
+    and a MinHash signature. Re-extracted or near-duplicate facts only add
+    their source; changed facts are merged into the stored value. The store
+    holds plain data only, so it can be copied and pickled with the shared
+    store, and counts its changes in revision so checkpoints can tell
+    whether it needs saving again.
+    """
+
+    def __init__(self, duplicate_threshold=None):
+        """
+        Args:
+            duplicate_threshold: Similarity above which facts are merged (default: KNOWLEDGE_DUPLICATE_THRESHOLD)
+        """
+        self.duplicate_threshold = duplicate_threshold or KNOWLEDGE_DUPLICATE_THRESHOLD
+        # Normalized key -> {"key", "value", "sources", "version", "signature", "words"}, least recently changed first
+        self.facts = {}
+        self.revision = 0
+
+    def __len__(self):
+        return len(self.facts)
+
+    def _near_duplicate(self, signature, exclude):
+        """Return the key of the stored fact most similar to signature if it passes the threshold."""
+        candidates = [key for key, fact in self.facts.items() if key != exclude and fact["words"] >= MIN_CROSS_KEY_WORDS]
+        if not candidates:
+            return None
+        matrix = np.array([self.facts[key]["signature"] for key in candidates])
+        scores = np.mean(matrix == np.asarray(signature), axis=1)
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.duplicate_threshold else None
+
+    def add(self, key, value, sources=()):
+        """
+        Add one fact, merging it with what is already known.
+
+        Args:
+            key: The fact name as produced by the analyzer
+            value: The fact value
+            sources: URLs or search queries the fact was extracted from
+
+        Returns:
+            "added", "updated" or "duplicate"
+        """
+        norm = normalize_key(key)
+        text = fact_text(value)
+        signature = minhash(text)
+        words = len(WORD_PATTERN.findall(text))
+
+        target = norm if norm in self.facts else None
+        if target is None and words >= MIN_CROSS_KEY_WORDS:
+            target = self._near_duplicate(signature, exclude=norm)
+
+        if target is None:
+            self.facts[norm] = {"key": key, "value": value, "sources": list(dict.fromkeys(sources)),
+                                "version": 1, "signature": signature, "words": words}
+            self.revision += 1
+            return "added"
+
+        fact = self.facts[target]
+        new_sources = [source for source in dict.fromkeys(sources) if source not in fact["sources"]]
+        if new_sources:
+            fact["sources"].extend(new_sources)
+            self.revision += 1
+        if similarity(fact["signature"], signature) >= self.duplicate_threshold:
+            return "duplicate"
+
+        fact["value"] = merge_values(fact["value"], value)
+        merged_text = fact_text(fact["value"])
+        fact["signature"] = minhash(merged_text)
+        fact["words"] = len(WORD_PATTERN.findall(merged_text))
+        fact["version"] += 1
+        self.revision += 1
+        # Recently changed facts go last, so budgeted prompts keep them when trimming
+        self.facts[target] = self.facts.pop(target)
+        return "updated"
+
+    def merge(self, info, sources=()):
+        """
+        Add every fact of an analyzer's extracted_info.
+
+        Args:
+            info: Dictionary of fact names to values
+            sources: URLs or search queries the facts were extracted from
+
+        Returns:
+            Dictionary counting added, updated and duplicate facts
+        """
+        counts = {"added": 0, "updated": 0, "duplicate": 0}
+        for key, value in info.items():
+            counts[self.add(key, value, sources)] += 1
+        debug("KnowledgeStore", f"Merged {len(info)} facts: {counts} ({len(self.facts)} stored)", level=2)
+        return counts
+
+    def compact_view(self, with_sources=False):
+        """
+        Return the facts for prompts and results.
+
+        Args:
+            with_sources: Whether to include the sources each fact was seen in
+
+        Returns:
+            Dictionary of fact names to values (or to {"value", "sources"}),
+            least recently changed first
+        """
+        if with_sources:
+            return {fact["key"]: {"value": fact["value"], "sources": fact["sources"]} for fact in self.facts.values()}
+        return {fact["key"]: fact["value"] for fact in self.facts.values()}
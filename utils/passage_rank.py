@@ -0,0 +1,191 @@
+import os
+import re
+from collections import Counter
+import numpy as np
+from utils.debug import debug
+from utils.prompt_budget import estimate_tokens
+
+# Content budget for crawled pages in one analyzer prompt, and the size passages are cut to
+ANALYZER_CONTENT_TOKENS = int(os.getenv("ANALYZER_CONTENT_TOKENS", "1250"))
+PASSAGE_TARGET_CHARS = int(os.getenv("PASSAGE_TARGET_CHARS", "600"))
+
+# BM25 parameters: term frequency saturation and length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Marks the place where passages were left out of packed content
+OMISSION_MARKER = "[...]"
+
+WORD_PATTERN = re.compile(r"\w+")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its me my of on or our
+so than that the their them then there these they this to was we were what when where which who why will
+with you your about after also any been before between both did each more most not other over same should
+some such through under until very would n/a
+""".split())
+
+def tokenize(text):
+    """Lower-cased words of a text with stopwords removed."""
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+def _split_long(line, target_chars):
+    """Split one over-long line at sentence ends, then at whitespace, into pieces of about target_chars."""
+    pieces = []
+    current = ""
+    for sentence in SENTENCE_END_PATTERN.split(line):
+        while len(sentence) > target_chars:
+            cut = sentence.rfind(" ", 0, target_chars)
+            cut = cut if cut > 0 else target_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + len(sentence) + 1 > target_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_passages(text, target_chars=None):
+    """
+    Split extracted page text into passages.
+
+    Consecutive lines are grouped until a passage reaches about target_chars;
+    longer lines are split at sentence boundaries.
+
+    Args:
+        text: Page text with one block per line, as returned by the crawler
+        target_chars: Preferred passage size (default: PASSAGE_TARGET_CHARS)
+
+    Returns:
+        List of passages in document order
+    """
+    target_chars = target_chars or PASSAGE_TARGET_CHARS
+    passages = []
+    current = []
+    size = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        pieces = _split_long(line, target_chars) if len(line) > target_chars else [line]
+        for piece in pieces:
+            if current and size + len(piece) > target_chars:
+                passages.append("\n".join(current))
+                current = []
+                size = 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+def bm25_scores(passages, query):
+    """
+    Score passages against a query with BM25.
+
+    Args:
+        passages: List of passage strings
+        query: Query text; repeated query terms weigh more
+
+    Returns:
+        NumPy array with one score per passage
+    """
+    query_terms = Counter(tokenize(query))
+    if not passages or not query_terms:
+        return np.zeros(len(passages))
+
+    terms = list(query_terms)
+    counts = [Counter(tokenize(passage)) for passage in passages]
+    tf = np.array([[count[term] for term in terms] for count in counts], dtype=float)
+    lengths = np.array([sum(count.values()) for count in counts], dtype=float)
+    weights = np.array([query_terms[term] for term in terms], dtype=float)
+
+    n = len(passages)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    saturated = tf * (BM25_K1 + 1) / (tf + norm[:, None])
+    return saturated @ (idf * weights)
+
+def pack_passages(documents, query, budget_tokens=None, target_chars=None):
+    """
+    Keep the passages of several documents most relevant to a query within a token budget.
+
+    Documents that fit the budget together are returned unchanged. Otherwise
+    the first passage of every document is kept, so no page drops out of the
+    prompt, and the remaining passages of all documents are ranked together
+    with BM25 and added best first while they fit. Ties go round-robin across
+    documents (every document's second passage before any third one), so a
+    query matching nothing shares the budget evenly between the pages. Kept
+    passages stay in document order, with OMISSION_MARKER where text was
+    left out.
+
+    Args:
+        documents: List of page texts
+        query: Text the passages are ranked against (the research query and the last decision's reasoning)
+        budget_tokens: Token budget shared by all documents (default: ANALYZER_CONTENT_TOKENS)
+        target_chars: Preferred passage size (default: PASSAGE_TARGET_CHARS)
+
+    Returns:
+        List with the packed text of each document, in the same order
+    """
+    budget_tokens = budget_tokens or ANALYZER_CONTENT_TOKENS
+    if sum(estimate_tokens(document) for document in documents) <= budget_tokens:
+        return list(documents)
+
+    doc_passages = [split_passages(document, target_chars) for document in documents]
+    positions = [(doc_index, i) for doc_index, passages in enumerate(doc_passages) for i in range(len(passages))]
+    if not positions:
+        return list(documents)
+
+    scores = bm25_scores([doc_passages[d][i] for d, i in positions], query)
+    doc_indexes = np.array([d for d, _ in positions])
+    passage_indexes = np.array([i for _, i in positions])
+    # First passages first, then by score; equal scores go by position in the page, then by page
+    order = np.lexsort((doc_indexes, passage_indexes, -scores, passage_indexes > 0))
+
+    kept = set()
+    remaining = budget_tokens
+    for index in order:
+        doc_index, i = positions[index]
+        cost = estimate_tokens(doc_passages[doc_index][i])
+        if cost <= remaining:
+            kept.add((doc_index, i))
+            remaining -= cost
+        if remaining < 1:
+            break
+
+    packed = []
+    for doc_index, passages in enumerate(doc_passages):
+        parts = []
+        for i, passage in enumerate(passages):
+            if (doc_index, i) in kept:
+                parts.append(passage)
+            elif not parts or parts[-1] != OMISSION_MARKER:
+                parts.append(OMISSION_MARKER)
+        packed.append("\n".join(parts))
+
+    debug("PassageRank", f"Kept {len(kept)}/{len(positions)} passages from {len(documents)} documents "
+                         f"({budget_tokens - remaining}/{budget_tokens} tokens)", level=2)
+    return packed
+
+def rank_passages(text, query, budget_tokens=None, target_chars=None):
+    """
+    Keep the passages of one page most relevant to a query within a token budget.
+
+    Args:
+        text: The page text
+        query: Text the passages are ranked against
+        budget_tokens: Token budget (default: ANALYZER_CONTENT_TOKENS)
+        target_chars: Preferred passage size (default: PASSAGE_TARGET_CHARS)
+
+    Returns:
+        The packed text (see pack_passages)
+    """
+    return pack_passages([text], query, budget_tokens, target_chars)[0]
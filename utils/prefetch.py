@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.debug import debug, debug_error
+from utils.url_utils import canonicalize_url
+from utils.web_crawl import crawl_url
+
+# Search result links crawled speculatively while the analyzer and decision LLM calls run (0 disables)
+PREFETCH_TOP_K = int(os.getenv("PREFETCH_TOP_K", "3"))
+
+# Prefetched pages kept for the crawl node, how long they stay usable, and crawls running at once
+PREFETCH_MAX_ENTRIES = int(os.getenv("PREFETCH_MAX_ENTRIES", "16"))
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "600"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "3"))
+
+def _page_bytes(page):
+    """Body bytes the crawl downloaded for a result; pages served from the HTTP cache cost none."""
+    return page.get("bytes", 0) if page else 0
+
+class Prefetcher:
+    """
+    Speculative crawler for the top links of a search.
+
+    Searches are usually followed by an analyzer and a decision LLM call,
+    and the decision is often to crawl one of the first results. Starting
+    those crawls as soon as the results arrive overlaps the two round trips
+    with the downloads. Crawls run in a small thread pool and their futures
+    are kept in a bounded LRU keyed by canonical URL; pages evicted or
+    expired before a crawl node takes them are counted as wasted.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, workers=None, crawl=crawl_url):
+        """
+        Args:
+            max_entries: Prefetched pages kept at most (default: PREFETCH_MAX_ENTRIES)
+            ttl: Seconds a prefetched page may be used (default: PREFETCH_TTL)
+            workers: Crawls running at once (default: PREFETCH_WORKERS)
+            crawl: Function crawling one URL
+        """
+        self.max_entries = max_entries or PREFETCH_MAX_ENTRIES
+        self.ttl = ttl or PREFETCH_TTL
+        self.crawl = crawl
+        self._executor = ThreadPoolExecutor(max_workers=workers or PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        self._entries = OrderedDict()  # canonical URL -> (future, started_at)
+        # Reentrant: a discarded crawl that is already done runs its callback under the lock
+        self._lock = threading.RLock()
+        self._stats = {"prefetched": 0, "hits": 0, "misses": 0, "waited": 0, "failed": 0,
+                       "wasted": 0, "used_bytes": 0, "wasted_bytes": 0}
+
+    def prefetch(self, urls):
+        """
+        Start crawling urls in the background, skipping ones already prefetched.
+
+        Args:
+            urls: URLs to crawl, most promising first
+
+        Returns:
+            Number of crawls started
+        """
+        started = 0
+        with self._lock:
+            for url in urls:
+                key = canonicalize_url(url)
+                if key in self._entries:
+                    continue
+                self._entries[key] = (self._executor.submit(self.crawl, url), time.monotonic())
+                self._stats["prefetched"] += 1
+                started += 1
+            self._evict(time.monotonic())
+        if started:
+            debug("Prefetcher", f"Prefetching {started} search results", level=2)
+        return started
+
+    def _evict(self, now):
+        """Drop expired entries and the oldest ones beyond max_entries; caller holds the lock."""
+        expired = [key for key, (_, started_at) in self._entries.items() if now - started_at > self.ttl]
+        for key in expired:
+            self._discard(key)
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        future, _ = self._entries.pop(key)
+        self._stats["wasted"] += 1
+        if not future.cancel():
+            future.add_done_callback(self._count_wasted)
+
+    def _count_wasted(self, future):
+        bytes_wasted = self._done_bytes(future)
+        with self._lock:
+            self._stats["wasted_bytes"] += bytes_wasted
+
+    @staticmethod
+    def _done_bytes(future):
+        """Bytes downloaded by a finished crawl; 0 if it is still running, was cancelled or failed."""
+        if not future.done() or future.cancelled() or future.exception() is not None:
+            return 0
+        return _page_bytes(future.result())
+
+    def clear(self):
+        """Drop every unclaimed page, counting it as wasted; running crawls finish unused."""
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+
+    def take(self, url):
+        """
+        Claim the prefetched page for url, waiting for its crawl if it is still running.
+
+        Args:
+            url: The URL a crawl node is about to fetch
+
+        Returns:
+            The crawl result, or None if url was not prefetched or its crawl failed
+        """
+        key = canonicalize_url(url)
+        with self._lock:
+            self._evict(time.monotonic())
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            if not entry[0].done():
+                self._stats["waited"] += 1
+        try:
+            page = entry[0].result()
+        except Exception as e:
+            debug_error("Prefetcher", f"Prefetch of {url} failed: {e}")
+            page = None
+        if not page or not page.get("status"):
+            # Crawl it again in the node rather than report a speculative failure
+            with self._lock:
+                self._stats["failed"] += 1
+            return None
+        with self._lock:
+            self._stats["used_bytes"] += _page_bytes(page)
+        debug("Prefetcher", f"Using prefetched page for {url}", level=2)
+        return page
+
+    def __contains__(self, url):
+        with self._lock:
+            return canonicalize_url(url) in self._entries
+
+    def stats(self):
+        """
+        Return the prefetch counters.
+
+        Returns:
+            Dictionary with prefetched, hits, misses, waited (hits whose crawl
+            was still running), failed, wasted (dropped or still unclaimed),
+            used_bytes and wasted_bytes (body bytes downloaded), and hit_rate
+            (share of prefetched pages a crawl node used)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            # Pages nobody has claimed yet are counted as wasted, as they would be if dropped now
+            stats["wasted"] += len(self._entries)
+            stats["wasted_bytes"] += sum(self._done_bytes(future) for future, _ in self._entries.values())
+        stats["hit_rate"] = (stats["hits"] - stats["failed"]) / stats["prefetched"] if stats["prefetched"] else 0.0
+        return stats
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher():
+    """
+    Return the process-wide Prefetcher, creating it on first use.
+
+    Returns:
+        The shared Prefetcher, or None if PREFETCH_TOP_K is 0
+    """
+    global _prefetcher
+    if PREFETCH_TOP_K <= 0:
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
@@ -0,0 +1,194 @@
+import os
+import json
+import threading
+from utils.debug import debug
+
+# Per-section token budgets for prompt context that grows with the session
+PROMPT_KNOWLEDGE_TOKENS = int(os.getenv("PROMPT_KNOWLEDGE_TOKENS", "2000"))
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "600"))
+PROMPT_REPORT_TOKENS = int(os.getenv("PROMPT_REPORT_TOKENS", "800"))
+
+# Rough size of a token for English text, used to estimate prompt cost without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Increasingly tight (longest string, most list items) limits tried before whole entries are dropped
+TRIM_STEPS = ((1000, 20), (400, 10), (200, 5), (80, 3))
+
+# Research steps whose reasoning is kept when the history is summarized
+RECENT_HISTORY_STEPS = 3
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+def estimate_tokens(text):
+    """
+    Estimate the number of LLM tokens in a text.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        Approximate token count (CHARS_PER_TOKEN characters per token)
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _shorten(value, max_chars, max_items):
+    """Copy of a JSON value with long strings cut to max_chars and lists cut to their first max_items."""
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars].rstrip() + "..."
+    if isinstance(value, list):
+        items = [_shorten(item, max_chars, max_items) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"... {len(value) - max_items} more")
+        return items
+    if isinstance(value, dict):
+        return {key: _shorten(item, max_chars, max_items) for key, item in value.items()}
+    return value
+
+def fit_json(value, budget_tokens):
+    """
+    Serialize a JSON value within a token budget.
+
+    Values that fit are serialized unchanged. Otherwise long strings and
+    lists are shortened step by step, and if that is not enough the oldest
+    entries of a dict or list (the first ones) are dropped and counted in
+    an "_omitted" note.
+
+    Args:
+        value: The value to serialize
+        budget_tokens: Maximum size of the result in tokens
+
+    Returns:
+        JSON text of at most budget_tokens (unless a single entry is larger)
+    """
+    text = json.dumps(value)
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    for max_chars, max_items in TRIM_STEPS:
+        shortened = _shorten(value, max_chars, max_items)
+        text = json.dumps(shortened)
+        if estimate_tokens(text) <= budget_tokens:
+            return text
+    if not isinstance(shortened, (dict, list)):
+        return text
+
+    # Keep the newest entries that fit, leaving room for the omission note
+    entries = list(shortened.items()) if isinstance(shortened, dict) else list(shortened)
+    remaining = budget_tokens - estimate_tokens('{"_omitted": "0000 older entries"}')
+    kept = 0
+    for entry in reversed(entries):
+        cost = estimate_tokens(json.dumps(dict([entry]) if isinstance(shortened, dict) else entry)) + 1
+        if cost > remaining:
+            break
+        remaining -= cost
+        kept += 1
+    newest = entries[len(entries) - kept:]
+    note = f"{len(entries) - kept} older entries"
+    if isinstance(shortened, dict):
+        return json.dumps({"_omitted": note, **dict(newest)})
+    return json.dumps([f"... {note}"] + newest)
+
+def summarize_history(history, budget_tokens):
+    """
+    Summarize the research history within a token budget.
+
+    Every step becomes one line with its action and target; the most recent
+    steps keep their reasoning. Older steps are dropped first when the
+    lines do not fit.
+
+    Args:
+        history: List of research history entries (action, query_or_url, reasoning)
+        budget_tokens: Maximum size of the summary in tokens
+
+    Returns:
+        The summary as numbered lines
+    """
+    lines = []
+    for i, entry in enumerate(history):
+        target = entry.get("query_or_url")
+        if isinstance(target, list):
+            target = ", ".join(target)
+        line = f"{i + 1}. {entry.get('action')}: {target}"
+        if i >= len(history) - RECENT_HISTORY_STEPS and entry.get("reasoning"):
+            line += f" ({entry['reasoning']})"
+        lines.append(line)
+
+    kept = []
+    remaining = budget_tokens - estimate_tokens("(0000 earlier steps omitted)\n")
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            break
+        remaining -= cost
+        kept.append(line)
+    kept.reverse()
+    if len(kept) < len(lines):
+        kept.insert(0, f"({len(lines) - len(kept)} earlier steps omitted)")
+    return "\n".join(kept)
+
+class PromptBuilder:
+    """
+    Assemble a prompt from named sections and report its size.
+
+    Fixed text is added as is; context that grows over a session is fitted
+    to a per-section budget, so the prompt has a ceiling no matter how many
+    iterations came before.
+    """
+
+    def __init__(self, node_name):
+        """
+        Args:
+            node_name: Name of the node building the prompt, used for debug output and stats
+        """
+        self.node_name = node_name
+        self.section_tokens = {}
+        self._parts = []
+
+    def add(self, text, section="instructions"):
+        """Append text to the prompt, counting it towards section."""
+        self._parts.append(text)
+        self.section_tokens[section] = self.section_tokens.get(section, 0) + estimate_tokens(text)
+        return self
+
+    def add_json(self, label, value, budget_tokens, section):
+        """Append label followed by value serialized within budget_tokens (see fit_json)."""
+        return self.add(f"{label}{fit_json(value, budget_tokens)}\n", section)
+
+    def add_history(self, label, history, budget_tokens, section="history"):
+        """Append label followed by the research history summarized within budget_tokens."""
+        return self.add(f"{label}\n{summarize_history(history, budget_tokens)}\n", section)
+
+    def build(self):
+        """
+        Return the assembled prompt and record its size.
+
+        Returns:
+            The prompt text
+        """
+        prompt = "".join(self._parts)
+        tokens = estimate_tokens(prompt)
+        breakdown = ", ".join(f"{section}={count}" for section, count in self.section_tokens.items())
+        debug(self.node_name, f"Prompt size: ~{tokens} tokens ({breakdown})", level=2)
+        with _stats_lock:
+            stats = _stats.setdefault(self.node_name, {"prompts": 0, "total_tokens": 0, "max_tokens": 0, "last_tokens": 0})
+            stats["prompts"] += 1
+            stats["total_tokens"] += tokens
+            stats["max_tokens"] = max(stats["max_tokens"], tokens)
+            stats["last_tokens"] = tokens
+        return prompt
+
+def get_prompt_stats():
+    """
+    Return the prompt size counters.
+
+    Returns:
+        Dictionary mapping node names to prompts built, total_tokens,
+        max_tokens and last_tokens (estimated)
+    """
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+def reset_prompt_stats():
+    """Forget all recorded prompt sizes."""
+    with _stats_lock:
+        _stats.clear()
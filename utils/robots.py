@@ -0,0 +1,320 @@
+import os
+import re
+import sqlite3
+import threading
+from urllib.parse import urlsplit, quote
+
+import requests
+from utils.debug import debug, debug_error
+from utils.cache import LRUCache, PersistentCache
+
+# Whether crawls consult robots.txt, and the product token matched against its User-agent lines
+ROBOTS_ENABLED = os.getenv("ROBOTS_ENABLED", "1") != "0"
+ROBOTS_USER_AGENT = os.getenv("ROBOTS_USER_AGENT", "PocketFlowResearchBot")
+
+# How long a host's rules are kept, in memory and on disk (empty path for memory only); rules
+# standing in for an unreachable robots.txt expire sooner so the host is retried
+ROBOTS_CACHE_PATH = os.getenv("ROBOTS_CACHE_PATH", ".cache/robots.sqlite")
+ROBOTS_CACHE_TTL = int(os.getenv("ROBOTS_CACHE_TTL", "86400"))
+ROBOTS_ERROR_TTL = int(os.getenv("ROBOTS_ERROR_TTL", "600"))
+ROBOTS_MEMORY_ENTRIES = 4096
+
+# Fetch limits: robots.txt bodies beyond ROBOTS_MAX_BYTES are ignored, as RFC 9309 allows
+ROBOTS_TIMEOUT = 5
+ROBOTS_MAX_BYTES = 512 * 1024
+
+_ESCAPE_PATTERN = re.compile(r"%[0-9a-fA-F]{2}")
+
+def _normalize_path(path):
+    """Percent-encode a path the same way for rules and URLs, with upper-case escapes."""
+    path = quote(path, safe="/?=&;:@!$'()*+,-._~%")
+    return _ESCAPE_PATTERN.sub(lambda match: match.group(0).upper(), path)
+
+class RobotsRules:
+    """
+    The robots.txt rules that apply to this crawler on one host.
+
+    Plain path prefixes are stored in a character trie, so the longest
+    matching prefix is found in a single walk along the path; patterns with
+    * or $ are compiled to regular expressions. As in RFC 9309 the longest
+    matching rule decides, and Allow wins a tie.
+    """
+
+    def __init__(self, rules=(), crawl_delay=None, unreachable=False):
+        """
+        Args:
+            rules: (allow, path pattern) pairs
+            crawl_delay: Seconds between requests the host asks for, if any
+            unreachable: Whether the rules stand in for a robots.txt that could not be fetched
+        """
+        self.rules = [(bool(allow), pattern) for allow, pattern in rules]
+        self.crawl_delay = crawl_delay
+        self.unreachable = unreachable
+        self._trie = {}
+        self._patterns = []
+        for allow, pattern in self.rules:
+            pattern = _normalize_path(pattern)
+            if "*" in pattern or pattern.endswith("$"):
+                anchored = pattern.endswith("$")
+                regex = ".*".join(re.escape(part) for part in pattern.rstrip("$").split("*"))
+                self._patterns.append((len(pattern), allow, re.compile(regex + ("$" if anchored else ""))))
+                continue
+            node = self._trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            # "" can never be a path character, so it marks the end of a rule
+            node[""] = node.get("", False) or allow
+
+    def allowed(self, url):
+        """
+        Return whether the rules allow crawling url.
+
+        Args:
+            url: An absolute URL on this host
+        """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if path == "/robots.txt":
+            return True
+        path = _normalize_path(path + ("?" + parts.query if parts.query else ""))
+
+        best = (0, True)
+        node = self._trie
+        for depth, char in enumerate(path, 1):
+            node = node.get(char)
+            if node is None:
+                break
+            if "" in node:
+                best = (depth, node[""])
+        for length, allow, regex in self._patterns:
+            if length >= best[0] and regex.match(path):
+                best = max(best, (length, allow))
+        return best[1]
+
+    def to_dict(self):
+        return {"rules": [[allow, pattern] for allow, pattern in self.rules],
+                "crawl_delay": self.crawl_delay, "unreachable": self.unreachable}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["rules"], data.get("crawl_delay"), data.get("unreachable", False))
+
+def parse_robots(text, user_agent=None):
+    """
+    Parse a robots.txt file into the rules for one crawler.
+
+    The groups naming user_agent are merged and used; without one, the "*"
+    groups are. Lines other than User-agent, Allow, Disallow and Crawl-delay
+    are ignored.
+
+    Args:
+        text: The robots.txt content
+        user_agent: Product token to match (default: ROBOTS_USER_AGENT)
+
+    Returns:
+        A RobotsRules instance
+    """
+    token = (user_agent or ROBOTS_USER_AGENT).lower()
+    groups = []  # (agents, rules, crawl delay) per group
+    agents, rules, delay = [], [], None
+    in_rules = False
+
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        field, value = (part.strip() for part in line.split(":", 1))
+        field = field.lower()
+        if field == "user-agent":
+            if in_rules:
+                groups.append((agents, rules, delay))
+                agents, rules, delay = [], [], None
+                in_rules = False
+            agents.append(value.split("/")[0].strip().lower())
+        elif field in ("allow", "disallow"):
+            in_rules = True
+            if value:
+                rules.append((field == "allow", value))
+        elif field == "crawl-delay":
+            in_rules = True
+            try:
+                delay = float(value)
+            except ValueError:
+                pass
+    groups.append((agents, rules, delay))
+
+    for name in (token, "*"):
+        matching = [group for group in groups if name in group[0]]
+        if matching:
+            delays = [delay for _, _, delay in matching if delay is not None]
+            return RobotsRules([rule for _, rules, _ in matching for rule in rules],
+                               crawl_delay=max(delays) if delays else None)
+    return RobotsRules()
+
+class RobotsPolicy:
+    """
+    Decides before any connection is opened whether a URL may be crawled.
+
+    robots.txt is fetched once per scheme and host. The compiled rules are
+    kept in an in-memory LRU, and their parsed form in an optional
+    PersistentCache so later sessions do not fetch it again. Following RFC
+    9309, a missing robots.txt (4xx) allows everything, while an unreachable
+    one (5xx, 429 or a network error) disallows the host for ROBOTS_ERROR_TTL.
+    """
+
+    def __init__(self, user_agent=None, store=None, ttl=None, error_ttl=None):
+        """
+        Args:
+            user_agent: Product token matched against User-agent lines (default: ROBOTS_USER_AGENT)
+            store: Optional PersistentCache keeping parsed rules across sessions
+            ttl: Seconds a fetched robots.txt is used (default: ROBOTS_CACHE_TTL)
+            error_ttl: Seconds an unreachable robots.txt disallows its host (default: ROBOTS_ERROR_TTL)
+        """
+        self.user_agent = user_agent or ROBOTS_USER_AGENT
+        self.store = store
+        self.ttl = ttl or ROBOTS_CACHE_TTL
+        self.error_ttl = error_ttl or ROBOTS_ERROR_TTL
+        self.memory = LRUCache(max_entries=ROBOTS_MEMORY_ENTRIES)
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "fetched": 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def _key(self, origin):
+        return f"robots|{self.user_agent.lower()}|{origin}"
+
+    def fetch(self, origin, session):
+        """
+        Fetch and parse the robots.txt of an origin.
+
+        Args:
+            origin: scheme://host of the site
+            session: The requests session to fetch with
+
+        Returns:
+            A RobotsRules instance
+        """
+        url = f"{origin}/robots.txt"
+        headers = {"User-Agent": f"Mozilla/5.0 (compatible; {self.user_agent}/1.0)"}
+        self._count("fetched")
+        try:
+            response = session.get(url, headers=headers, timeout=ROBOTS_TIMEOUT, stream=True)
+            try:
+                status = response.status_code
+                if 200 <= status < 300:
+                    body = b""
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        body += chunk
+                        if len(body) >= ROBOTS_MAX_BYTES:
+                            break
+                    rules = parse_robots(body[:ROBOTS_MAX_BYTES].decode("utf-8", errors="replace"), self.user_agent)
+                    debug("Robots", f"{url}: {len(rules.rules)} rules"
+                                    f"{f', crawl-delay {rules.crawl_delay}s' if rules.crawl_delay else ''}", level=2)
+                    return rules
+            finally:
+                response.close()
+        except requests.exceptions.RequestException as e:
+            debug_error("Robots", f"Could not fetch {url}, not crawling {origin} for now: {e}")
+            return RobotsRules([(False, "/")], unreachable=True)
+        if status == 429 or status >= 500:
+            debug_error("Robots", f"{url} answered {status}, not crawling {origin} for now")
+            return RobotsRules([(False, "/")], unreachable=True)
+        debug("Robots", f"{url} answered {status}, allowing everything", level=2)
+        return RobotsRules()
+
+    def rules_for(self, url, session):
+        """
+        Return the robots.txt rules for the host of url, fetching them if not cached.
+
+        Concurrent crawls of one host wait for a single fetch.
+
+        Args:
+            url: An absolute URL
+            session: The requests session to fetch robots.txt with
+
+        Returns:
+            A RobotsRules instance
+        """
+        parts = urlsplit(url)
+        origin = f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+        key = self._key(origin)
+        rules = self.memory.get(key)
+        if rules is not None:
+            self._count("memory_hits")
+            return rules
+
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(origin, threading.Lock())
+        with fetch_lock:
+            rules = self.memory.get(key)
+            if rules is not None:
+                self._count("memory_hits")
+                return rules
+            saved = self._load(key)
+            if saved is not None:
+                self._count("disk_hits")
+                rules = RobotsRules.from_dict(saved)
+            else:
+                rules = self.fetch(origin, session)
+                self._save(key, rules)
+            self.memory.set(key, rules, ttl=self.error_ttl if rules.unreachable else self.ttl)
+        return rules
+
+    def _load(self, key):
+        if self.store is None:
+            return None
+        try:
+            return self.store.get(key)
+        except sqlite3.Error as e:
+            debug_error("Robots", f"Could not read cached robots.txt rules: {e}")
+            return None
+
+    def _save(self, key, rules):
+        if self.store is None:
+            return
+        try:
+            self.store.set(key, rules.to_dict(), ttl=self.error_ttl if rules.unreachable else self.ttl)
+        except sqlite3.Error as e:
+            debug_error("Robots", f"Could not cache robots.txt rules: {e}")
+
+    def allowed(self, url, session):
+        """
+        Return whether url may be crawled.
+
+        Args:
+            url: An absolute URL
+            session: The requests session to fetch robots.txt with
+        """
+        return self.rules_for(url, session).allowed(url)
+
+    def stats(self):
+        """Return the memory_hits, disk_hits and fetched counters."""
+        with self._lock:
+            return dict(self._stats)
+
+_policy = None
+_policy_lock = threading.Lock()
+
+def get_robots_policy():
+    """
+    Return the process-wide RobotsPolicy, creating it on first use.
+
+    Returns:
+        The shared RobotsPolicy, or None if ROBOTS_ENABLED is "0"
+    """
+    global _policy
+    if not ROBOTS_ENABLED:
+        return None
+    with _policy_lock:
+        if _policy is None:
+            store = None
+            if ROBOTS_CACHE_PATH:
+                try:
+                    store = PersistentCache(ROBOTS_CACHE_PATH, ttl=ROBOTS_CACHE_TTL)
+                except sqlite3.Error as e:
+                    debug_error("Robots", f"Could not open robots.txt cache at {ROBOTS_CACHE_PATH}: {e}")
+            _policy = RobotsPolicy(store=store)
+        return _policy
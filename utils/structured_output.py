@@ -0,0 +1,143 @@
+import json
+import threading
+from functools import lru_cache
+from typing import Any, Union, get_args, get_origin, get_type_hints
+from utils.json_extract import JSONExtractionError, extract_json, validate_json
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "parse_failures_avoided": 0, "repaired": 0, "failed": 0}
+
+def _is_free_form(hint):
+    """True if a hint is a dict (or Any) that Gemini cannot describe as an OBJECT with fixed properties."""
+    return hint is Any or hint is dict or get_origin(hint) is dict
+
+def _schema_for_hint(hint):
+    """Translate a typing hint into a Gemini schema dictionary."""
+    nullable = False
+    if get_origin(hint) is Union:
+        args = [arg for arg in get_args(hint) if arg is not type(None)]
+        nullable = len(args) < len(get_args(hint))
+        # Gemini schemas have no anyOf: use the first alternative (str for Union[str, List[str]])
+        hint = args[0]
+
+    if _is_free_form(hint):
+        # OBJECT schemas need fixed properties, so free-form dicts travel as JSON-encoded strings
+        schema = {"type": "string", "description": "A JSON-encoded object"}
+    elif get_origin(hint) is list or hint is list:
+        args = get_args(hint)
+        schema = {"type": "array", "items": _schema_for_hint(args[0] if args else str)}
+    elif hint is bool:
+        schema = {"type": "boolean"}
+    elif hint is int:
+        schema = {"type": "integer"}
+    elif hint is float:
+        schema = {"type": "number"}
+    else:
+        schema = {"type": "string"}
+
+    if nullable:
+        schema["nullable"] = True
+    return schema
+
+@lru_cache(maxsize=None)
+def response_schema_for(schema):
+    """
+    Derive a Gemini response schema from a TypedDict.
+
+    Every field is required. Free-form Dict[str, Any] fields are declared as
+    JSON-encoded strings and decoded again by parse_structured.
+
+    Args:
+        schema: A TypedDict class from utils/data_structures.py
+
+    Returns:
+        Schema dictionary accepted as GenerationConfig.response_schema
+    """
+    hints = get_type_hints(schema)
+    return {
+        "type": "object",
+        "properties": {field: _schema_for_hint(hint) for field, hint in hints.items()},
+        "required": list(hints)
+    }
+
+@lru_cache(maxsize=None)
+def _encoded_fields(schema):
+    """Return the fields of a TypedDict that response_schema_for sends as JSON-encoded strings."""
+    fields = []
+    for field, hint in get_type_hints(schema).items():
+        if get_origin(hint) is Union:
+            hint = next(arg for arg in get_args(hint) if arg is not type(None))
+        if _is_free_form(hint):
+            fields.append(field)
+    return tuple(fields)
+
+def parse_structured(text, schema, required=None, defaults=None, parsed=None, record=True):
+    """
+    Decode a response generated under response_schema_for(schema).
+
+    Args:
+        text: The raw response text
+        schema: The TypedDict the response schema was derived from
+        required: Field names that must be present (default: every field in schema)
+        defaults: Values used for missing or mistyped optional fields
+        parsed: An object already decoded from text (e.g. while streaming)
+        record: Whether to add this parse to the structured output counters
+
+    Returns:
+        The validated object, with JSON-encoded fields decoded
+
+    Raises:
+        JSONExtractionError: If the response does not match the schema
+    """
+    count = _count if record else lambda counter: None
+    count("requests")
+    repaired = False
+    try:
+        obj = parsed if isinstance(parsed, dict) else None
+        if obj is None:
+            try:
+                obj = json.loads(text)
+            except json.JSONDecodeError:
+                # Truncated output (e.g. max_tokens reached) can still be repaired
+                obj = extract_json(text)
+                repaired = True
+        if not isinstance(obj, dict):
+            raise JSONExtractionError(f"Expected a JSON object, got {type(obj).__name__}")
+
+        obj = dict(obj)
+        for field in _encoded_fields(schema):
+            value = obj.get(field)
+            if isinstance(value, str):
+                try:
+                    obj[field] = json.loads(value) if value.strip() else {}
+                except json.JSONDecodeError:
+                    obj[field] = {"text": value}
+        result = validate_json(obj, schema, required=required, defaults=defaults)
+    except JSONExtractionError:
+        count("failed")
+        raise
+    count("repaired" if repaired else "parse_failures_avoided")
+    return result
+
+def get_structured_output_stats():
+    """
+    Return the structured output counters.
+
+    Returns:
+        Dictionary with requests, parse_failures_avoided (responses that
+        decoded directly as JSON and matched the schema), repaired (responses
+        that only matched after the extract_json fallback repaired them) and
+        failed
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+def reset_structured_output_stats():
+    """Reset all structured output counters to zero."""
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
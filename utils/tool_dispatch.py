@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.debug import debug
+from utils.web_search import search_duckduckgo, search_google, search_all
+from utils.web_crawl import crawl_url
+from utils.prefetch import get_prefetcher
+
+# Tool calls that can be started before the decision has finished streaming
+TOOL_FUNCTIONS = {
+    "search_duckduckgo": search_duckduckgo,
+    "search_google": search_google,
+    "search_all": search_all,
+    "crawl_url": crawl_url,
+}
+
+# Started calls nobody has claimed are dropped beyond this many per session
+MAX_PENDING = 8
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dispatch")
+
+class ToolDispatcher:
+    """
+    Tool calls a research session started before its decision was complete.
+
+    Each session keeps its own dispatcher in the shared store, so concurrent
+    sessions never claim each other's calls. Pending calls are not
+    checkpointed: a resumed session simply runs its tool node normally.
+    """
+
+    def __init__(self, max_pending=None):
+        """
+        Args:
+            max_pending: Unclaimed calls kept at most (default: MAX_PENDING)
+        """
+        self.max_pending = max_pending or MAX_PENDING
+        self._pending = OrderedDict()  # (action, target) -> Future
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"max_pending": self.max_pending}
+
+    def __setstate__(self, state):
+        self.__init__(state["max_pending"])
+
+    def dispatch(self, action, target, visited=None):
+        """
+        Start a tool call in the background as soon as the decision names it.
+
+        Calling it again for a call that is still pending (e.g. when the
+        decision node is retried) does not start a second one.
+
+        Args:
+            action: The decided next_action
+            target: The query or URL for the action
+            visited: Optional VisitedIndex; pages in it are answered by the crawl node without a fetch
+
+        Returns:
+            True if a call was started (or is already running) for this action and target
+        """
+        tool = TOOL_FUNCTIONS.get(action)
+        if tool is None or not isinstance(target, str) or not target:
+            return False
+
+        if action == "crawl_url":
+            if visited is not None and target in visited:
+                return False
+            prefetcher = get_prefetcher()
+            if prefetcher is not None and target in prefetcher:
+                # Already being fetched from the search results; WebCrawlNode takes it from there
+                return True
+
+        key = (action, target)
+        with self._lock:
+            if key in self._pending:
+                return True
+            debug("ToolDispatch", f"Starting {action} early for: {target}", level=2)
+            self._pending[key] = _executor.submit(tool, target)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)[1].cancel()
+        return True
+
+    def settle(self, action, target):
+        """
+        Drop the pending calls other than the one the final decision names.
+
+        Args:
+            action: The decided next_action
+            target: The decided query or URL
+
+        Returns:
+            Number of calls dropped; queued ones are cancelled, running ones finish unused
+        """
+        with self._lock:
+            stale = [key for key in self._pending if key != (action, target)]
+            for key in stale:
+                self._pending.pop(key).cancel()
+        if stale:
+            debug("ToolDispatch", f"Dropped {len(stale)} early calls the decision did not keep", level=2)
+        return len(stale)
+
+    def take(self, action, target):
+        """
+        Claim a tool call started by dispatch.
+
+        Args:
+            action: The action the tool node performs
+            target: The query or URL the tool node was given
+
+        Returns:
+            The Future for the started call, or None if none was started
+        """
+        with self._lock:
+            future = self._pending.pop((action, target), None)
+        if future is not None:
+            debug("ToolDispatch", f"Using early-dispatched {action} for: {target}", level=2)
+        return future
@@ -0,0 +1,211 @@
+import os
+import math
+import hashlib
+import posixpath
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import numpy as np
+
+# Exact entries kept by a VisitedIndex before new URLs are only recorded in its Bloom filter,
+# and crawl results it keeps for answering repeat crawls
+VISITED_EXACT_LIMIT = int(os.getenv("VISITED_EXACT_LIMIT", "50000"))
+VISITED_RESULT_CACHE = int(os.getenv("VISITED_RESULT_CACHE", "32"))
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = frozenset({
+    "gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl",
+    "ref_src", "ref_url", "spm", "share", "si", "cmpid", "ncid", "sr_share", "oly_anon_id", "oly_enc_id",
+    "vero_id", "wickedid", "_hsenc", "_hsmi", "mkt_tok"
+})
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_")
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so different spellings of the same page compare equal.
+
+    Args:
+        url: The URL to normalize; a missing scheme is taken to be http
+
+    Returns:
+        The URL with a lowercase scheme and host, no default port, fragment,
+        tracking parameters or trailing slash, dot segments resolved and the
+        remaining query parameters sorted
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = "http://" + url.lstrip("/")
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+    try:
+        port = parts.port
+    except ValueError:
+        port = None  # Malformed port, dropped
+    netloc = f"{host}:{port}" if port is not None and str(port) != DEFAULT_PORTS.get(scheme) else host
+    if parts.username:
+        netloc = f"{parts.username}@{netloc}"
+
+    path = parts.path or "/"
+    if "/." in path:
+        path = posixpath.normpath(path) + ("/" if path.endswith("/") else "")
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = urlencode(sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _is_tracking(name)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+def url_key(url):
+    """
+    Return the identity of the page a URL points to.
+
+    Like canonicalize_url, but http and https and a leading "www." are
+    ignored, so every variant of a page maps to one key.
+
+    Args:
+        url: The URL to identify
+
+    Returns:
+        Key of the form "host/path?query"
+    """
+    parts = urlsplit(canonicalize_url(url))
+    netloc = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    path = "" if parts.path == "/" else parts.path
+    return f"{netloc}{path}" + (f"?{parts.query}" if parts.query else "")
+
+class BloomFilter:
+    """
+    Fixed-size set membership test with a bounded false positive rate.
+
+    Uses double hashing over one BLAKE2b digest to set num_hashes bits per
+    item in a NumPy bit array. Never returns a false negative.
+    """
+
+    def __init__(self, capacity, false_positive_rate=0.001):
+        """
+        Args:
+            capacity: Number of items the filter is sized for
+            false_positive_rate: Target false positive rate at capacity
+        """
+        self.num_bits = max(64, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return np.array([(first + i * second) % self.num_bits for i in range(self.num_hashes)], dtype=np.int64)
+
+    def add(self, item):
+        positions = self._positions(item)
+        np.bitwise_or.at(self.bits, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+
+    def __contains__(self, item):
+        positions = self._positions(item)
+        return bool(np.all(self.bits[positions >> 3] & (1 << (positions & 7)).astype(np.uint8)))
+
+class VisitedIndex:
+    """
+    Pages crawled during a research session, keyed by url_key.
+
+    Membership is exact for the first exact_limit pages; later pages are only
+    recorded in a Bloom filter created at that point, so the index stays
+    small in very long sessions at the cost of rare false positives. The
+    results of the most recent crawls are kept so a repeat crawl can be
+    answered without fetching the page again. revision counts changes, so
+    checkpoints can tell whether the index needs saving again.
+    """
+
+    def __init__(self, exact_limit=None, max_results=None):
+        """
+        Args:
+            exact_limit: Pages tracked exactly (default: VISITED_EXACT_LIMIT)
+            max_results: Crawl results kept for repeat crawls (default: VISITED_RESULT_CACHE)
+        """
+        self.exact_limit = exact_limit or VISITED_EXACT_LIMIT
+        self.max_results = max_results or VISITED_RESULT_CACHE
+        self._keys = set()
+        self._bloom = None  # Created once the exact set is full
+        self._results = OrderedDict()
+        self.revision = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, url):
+        key = url_key(url)
+        return key in self._keys or (self._bloom is not None and key in self._bloom)
+
+    def add(self, url):
+        """Mark a URL as visited; returns False if it already was."""
+        if url in self:
+            return False
+        key = url_key(url)
+        self.revision += 1
+        if len(self._keys) < self.exact_limit:
+            self._keys.add(key)
+            return True
+        if self._bloom is None:
+            # Sized for four times the exact limit; beyond that the false positive rate rises
+            self._bloom = BloomFilter(self.exact_limit * 4)
+            for known in self._keys:
+                self._bloom.add(known)
+        self._bloom.add(key)
+        return True
+
+    def record(self, url, result):
+        """
+        Mark a successfully crawled URL as visited and keep its result for repeat crawls.
+
+        Args:
+            url: The crawled URL
+            result: The dictionary returned by crawl_url; failed crawls are neither marked nor kept
+
+        Returns:
+            True if the URL was not visited before
+        """
+        if not result or not result.get("status"):
+            return False
+        added = self.add(url)
+        key = url_key(url)
+        self.revision += 1
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+        return added
+
+    def result(self, url):
+        """Return the kept crawl result for a URL, or None."""
+        return self._results.get(url_key(url))
+
+    def filter_new(self, urls):
+        """
+        Drop URLs already visited and repeated spellings of the same page.
+
+        Args:
+            urls: Iterable of URLs
+
+        Returns:
+            List of the remaining URLs, in their original order and spelling
+        """
+        seen = set()
+        fresh = []
+        for url in urls:
+            if not url or not isinstance(url, str):
+                continue
+            key = url_key(url)
+            if key in seen or url in self:
+                continue
+            seen.add(key)
+            fresh.append(url)
+        return fresh
@@ -1,89 +1,534 @@
-import requests
-from bs4 import BeautifulSoup
-import time
+import asyncio
+import codecs
+import contextvars
+import os
 import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
 from utils.debug import debug, debug_error
+from utils.html_extract import extract_text, get_extractor, StreamingTextExtractor, EXTRACTORS, HTML_STRIP_BOILERPLATE
+from utils.http_cache import get_http_cache, conditional_headers
+from utils.instrumentation import traced, annotate
+from utils.extract_pool import get_extract_pool
+from utils.host_scheduler import get_host_scheduler
+from utils.circuit_breaker import get_breakers
+from utils.robots import get_robots_policy
+
+# Concurrency limits for batch crawls, overridable from the environment
+CRAWL_MAX_CONCURRENCY = int(os.getenv("CRAWL_MAX_CONCURRENCY", "8"))
+CRAWL_PER_HOST_LIMIT = int(os.getenv("CRAWL_PER_HOST_LIMIT", "2"))
+
+# Per-page download limits: bytes read from the network, and extracted text after which the download stops
+CRAWL_MAX_BYTES = int(os.getenv("CRAWL_MAX_BYTES", str(2 * 1024 * 1024)))
+CRAWL_MAX_TEXT_CHARS = int(os.getenv("CRAWL_MAX_TEXT_CHARS", "50000"))
+CRAWL_CHUNK_SIZE = 64 * 1024
+
+# Content types parsed as pages; anything else (PDFs, images, video) is skipped without downloading the body
+HTML_CONTENT_TYPES = frozenset({"text/html", "application/xhtml+xml", "text/plain"})
+CHARSET_SNIFF_BYTES = 1024
+META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0'
+]
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    Return the process-wide requests session used for crawling.
+
+    The session keeps keep-alive connections pooled per host, so repeated
+    crawls of the same site skip the TCP/TLS handshake.
+
+    Returns:
+        A shared requests.Session instance
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            debug("WebCrawler", f"Creating shared HTTP session (pool size {CRAWL_MAX_CONCURRENCY})", level=2)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=CRAWL_MAX_CONCURRENCY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+def extract_content(html, url, status):
+    """
+    Extract the title and readable text from an HTML document.
+
+    Args:
+        html: The HTML document as a string
+        url: The URL the document was fetched from
+        status: The HTTP status code of the response
+
+    Returns:
+        Dictionary with url, title, content and status
+    """
+    # Parse with the fastest installed backend, dropping page furniture
+    title, text = extract_text(html)
+
+    return {
+        "url": url,
+        "title": title or "No title found",
+        "content": text,
+        "status": status
+    }
+
+def _content_type(headers):
+    """Return the lower-cased media type of a response, without parameters."""
+    return (headers.get("Content-Type") or "").split(";")[0].strip().lower()
+
+def _encoding(headers, head):
+    """
+    Pick the character encoding for a streamed page.
+
+    Args:
+        headers: The response headers
+        head: The first bytes of the body
+
+    Returns:
+        The charset from the Content-Type header, else from a <meta> tag, else utf-8
+    """
+    match = re.search(r"charset\s*=\s*[\"']?([\w.:-]+)", headers.get("Content-Type") or "", re.IGNORECASE)
+    name = match.group(1) if match else None
+    if not name:
+        match = META_CHARSET_PATTERN.search(head[:CHARSET_SNIFF_BYTES])
+        name = match.group(1).decode("ascii") if match else None
+    try:
+        return codecs.lookup(name).name if name else "utf-8"
+    except LookupError:
+        return "utf-8"
+
+class _BufferedExtractor:
+    """
+    Feeds a non-streaming extraction backend with the same interface as StreamingTextExtractor.
+
+    The decoded HTML is collected and parsed whenever it has grown enough
+    that the text limit may have been reached, estimated from the text found
+    at the previous parse, so the download can still stop at the limit.
+    """
+
+    def __init__(self, extractor, strip_boilerplate, max_text_chars):
+        self.extractor = extractor
+        self.strip_boilerplate = strip_boilerplate
+        self.max_text_chars = max_text_chars
+        self.chars = 0  # Characters of text found at the last parse
+        self._parts = []
+        self._size = 0
+        self._next_parse = max_text_chars  # The text is never longer than its HTML
+        self._result = None
+        self._parsed_size = -1
+
+    def feed(self, html):
+        self._parts.append(html)
+        self._size += len(html)
+        if self._size >= self._next_parse:
+            self._parse()
+            # Parse again where the text should reach the limit at the rate seen so far, growing by at least a quarter
+            estimate = self._size * self.max_text_chars / self.chars if self.chars else self._size * 2
+            self._next_parse = max(self._size * 1.25, estimate)
+
+    def _parse(self):
+        self._result = self.extractor("".join(self._parts), self.strip_boilerplate)
+        self._parsed_size = self._size
+        self.chars = len(self._result[1])
+
+    def close(self):
+        if self._parsed_size != self._size:
+            self._parse()
+
+    def result(self):
+        return self._result
+
+def _text_extractor(max_text_chars):
+    """Return an incremental extractor for the HTML_EXTRACTOR backend, honoring HTML_STRIP_BOILERPLATE."""
+    extractor = get_extractor()
+    if extractor is EXTRACTORS["stdlib"]:
+        # The standard library parser extracts as the page arrives
+        return StreamingTextExtractor(strip_boilerplate=HTML_STRIP_BOILERPLATE)
+    return _BufferedExtractor(extractor, HTML_STRIP_BOILERPLATE, max_text_chars)
+
+def read_page(response, max_bytes=None, max_text_chars=None):
+    """
+    Stream a response body through the incremental text extractor.
+
+    The body is read in chunks and handed to the HTML_EXTRACTOR backend as
+    it arrives. Reading stops once max_bytes have been downloaded or
+    max_text_chars of text have been extracted, so large pages are never
+    downloaded in full.
+
+    Args:
+        response: A requests response opened with stream=True
+        max_bytes: Maximum number of body bytes to read (default: CRAWL_MAX_BYTES)
+        max_text_chars: Extracted characters after which reading stops (default: CRAWL_MAX_TEXT_CHARS)
+
+    Returns:
+        Tuple of (title or None, text, body bytes read, whether the body was cut short)
+    """
+    return extract_chunks(response.iter_content(chunk_size=CRAWL_CHUNK_SIZE), response.headers,
+                          max_bytes=max_bytes, max_text_chars=max_text_chars)
+
+def extract_chunks(chunks, headers, max_bytes=None, max_text_chars=None):
+    """
+    Decode and extract text from a body arriving in chunks (see read_page).
+
+    Args:
+        chunks: Iterable of body bytes
+        headers: Mapping holding the response's Content-Type
+        max_bytes: Maximum number of body bytes to consume (default: CRAWL_MAX_BYTES)
+        max_text_chars: Extracted characters after which consuming stops (default: CRAWL_MAX_TEXT_CHARS)
+
+    Returns:
+        Tuple of (title or None, text, body bytes consumed, whether the body was cut short)
+    """
+    max_bytes = max_bytes or CRAWL_MAX_BYTES
+    max_text_chars = max_text_chars or CRAWL_MAX_TEXT_CHARS
+    extractor = _text_extractor(max_text_chars)
+    decoder = None
+    consumed = []
+    received = 0
+    truncated = False
+
+    def feed(data, final=False):
+        nonlocal decoder
+        if decoder is None:
+            # Choose the encoding once enough of the head has arrived to hold a <meta> charset
+            head = b"".join(consumed)
+            if len(head) < CHARSET_SNIFF_BYTES and not final:
+                return
+            decoder = codecs.getincrementaldecoder(_encoding(headers, head))(errors="replace")
+            data = head
+        extractor.feed(decoder.decode(data, final=final))
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if received + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - received]
+            truncated = True
+        consumed.append(chunk)
+        received += len(chunk)
+        feed(chunk)
+        if truncated:
+            debug("WebCrawler", f"Stopped reading after {received} bytes (limit {max_bytes})", level=2)
+            break
+        if extractor.chars >= max_text_chars:
+            debug("WebCrawler", f"Stopped reading after {extractor.chars} characters of text ({received} bytes)", level=2)
+            truncated = True
+            break
 
-def crawl_url(url, max_retries=3):
+    feed(b"", final=True)
+    extractor.close()
+    title, text = extractor.result()
+    return title, text, b"".join(consumed), truncated
+
+def download_page(response, max_bytes=None):
+    """
+    Read a response body without parsing it, for extraction in a worker process.
+
+    Args:
+        response: A requests response opened with stream=True
+        max_bytes: Maximum number of body bytes to read (default: CRAWL_MAX_BYTES)
+
+    Returns:
+        Tuple of (body bytes, whether the body was cut short)
+    """
+    max_bytes = max_bytes or CRAWL_MAX_BYTES
+    chunks = []
+    received = 0
+    for chunk in response.iter_content(chunk_size=CRAWL_CHUNK_SIZE):
+        if received + len(chunk) > max_bytes:
+            chunks.append(chunk[:max_bytes - received])
+            debug("WebCrawler", f"Stopped reading after {max_bytes} bytes (limit {max_bytes})", level=2)
+            return b"".join(chunks), True
+        chunks.append(chunk)
+        received += len(chunk)
+    return b"".join(chunks), False
+
+def extract_page(url, status, body, content_type, max_text_chars=None):
+    """
+    Extract a downloaded page into a crawl result; runs in extraction worker processes.
+
+    Args:
+        url: The crawled URL
+        status: The HTTP status code of the response
+        body: The body bytes
+        content_type: The response's Content-Type header, used to pick the encoding
+        max_text_chars: Extracted characters after which parsing stops (default: CRAWL_MAX_TEXT_CHARS)
+
+    Returns:
+        Dictionary with url, title, content and status
+    """
+    chunks = (body[i:i + CRAWL_CHUNK_SIZE] for i in range(0, len(body), CRAWL_CHUNK_SIZE))
+    title, text, _, _ = extract_chunks(chunks, {"Content-Type": content_type},
+                                       max_bytes=len(body) + 1, max_text_chars=max_text_chars)
+    return {
+        "url": url,
+        "title": title or "No title found",
+        "content": text,
+        "status": status
+    }
+
+def _extract_offloaded(pool, url, status, body, content_type):
+    """Parse a downloaded page in the extraction pool, or in this thread if the pool fails."""
+    try:
+        result = pool.run(extract_page, url, status, body, content_type)
+        annotate(offloaded=True)
+        return result
+    except Exception as e:
+        debug_error("WebCrawler", f"Extraction worker failed for {url}, parsing in this thread: {e}")
+        return extract_page(url, status, body, content_type)
+
+def _error_result(url, message):
+    """Build the result dictionary returned when a URL could not be crawled."""
+    return {
+        "url": url,
+        "title": "Error",
+        "content": message,
+        "status": 0
+    }
+
+@traced("crawl", "crawl_url")
+def crawl_url(url, max_retries=3, use_cache=True):
     """
     Crawl a specific URL and extract the text content.
+
+    Fresh responses in the HTTP cache are returned without touching the
+    network; stale ones are revalidated with a conditional GET. Requests
+    are paced per host by the HostScheduler, which also pauses a host after
+    failures and for as long as a 429/503 Retry-After asks. A host whose
+    circuit breaker is open after repeated failures is skipped at once, and
+    URLs disallowed by the host's robots.txt are rejected before any
+    request for them is made; its Crawl-delay sets the host's pace.
     
     Args:
         url: The URL to crawl
         max_retries: Maximum number of retry attempts
+        use_cache: Whether to consult and update the HTTP cache
         
     Returns:
         Extracted text content from the webpage
     """
     debug("WebCrawler", f"Crawling URL: {url} (max_retries={max_retries})")
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0'
-    ]
-    
+    host = urlparse(url).netloc.lower()
+    annotate(host=host, status=0, attempts=0)
     headers = {
-        'User-Agent': random.choice(user_agents),
+        'User-Agent': random.choice(USER_AGENTS),
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5'
     }
     
+    cache = get_http_cache() if use_cache else None
+    cached = cache.get(url) if cache else None
+    if cached and cached["fresh"]:
+        debug("WebCrawler", f"Serving {url} from HTTP cache")
+        annotate(cached=True, status=cached["extracted"].get("status", 0))
+        return cached["extracted"]
+    if cached:
+        headers.update(conditional_headers(cached))
+
+    session = get_session()
+    scheduler = get_host_scheduler()
+    breakers = get_breakers()
+    waited = 0.0
+
+    robots = get_robots_policy()
+    if robots is not None:
+        rules = robots.rules_for(url, session)
+        if rules.crawl_delay:
+            scheduler.set_min_interval(host, rules.crawl_delay)
+        if rules.unreachable:
+            annotate(skipped="robots.txt unreachable")
+            return _error_result(url, f"Skipped: the robots.txt of {host} could not be fetched, try again later")
+        if not rules.allowed(url):
+            debug("WebCrawler", f"Skipping {url}: disallowed by robots.txt")
+            annotate(skipped="robots.txt")
+            return _error_result(url, "Skipped: crawling this URL is disallowed by the site's robots.txt")
+
     retry_count = 0
     while retry_count < max_retries:
+        # Fail fast on hosts that keep failing, also when they start failing during these retries
+        if not breakers.allow(host):
+            debug("WebCrawler", f"Skipping {url}: {host} is failing repeatedly (circuit open)")
+            annotate(error="circuit open")
+            return _error_result(url, f"Skipped: {host} failed repeatedly and is temporarily unavailable")
+        # Wait for this host's next slot; other hosts are not held up
+        delay = scheduler.acquire(host)
+        if delay is None:
+            debug_error("WebCrawler", f"{host} is paused for longer than the crawl may wait, giving up on {url}")
+            breakers.record_failure(host)
+            annotate(error="host paused", waited=waited)
+            return _error_result(url, f"Host {host} is rate limiting requests, try again later")
+        waited += delay
+        annotate(waited=waited)
+        # Whether this attempt told the breaker how the host is doing; if not, its probe slot is given back
+        settled = False
         try:
-            # Add a small delay to be courteous to the website
-            time.sleep(1)
-            
-            # Make the request
+            # Make the request over a pooled connection
             debug("WebCrawler", f"Making request (attempt {retry_count + 1})", level=2)
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-            
-            # Parse the HTML content
-            debug("WebCrawler", "Parsing HTML content", level=2)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.extract()
-            
-            # Extract text content
-            text = soup.get_text(separator='\n')
+            annotate(attempts=retry_count + 1)
+            response = session.get(url, headers=headers, timeout=10, stream=True)
+            try:
+                annotate(status=response.status_code)
+                scheduler.record_response(host, response.status_code, response.headers.get("Retry-After"))
+                # A missing or forbidden page says nothing about the host's health; rate limiting does
+                if response.status_code >= 500 or response.status_code == 429:
+                    breakers.record_failure(host)
+                    settled = True
+                elif response.status_code < 400:
+                    breakers.record_success(host)
+                    settled = True
+                if cached and response.status_code == 304:
+                    debug("WebCrawler", f"Cached copy of {url} is still valid (304)")
+                    annotate(cached=True)
+                    cache.refresh(url, response.headers)
+                    return cached["extracted"]
+                response.raise_for_status()  # Raise an exception for HTTP errors
             
-            # Process text to remove excessive whitespace
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
+                # Skip PDFs, images and other non-page content before reading the body
+                content_type = _content_type(response.headers)
+                if content_type and content_type not in HTML_CONTENT_TYPES:
+                    debug("WebCrawler", f"Skipping {url}: unsupported content type {content_type}")
+                    annotate(skipped=content_type)
+                    return _error_result(url, f"Skipped non-HTML content ({content_type})")
             
-            # Extract title if available
-            title = soup.title.string if soup.title else "No title found"
+                pool = get_extract_pool()
+                if pool is None:
+                    debug("WebCrawler", "Streaming and parsing HTML content", level=2)
+                    title, text, body, truncated = read_page(response)
+                    result = {
+                        "url": url,
+                        "title": title or "No title found",
+                        "content": text,
+                        "status": response.status_code
+                    }
+                else:
+                    # Download here and parse in a worker process, so parsing does not hold the GIL
+                    body, truncated = download_page(response)
+            finally:
+                response.close()
             
-            # Create a structured response
-            result = {
-                "url": url,
-                "title": title,
-                "content": text,
-                "status": response.status_code
-            }
+            if pool is not None:
+                result = _extract_offloaded(pool, url, response.status_code, body,
+                                            response.headers.get("Content-Type") or "")
+            annotate(bytes=len(body), text_chars=len(result["content"]), truncated=truncated)
+            if cache:
+                cache.put(url, response.status_code, response.headers, body, result)
+            # Body bytes downloaded for this result; copies served from the HTTP cache do not carry it
+            result = {**result, "bytes": len(body)}
             
-            debug("WebCrawler", f"Successfully crawled URL: {url} (status={response.status_code})")
+            debug("WebCrawler", f"Successfully crawled URL: {url} (status={response.status_code}, "
+                                f"{len(body)} bytes{', truncated' if truncated else ''})")
             return result
             
         except requests.exceptions.RequestException as e:
+            # Client errors other than timeouts and rate limiting will not change on a retry
+            error_response = e.response if isinstance(e, requests.exceptions.HTTPError) else None
+            status = error_response.status_code if error_response is not None else None
+            if status is not None and 400 <= status < 500 and status not in (408, 429):
+                debug_error("WebCrawler", f"Not retrying {url}: HTTP {status}")
+                annotate(error=f"HTTP {status}")
+                return _error_result(url, f"Failed to crawl the URL: HTTP {status}")
             retry_count += 1
             debug_error("WebCrawler", f"Error crawling {url} (attempt {retry_count}/{max_retries}): {e}")
             print(f"Error crawling {url}: {e}")
-            time.sleep(2 * retry_count)  # Exponential backoff
+            # Error responses were recorded above; connection errors and timeouts back the host off here
+            if not isinstance(e, requests.exceptions.HTTPError) or e.response is None:
+                scheduler.record_failure(host)
+                breakers.record_failure(host)
+                settled = True
+        finally:
+            if not settled:
+                breakers.release(host)
     
     # Return an error message if all retries failed
     debug_error("WebCrawler", f"Failed to crawl the URL after {max_retries} attempts")
-    return {
-        "url": url,
-        "title": "Error",
-        "content": f"Failed to crawl the URL after {max_retries} attempts",
-        "status": 0
-    }
+    annotate(error="retries exhausted")
+    return _error_result(url, f"Failed to crawl the URL after {max_retries} attempts")
+
+async def crawl_urls(urls, max_retries=3, max_concurrency=None, per_host_limit=None):
+    """
+    Crawl several URLs concurrently.
+
+    Requests share the pooled session from get_session() and are bounded by a
+    global concurrency limit and a per-host limit, so one slow site cannot
+    occupy every slot. Duplicate URLs are only fetched once.
+
+    Args:
+        urls: List of URLs to crawl
+        max_retries: Maximum number of retry attempts per URL
+        max_concurrency: Maximum number of requests in flight (default: CRAWL_MAX_CONCURRENCY)
+        per_host_limit: Maximum number of requests in flight per host (default: CRAWL_PER_HOST_LIMIT)
+
+    Returns:
+        List of crawl results in the same order as urls
+    """
+    max_concurrency = max_concurrency or CRAWL_MAX_CONCURRENCY
+    per_host_limit = per_host_limit or CRAWL_PER_HOST_LIMIT
+    unique_urls = list(dict.fromkeys(urls))
+    debug("WebCrawler", f"Batch crawling {len(unique_urls)} URLs (concurrency={max_concurrency}, per_host={per_host_limit})")
+
+    loop = asyncio.get_running_loop()
+    global_slots = asyncio.Semaphore(max_concurrency)
+    host_slots = {}
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="crawl") as executor:
+        async def crawl_one(url):
+            host = urlparse(url).netloc.lower()
+            host_slot = host_slots.setdefault(host, asyncio.Semaphore(per_host_limit))
+            # Take the host slot first so waiting on a busy host never holds a global slot
+            async with host_slot:
+                async with global_slots:
+                    # Run in a copy of this context so the crawl spans nest under the caller's span
+                    return await loop.run_in_executor(executor, contextvars.copy_context().run,
+                                                      crawl_url, url, max_retries)
+
+        results = await asyncio.gather(*(crawl_one(url) for url in unique_urls), return_exceptions=True)
+
+    by_url = {}
+    for url, result in zip(unique_urls, results):
+        if isinstance(result, Exception):
+            debug_error("WebCrawler", f"Unexpected error crawling {url}: {result}")
+            result = _error_result(url, f"Failed to crawl the URL: {result}")
+        by_url[url] = result
+
+    return [by_url[url] for url in urls]
+
+def crawl_urls_sync(urls, **kwargs):
+    """
+    Synchronous wrapper around crawl_urls.
+
+    Called from a thread that is already running an event loop (e.g. a
+    notebook), the batch runs on a fresh loop in a helper thread instead,
+    blocking the caller until it is done; async code should await
+    crawl_urls directly.
+
+    Args:
+        urls: List of URLs to crawl
+        **kwargs: Passed through to crawl_urls
+
+    Returns:
+        List of crawl results in the same order as urls
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(crawl_urls(urls, **kwargs))
+    # asyncio.run cannot be nested in a running loop
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="crawl-sync") as executor:
+        return executor.submit(contextvars.copy_context().run, asyncio.run, crawl_urls(urls, **kwargs)).result()
 
 # Simple test function
 if __name__ == "__main__":
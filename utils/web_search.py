@@ -1,13 +1,84 @@
 import os
+import re
 import json
+import sqlite3
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 from duckduckgo_search import DDGS
 from googleapiclient.discovery import build
 from utils.debug import debug, debug_error
+from utils.cache import TieredCache, PersistentCache
+from utils.url_utils import url_key
+from utils.instrumentation import traced, annotate
+from utils.circuit_breaker import get_breakers
 
 # Load environment variables
 load_dotenv()
 
+# Search result cache settings (empty SEARCH_CACHE_PATH keeps the cache in memory only)
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", ".cache/search_cache.sqlite")
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "21600"))
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") != "0"
+
+# Seconds search_all waits for the engines before merging whatever has arrived
+SEARCH_ALL_TIMEOUT = float(os.getenv("SEARCH_ALL_TIMEOUT", "10"))
+# Rank offset for reciprocal rank fusion; larger values flatten the gap between top ranks
+RRF_K = 60
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+def get_search_cache():
+    """
+    Return the process-wide search result cache, creating it on first use.
+    
+    Returns:
+        The shared TieredCache, or None if SEARCH_CACHE_ENABLED is "0"
+    """
+    global _search_cache
+    if not SEARCH_CACHE_ENABLED:
+        return None
+    with _search_cache_lock:
+        if _search_cache is None:
+            store = None
+            if SEARCH_CACHE_PATH:
+                try:
+                    store = PersistentCache(SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL)
+                except sqlite3.Error as e:
+                    debug_error("SearchCache", f"Could not open search cache at {SEARCH_CACHE_PATH}: {e}")
+            _search_cache = TieredCache("SearchCache", ttl=SEARCH_CACHE_TTL, store=store)
+        return _search_cache
+
+def normalize_query(query):
+    """
+    Normalize a search query so trivially different phrasings share a cache entry.
+    
+    Args:
+        query: The search query
+        
+    Returns:
+        The query lowercased, without ?!,; punctuation or trailing periods, and
+        with whitespace collapsed
+    """
+    query = re.sub(r"[?!,;]", " ", query.lower())
+    return " ".join(query.split()).rstrip(".")
+
+def _unavailable(engine_name):
+    """Result returned without searching while an engine's circuit breaker is open."""
+    annotate(error="circuit open")
+    return [{
+        "title": "Error performing search",
+        "link": "",
+        "snippet": f"{engine_name} search is temporarily unavailable after repeated failures"
+    }]
+
+def search_cache_key(engine, query, max_results):
+    """Build the cache key for a search on engine."""
+    return f"{engine}|{normalize_query(query)}|{max_results}"
+
+@traced("search", "duckduckgo")
 def search_duckduckgo(query, max_results=10):
     """
     Perform a web search using DuckDuckGo.
@@ -20,6 +91,19 @@ def search_duckduckgo(query, max_results=10):
         List of search results with title, link, and snippet
     """
     debug("DuckDuckGo", f"Searching for: {query} (max_results={max_results})")
+    cache = get_search_cache()
+    cache_key = search_cache_key("duckduckgo", query, max_results)
+    cached = cache.get(cache_key) if cache else None
+    if cached is not None:
+        debug("DuckDuckGo", f"Returning {len(cached)} cached results")
+        annotate(cached=True, results=len(cached))
+        return cached
+    
+    breakers = get_breakers()
+    if not breakers.allow("search:duckduckgo"):
+        debug("DuckDuckGo", "Skipping search: engine is failing repeatedly (circuit open)")
+        return _unavailable("DuckDuckGo")
+    
     try:
         # Create DuckDuckGo search client
         ddgs = DDGS()
@@ -37,10 +121,16 @@ def search_duckduckgo(query, max_results=10):
             })
         
         debug("DuckDuckGo", f"Search returned {len(formatted_results)} results")
+        annotate(results=len(formatted_results))
+        breakers.record_success("search:duckduckgo")
+        if cache:
+            cache.set(cache_key, formatted_results)
         return formatted_results
     
     except Exception as e:
         debug_error("DuckDuckGo", f"Error in search: {e}")
+        breakers.record_failure("search:duckduckgo")
+        annotate(error=str(e)[:200])
         print(f"Error in DuckDuckGo search: {e}")
         return [{
             "title": "Error performing search",
@@ -48,6 +138,7 @@ def search_duckduckgo(query, max_results=10):
             "snippet": f"An error occurred: {str(e)}"
         }]
 
+@traced("search", "google")
 def search_google(query, max_results=10):
     """
     Perform a web search using Google Custom Search API.
@@ -60,15 +151,36 @@ def search_google(query, max_results=10):
         List of search results with title, link, and snippet
     """
     debug("Google", f"Searching for: {query} (max_results={max_results})")
+    cache = get_search_cache()
+    cache_key = search_cache_key("google", query, max_results)
+    cached = cache.get(cache_key) if cache else None
+    if cached is not None:
+        debug("Google", f"Returning {len(cached)} cached results")
+        annotate(cached=True, results=len(cached))
+        return cached
+    
+    # Get API key and CSE ID from environment variables
+    api_key = os.getenv("GOOGLE_API_KEY")
+    cse_id = os.getenv("GOOGLE_CSE_ID")
+    
+    if not api_key or not cse_id:
+        # A configuration problem, not an engine failure, so the breaker is left alone
+        message = "Missing Google API credentials. Set GOOGLE_API_KEY and GOOGLE_CSE_ID environment variables."
+        debug_error("Google", "Missing API credentials")
+        annotate(error=message)
+        print(f"Error in Google search: {message}")
+        return [{
+            "title": "Error performing search",
+            "link": "",
+            "snippet": f"An error occurred: {message}"
+        }]
+    
+    breakers = get_breakers()
+    if not breakers.allow("search:google"):
+        debug("Google", "Skipping search: engine is failing repeatedly (circuit open)")
+        return _unavailable("Google")
+    
     try:
-        # Get API key and CSE ID from environment variables
-        api_key = os.getenv("GOOGLE_API_KEY")
-        cse_id = os.getenv("GOOGLE_CSE_ID")
-        
-        if not api_key or not cse_id:
-            debug_error("Google", "Missing API credentials")
-            raise ValueError("Missing Google API credentials. Set GOOGLE_API_KEY and GOOGLE_CSE_ID environment variables.")
-        
         # Build Google Custom Search service
         service = build("customsearch", "v1", developerKey=api_key)
         
@@ -86,10 +198,16 @@ def search_google(query, max_results=10):
             })
         
         debug("Google", f"Search returned {len(formatted_results)} results")
+        annotate(results=len(formatted_results))
+        breakers.record_success("search:google")
+        if cache:
+            cache.set(cache_key, formatted_results)
         return formatted_results
     
     except Exception as e:
         debug_error("Google", f"Error in search: {e}")
+        breakers.record_failure("search:google")
+        annotate(error=str(e)[:200])
         print(f"Error in Google search: {e}")
         return [{
             "title": "Error performing search",
@@ -97,6 +215,107 @@ def search_google(query, max_results=10):
             "snippet": f"An error occurred: {str(e)}"
         }]
 
+# Engines queried by search_all, by name
+SEARCH_ENGINES = {
+    "duckduckgo": search_duckduckgo,
+    "google": search_google,
+}
+
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+
+def fuse_results(results_by_engine, max_results=10, k=RRF_K):
+    """
+    Merge ranked result lists with reciprocal rank fusion.
+    
+    Each result scores 1 / (k + rank) per engine that returned it, and
+    results are deduplicated by normalized URL. Error placeholders (results
+    without a link) are dropped.
+    
+    Args:
+        results_by_engine: Mapping of engine name to its ranked result list
+        max_results: Maximum number of merged results to return
+        k: Rank offset for the fusion score
+        
+    Returns:
+        List of results with title, link, snippet, engines and score, best first
+    """
+    merged = {}
+    for engine, results in results_by_engine.items():
+        for rank, result in enumerate(results, 1):
+            link = result.get("link")
+            if not link:
+                continue
+            key = url_key(link)
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {**result, "engines": [], "score": 0.0}
+            elif len(result.get("snippet", "")) > len(entry.get("snippet", "")):
+                entry["snippet"] = result["snippet"]
+            entry["engines"].append(engine)
+            entry["score"] += 1.0 / (k + rank)
+    
+    ranked = sorted(merged.values(), key=lambda entry: entry["score"], reverse=True)
+    for entry in ranked:
+        entry["score"] = round(entry["score"], 6)
+    return ranked[:max_results]
+
+@traced("search", "search_all")
+def search_all(query, max_results=10, engines=None, timeout=None):
+    """
+    Search every engine concurrently and merge the results.
+    
+    The engines run in parallel, so the call takes as long as the slowest
+    one, and an engine still running after the timeout is left out. Engines
+    that fail only contribute their error placeholder, which is dropped.
+    
+    Args:
+        query: The search query
+        max_results: Maximum number of results requested from each engine and returned
+        engines: Engine names to query (default: every engine in SEARCH_ENGINES)
+        timeout: Seconds to wait for the engines (default: SEARCH_ALL_TIMEOUT)
+        
+    Returns:
+        List of merged results ranked by reciprocal rank fusion (see fuse_results)
+        
+    Raises:
+        RuntimeError: If every engine failed or timed out
+    """
+    engines = list(engines or SEARCH_ENGINES)
+    timeout = SEARCH_ALL_TIMEOUT if timeout is None else timeout
+    debug("MultiSearch", f"Searching {', '.join(engines)} for: {query}")
+    
+    # Each engine runs in a copy of this context so its span nests under this one
+    futures = {_search_executor.submit(contextvars.copy_context().run, SEARCH_ENGINES[engine], query, max_results): engine
+               for engine in engines}
+    done, pending = wait(futures, timeout=timeout)
+    for future in pending:
+        debug_error("MultiSearch", f"{futures[future]} did not answer within {timeout}s, merging without it")
+    
+    results_by_engine = {}
+    errors = [f"{futures[future]}: no answer within {timeout}s" for future in pending]
+    for future in done:
+        try:
+            results = future.result()
+        except Exception as e:
+            debug_error("MultiSearch", f"{futures[future]} search failed: {e}")
+            errors.append(f"{futures[future]}: {e}")
+            continue
+        if results and not any(result.get("link") for result in results):
+            # Only error placeholders: the engine failed and already logged why
+            errors.append(f"{futures[future]}: {results[0].get('snippet', 'search failed')}")
+        results_by_engine[futures[future]] = results
+    # Keep the engine order stable so ties rank the same way every time
+    results_by_engine = {engine: results_by_engine[engine] for engine in engines if engine in results_by_engine}
+    
+    if len(errors) == len(engines):
+        annotate(error="every engine failed")
+        raise RuntimeError(f"Every search engine failed ({'; '.join(errors)})")
+    
+    merged = fuse_results(results_by_engine, max_results=max_results)
+    annotate(engines=len(results_by_engine), results=len(merged))
+    debug("MultiSearch", f"Merged {sum(len(r) for r in results_by_engine.values())} results into {len(merged)}")
+    return merged
+
 # Simple test function
 if __name__ == "__main__":
     test_query = "What is PocketFlow?"